@@ -0,0 +1,339 @@
+import sys
+import os
+import os.path
+import subprocess
+import tempfile
+import shutil
+import time
+import argparse
+import gc
+import bisect
+import collections
+
+"""Benchmarks with budgets, run by
+
+python bench.py [BENCHMARK ...]
+
+Exits with 1 if a result exceeds its budget."""
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jiracli.py")
+
+# median wall clock time of the CLI handling commands that do not talk to JIRA
+STARTUP_BUDGET_MS = 50
+
+STARTUP_RUNS = 20
+
+# issues of the synthetic search result held in memory
+MEMORY_ISSUES = 10000
+
+# microseconds per date parsed by jira.parse_timestamp, not cached
+TIMESTAMP_BUDGET_US = 20
+
+TIMESTAMP_RUNS = 10000
+
+# bytes per jira.Issue of the synthetic search result with every field read, including
+# users, parents, subtasks and the identity map sharing them: below the 955 bytes of
+# issues built without it
+MEMORY_BUDGET_BYTES = 800
+
+# milliseconds to build the issues of the synthetic search result and render them
+# by Printer.oneline, like query does
+ONELINE_BUDGET_MS = 400
+
+# milliseconds to count the issues of the synthetic search result in a jira.IssueBatch
+# by status, by assignee and status and by age
+COUNT_BUDGET_MS = 20
+
+def _median(values):
+	values = sorted(values)
+
+	return values[len(values) / 2]
+
+"""Median time in milliseconds of running the CLI with args until it exits"""
+def startup_time(args, runs=STARTUP_RUNS):
+	times = []
+
+	# no configuration and no daemon to forward to
+	home = tempfile.mkdtemp()
+
+	env = dict(os.environ, HOME=home)
+
+	try:
+		with open(os.devnull, "w") as devnull:
+			for _i in range(runs):
+				start = time.time()
+				subprocess.call([sys.executable] + args, stdout=devnull, stderr=devnull, env=env)
+				times.append(time.time() - start)
+	finally:
+		shutil.rmtree(home)
+
+	return _median(times) * 1000
+
+# results are (name, value, budget or None, unit)
+def bench_startup():
+	results = [
+		("python startup (reference)", startup_time(["-c", "pass"]), None, "ms")
+	]
+
+	for args in (["--version"], ["--help"], ["get", "--help"]):
+		results.append((
+			"startup %s" % (" ".join(args)),
+			startup_time([CLI] + args),
+			STARTUP_BUDGET_MS,
+			"ms"))
+
+	return results
+
+"""Search result like JIRA's: every issue assigned to one of 50 users, every
+fourth with one of count / 20 parents and every tenth with 3 subtasks"""
+def synthetic_issues(count=MEMORY_ISSUES):
+	def user(i):
+		return {"name": u"user%d" % (i % 50), "displayName": u"User %d" % (i % 50), "emailAddress": u"user%d@example.com" % (i % 50)}
+
+	def issue(key, summary, fields={}):
+		return {"key": key, "fields": dict({"summary": summary, "status": {"name": u"Open"}, "issuetype": {"name": u"Bug"}}, **fields)}
+
+	for i in range(count):
+		fields = {
+			"description": u"Description of issue %d, which is a little longer than its summary" % (i),
+			"assignee": user(i),
+			"updated": u"2015-01-23T19:03:43.000+0100",
+			"subtasks": []
+		}
+
+		if i % 4 == 0:
+			fields["parent"] = issue(u"ACME-%d" % (count + i / 20), u"Parent of issue %d" % (i / 20))
+
+		if i % 10 == 0:
+			fields["subtasks"] = map(lambda j: issue(u"ACME-%d-%d" % (i, j), u"Subtask %d" % (j)), range(3))
+
+		yield issue(u"ACME-%d" % (i), u"Summary of issue %d" % (i), fields)
+
+"""Bytes of the objects reachable from root, without types and modules"""
+def deep_size(root):
+	seen = set()
+	todo = [root]
+	size = 0
+
+	while len(todo) > 0:
+		obj = todo.pop()
+
+		if id(obj) in seen or isinstance(obj, type) or type(obj).__name__ == "module":
+			continue
+
+		seen.add(id(obj))
+		size += sys.getsizeof(obj)
+		todo.extend(gc.get_referents(obj))
+
+	return size
+
+# attributes of the model objects, as read by the printer
+_MODEL_ATTRIBUTES = {
+	"Issue": ["_key", "_summary", "_status", "_description", "_type", "_assignee", "_parent", "_updated", "_subtasks"],
+	"User": ["_key", "_display_name", "_email"]
+}
+
+# the same attributes held in an instance dict, like jira.Issue had them
+class _DictBacked(object):
+	pass
+
+def _dict_backed(obj):
+	if isinstance(obj, list):
+		return map(_dict_backed, obj)
+
+	if type(obj).__name__ not in _MODEL_ATTRIBUTES:
+		return obj
+
+	copy = _DictBacked()
+
+	for name in _MODEL_ATTRIBUTES[type(obj).__name__]:
+		setattr(copy, name, _dict_backed(getattr(obj, name)))
+
+	return copy
+
+def bench_memory():
+	import jira
+
+	issues = map(jira.Issue, synthetic_issues())
+
+	results = [
+		("issue, before reading fields", deep_size(issues) / float(len(issues)), None, "bytes")
+	]
+
+	# decodes every field of the issues
+	dict_backed = map(_dict_backed, issues)
+
+	results.append(("issue with dict (reference)", deep_size(dict_backed) / float(len(issues)), None, "bytes"))
+	results.append(("issue, every field read", deep_size(issues) / float(len(issues)), None, "bytes"))
+
+	# as built by jira.Jira, sharing users and parents
+	identities = jira.IdentityMap()
+	issues = map(lambda raw_obj: jira.Issue(raw_obj, identities), synthetic_issues())
+	map(_dict_backed, issues)
+
+	results.append(("issue, users and parents shared", deep_size(issues) / float(len(issues)), MEMORY_BUDGET_BYTES, "bytes"))
+
+	return results
+
+# best of a few runs
+def _milliseconds(fn, runs=3):
+	times = []
+
+	for _i in range(runs):
+		start = time.time()
+		fn()
+		times.append(time.time() - start)
+
+	return min(times) * 1000
+
+# read every field of issue, as Issue decoded them all when created before
+def _read_all(issue):
+	(issue._description, issue._type, issue._updated, issue._assignee)
+
+	if issue._parent != None:
+		_read_all(issue._parent)
+
+	map(_read_all, issue._subtasks)
+
+# read the fields Printer.oneline reads
+def _read_oneline(issue):
+	(issue._assignee, len(issue._subtasks))
+
+	if issue._parent != None:
+		issue._parent._key
+
+def bench_decode():
+	import jira
+	import printer
+
+	raw_issues = list(synthetic_issues())
+	oneline_printer = printer.Printer(width=80)
+
+	def read_all():
+		map(_read_all, map(jira.Issue, raw_issues))
+
+	def read_oneline():
+		map(_read_oneline, map(jira.Issue, raw_issues))
+
+	def render_oneline():
+		identities = jira.IdentityMap()
+
+		for issue in map(lambda raw_obj: jira.Issue(raw_obj, identities), raw_issues):
+			oneline_printer.oneline(issue)
+
+	def render_oneline_unshared():
+		for issue in map(jira.Issue, raw_issues):
+			oneline_printer.oneline(issue)
+
+	return [
+		("build issues, every field read (reference)", _milliseconds(read_all), None, "ms"),
+		("build issues, fields of oneline read", _milliseconds(read_oneline), None, "ms"),
+		("build, render oneline (no identity map)", _milliseconds(render_oneline_unshared), None, "ms"),
+		("build issues and render oneline", _milliseconds(render_oneline), ONELINE_BUDGET_MS, "ms")
+	]
+
+# counts stats renders
+def _count_issues(issues, now):
+	by_status = collections.Counter(map(lambda issue: issue._status, issues))
+	by_assignee_status = collections.Counter(map(lambda issue: (issue._assignee._key if issue._assignee != None else None, issue._status), issues))
+	ages = collections.Counter(map(lambda issue: bisect.bisect_right(_AGE_EDGES, (now - issue._updated) / 86400), issues))
+
+	return (by_status, by_assignee_status, ages)
+
+_AGE_EDGES = [1, 7, 30, 90, 365]
+
+def _count_batch(batch, now):
+	edges = [0.0] + map(lambda days: now - days * 86400, reversed(_AGE_EDGES)) + [float("inf")]
+
+	return (batch.count_by("status"), batch.count_by("assignee", "status"), batch.histogram(edges))
+
+def bench_columns():
+	import jira
+
+	raw_issues = list(synthetic_issues())
+	issues = map(jira.Issue, raw_issues)
+	now = time.time()
+
+	batch = jira.IssueBatch()
+	batch.extend(raw_issues)
+
+	def build_batch():
+		jira.IssueBatch().extend(raw_issues)
+
+	return [
+		("build issues (reference)", _milliseconds(lambda: map(jira.Issue, raw_issues)), None, "ms"),
+		("build issue batch", _milliseconds(build_batch), None, "ms"),
+		("count issues (reference)", _milliseconds(lambda: _count_issues(issues, now)), None, "ms"),
+		("count issue batch", _milliseconds(lambda: _count_batch(batch, now)), COUNT_BUDGET_MS, "ms")
+	]
+
+def _microseconds_per_call(fn, values):
+	start = time.time()
+
+	for value in values:
+		fn(value)
+
+	return (time.time() - start) * 1e6 / len(values)
+
+def bench_timestamps():
+	import jira
+	import dateutil.parser
+
+	# distinct dates, one second apart
+	texts = map(lambda i: "2015-01-23T%02d:%02d:%02d.000+0100" % (i / 3600 % 24, i / 60 % 60, i % 60), range(TIMESTAMP_RUNS))
+
+	def uncached(text):
+		jira._timestamps.clear()
+		jira.parse_timestamp(text)
+
+	results = [
+		("dateutil (reference)", _microseconds_per_call(lambda text: time.mktime(dateutil.parser.parse(text).timetuple()), texts), None, "us"),
+		("parse_timestamp", _microseconds_per_call(uncached, texts), TIMESTAMP_BUDGET_US, "us")
+	]
+
+	map(jira.parse_timestamp, texts)
+
+	results.append(("parse_timestamp cached", _microseconds_per_call(jira.parse_timestamp, texts), None, "us"))
+
+	return results
+
+BENCHMARKS = [
+	("startup", bench_startup),
+	("memory", bench_memory),
+	("timestamps", bench_timestamps),
+	("decode", bench_decode),
+	("columns", bench_columns)
+]
+
+def main():
+	parser = argparse.ArgumentParser(description="Run benchmarks and compare them to their budgets")
+	parser.add_argument(
+		'names',
+		nargs="*",
+		metavar="BENCHMARK",
+		help="Benchmarks to run (%s), all if omitted" % (", ".join(map(lambda benchmark: benchmark[0], BENCHMARKS))))
+
+	args = parser.parse_args()
+
+	over_budget = False
+
+	for (name, bench) in BENCHMARKS:
+		if len(args.names) > 0 and name not in args.names:
+			continue
+
+		for (result_name, value, budget, unit) in bench():
+			if budget == None:
+				print "%-40s %10.1f %s" % (result_name, value, unit)
+			else:
+				status = "ok" if value <= budget else "OVER BUDGET"
+
+				if value > budget:
+					over_budget = True
+
+				print "%-40s %10.1f %s (budget %s %s) %s" % (result_name, value, unit, budget, unit, status)
+
+	if over_budget:
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
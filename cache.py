@@ -0,0 +1,169 @@
+import os
+import os.path
+import hashlib
+import cPickle
+import collections
+
+# defaults for the [cache] limits
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+
+"""Cached response of a GET request: the validators sent by the server and the parsed body"""
+class CacheEntry(object):
+
+	def __init__(self, etag, last_modified, data):
+		self.etag = etag
+		self.last_modified = last_modified
+		self.data = data
+
+	"""Request headers to revalidate this entry"""
+	def validators(self):
+		headers = []
+
+		if self.etag != None:
+			headers.append("If-None-Match: %s" % (self.etag))
+
+		if self.last_modified != None:
+			headers.append("If-Modified-Since: %s" % (self.last_modified))
+
+		return headers
+
+"""CacheEntry for response_headers with validators or None"""
+def _revalidatable_entry(response_headers, data):
+	etag = response_headers.get("etag")
+	last_modified = response_headers.get("last-modified")
+
+	if etag == None and last_modified == None:
+		return None
+
+	return CacheEntry(etag, last_modified, data)
+
+"""On-disk HTTP cache of GET responses keyed by URL and user identity. Stores the
+validators (ETag, Last-Modified) along with the parsed response, so a 304 is served
+without parsing JSON again. Evicts the least recently used entries when more than
+max_entries entries or max_size bytes are stored."""
+class HttpCache(object):
+
+	def __init__(self, path, identity, max_entries=DEFAULT_MAX_ENTRIES, max_size=DEFAULT_MAX_SIZE):
+		self._path = path
+		self._identity = identity
+		self._max_entries = max_entries
+		self._max_size = max_size
+
+		if not os.path.exists(self._path):
+			# cached issues are readable by the user only
+			os.makedirs(self._path, 0700)
+
+	def _entry_path(self, url):
+		return os.path.join(self._path, hashlib.sha1(self._identity + "\n" + url).hexdigest())
+
+	"""Return the CacheEntry for url or None"""
+	def lookup(self, url):
+		entry_path = self._entry_path(url)
+
+		try:
+			with open(entry_path, "rb") as f:
+				(etag, last_modified, data) = cPickle.load(f)
+		except (IOError, EOFError, ValueError, cPickle.UnpicklingError):
+			return None
+
+		# the modification time orders the entries for eviction
+		os.utime(entry_path, None)
+
+		return CacheEntry(etag, last_modified, data)
+
+	"""Store data for url if the response headers contain validators"""
+	def store(self, url, response_headers, data):
+		entry = _revalidatable_entry(response_headers, data)
+
+		if entry == None:
+			return
+
+		entry_path = self._entry_path(url)
+
+		# write aside and rename to never expose partial entries
+		with open(entry_path + ".tmp", "wb") as f:
+			cPickle.dump((entry.etag, entry.last_modified, entry.data), f, cPickle.HIGHEST_PROTOCOL)
+
+		os.rename(entry_path + ".tmp", entry_path)
+
+		self._evict()
+
+	def _evict(self):
+		entries = []
+
+		for name in os.listdir(self._path):
+			entry_path = os.path.join(self._path, name)
+
+			try:
+				stat = os.stat(entry_path)
+			except OSError:
+				continue
+
+			entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+		# least recently used first
+		entries.sort()
+
+		size = sum(map(lambda entry: entry[1], entries))
+		count = len(entries)
+
+		for (_mtime, entry_size, entry_path) in entries:
+			if count <= self._max_entries and size <= self._max_size:
+				break
+
+			try:
+				os.remove(entry_path)
+			except OSError:
+				pass
+
+			count -= 1
+			size -= entry_size
+
+	def clear(self):
+		for name in os.listdir(self._path):
+			os.remove(os.path.join(self._path, name))
+
+"""HTTP cache like HttpCache held in memory by long running processes (shell, daemon),
+optionally in front of a backing HttpCache. Keeps the max_entries entries used last."""
+class MemoryCache(object):
+
+	def __init__(self, backing=None, max_entries=DEFAULT_MAX_ENTRIES):
+		self._backing = backing
+		self._max_entries = max_entries
+
+		# least recently used first
+		self._entries = collections.OrderedDict()
+
+	def lookup(self, url):
+		entry = self._entries.pop(url, None)
+
+		if entry == None and self._backing != None:
+			entry = self._backing.lookup(url)
+
+		if entry != None:
+			self._remember(url, entry)
+
+		return entry
+
+	def store(self, url, response_headers, data):
+		if self._backing != None:
+			self._backing.store(url, response_headers, data)
+
+		entry = _revalidatable_entry(response_headers, data)
+
+		if entry != None:
+			self._entries.pop(url, None)
+			self._remember(url, entry)
+
+	def _remember(self, url, entry):
+		self._entries[url] = entry
+
+		while len(self._entries) > self._max_entries:
+			self._entries.popitem(last=False)
+
+	def clear(self):
+		self._entries.clear()
+
+		if self._backing != None:
+			self._backing.clear()
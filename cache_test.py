@@ -0,0 +1,131 @@
+
+import unittest
+import tempfile
+import shutil
+import os
+import os.path
+import cache
+
+class HttpCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.path = os.path.join(tempfile.mkdtemp(), "cache")
+
+	def tearDown(self):
+		shutil.rmtree(os.path.dirname(self.path))
+
+	"""It should create the cache directory readable by the user only"""
+	def test_create_directory(self):
+		cache.HttpCache(self.path, "user")
+
+		self.assertEqual(os.stat(self.path).st_mode & 0777, 0700)
+
+	"""It should return the stored data along with the validators"""
+	def test_store_lookup(self):
+		http_cache = cache.HttpCache(self.path, "user")
+
+		http_cache.store("http://host/a", {"etag": "\"abc\"", "last-modified": "Fri, 13 Feb 2015 10:00:00 GMT"}, {"key": "A-1"})
+
+		entry = http_cache.lookup("http://host/a")
+
+		self.assertEqual(entry.data, {"key": "A-1"})
+		self.assertEqual(entry.validators(), [
+			"If-None-Match: \"abc\"",
+			"If-Modified-Since: Fri, 13 Feb 2015 10:00:00 GMT"
+		])
+
+	"""It should not store responses without validators"""
+	def test_store_without_validators(self):
+		http_cache = cache.HttpCache(self.path, "user")
+
+		http_cache.store("http://host/a", {"content-type": "application/json"}, {"key": "A-1"})
+
+		self.assertEqual(http_cache.lookup("http://host/a"), None)
+
+	"""It should not share entries between users"""
+	def test_identity(self):
+		cache.HttpCache(self.path, "user").store("http://host/a", {"etag": "1"}, {"key": "A-1"})
+
+		self.assertEqual(cache.HttpCache(self.path, "other").lookup("http://host/a"), None)
+
+	"""It should evict the least recently used entries"""
+	def test_evict_lru(self):
+		http_cache = cache.HttpCache(self.path, "user", max_entries=2)
+
+		http_cache.store("http://host/a", {"etag": "1"}, "A")
+		os.utime(http_cache._entry_path("http://host/a"), (1000, 1000))
+
+		http_cache.store("http://host/b", {"etag": "1"}, "B")
+		os.utime(http_cache._entry_path("http://host/b"), (2000, 2000))
+
+		# using a makes b the least recently used entry
+		http_cache.lookup("http://host/a")
+
+		http_cache.store("http://host/c", {"etag": "1"}, "C")
+
+		self.assertNotEqual(http_cache.lookup("http://host/a"), None)
+		self.assertEqual(http_cache.lookup("http://host/b"), None)
+		self.assertNotEqual(http_cache.lookup("http://host/c"), None)
+
+	"""It should evict entries exceeding the size limit"""
+	def test_evict_size(self):
+		http_cache = cache.HttpCache(self.path, "user", max_size=1000)
+
+		http_cache.store("http://host/a", {"etag": "1"}, "A" * 600)
+		os.utime(http_cache._entry_path("http://host/a"), (1000, 1000))
+
+		http_cache.store("http://host/b", {"etag": "1"}, "B" * 600)
+
+		self.assertEqual(http_cache.lookup("http://host/a"), None)
+		self.assertNotEqual(http_cache.lookup("http://host/b"), None)
+
+class MemoryCacheTest(unittest.TestCase):
+
+	"""It should return stored entries with their validators"""
+	def test_store_lookup(self):
+		memory_cache = cache.MemoryCache()
+
+		memory_cache.store("http://host/a", {"etag": "1"}, {"key": "A-1"})
+
+		entry = memory_cache.lookup("http://host/a")
+
+		self.assertEqual(entry.data, {"key": "A-1"})
+		self.assertEqual(entry.validators(), ["If-None-Match: 1"])
+
+	"""It should not keep responses without validators"""
+	def test_store_without_validators(self):
+		memory_cache = cache.MemoryCache()
+
+		memory_cache.store("http://host/a", {}, {"key": "A-1"})
+
+		self.assertEqual(memory_cache.lookup("http://host/a"), None)
+
+	"""It should keep the entries used last"""
+	def test_evict_lru(self):
+		memory_cache = cache.MemoryCache(max_entries=2)
+
+		memory_cache.store("http://host/a", {"etag": "1"}, "A")
+		memory_cache.store("http://host/b", {"etag": "1"}, "B")
+
+		# using a makes b the least recently used entry
+		memory_cache.lookup("http://host/a")
+
+		memory_cache.store("http://host/c", {"etag": "1"}, "C")
+
+		self.assertNotEqual(memory_cache.lookup("http://host/a"), None)
+		self.assertEqual(memory_cache.lookup("http://host/b"), None)
+		self.assertNotEqual(memory_cache.lookup("http://host/c"), None)
+
+	"""It should store to and load from the backing cache"""
+	def test_backing(self):
+		path = os.path.join(tempfile.mkdtemp(), "cache")
+
+		try:
+			http_cache = cache.HttpCache(path, "user")
+
+			cache.MemoryCache(http_cache).store("http://host/a", {"etag": "1"}, "A")
+
+			self.assertEqual(http_cache.lookup("http://host/a").data, "A")
+			self.assertEqual(cache.MemoryCache(http_cache).lookup("http://host/a").data, "A")
+		finally:
+			shutil.rmtree(os.path.dirname(path))
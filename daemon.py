@@ -0,0 +1,278 @@
+import sys
+import os
+import os.path
+import lazy
+
+# imported when connecting, not by a client finding no daemon running
+socket = lazy.LazyModule("socket")
+json = lazy.LazyModule("json")
+
+# in $HOME
+SOCKET_FILE = ".pyjirasock"
+
+"""Messages between client and daemon are JSON objects, one per line:
+
+client -> daemon: {"argv": [...], "cwd": path, "tty": bool} to run a command in the client's
+                  working directory, tty telling whether its stdin is a terminal,
+                  {"stdin": text} answering a read
+daemon -> client: {"out": text}, {"err": text} for output of the command,
+                  {"in": "read"|"readline"} to read the client's stdin,
+                  {"exit": code} when the command is done,
+                  {"fallback": true} to run the command in the client instead, only
+                  if the command has not written any output yet"""
+
+def socket_path():
+	return os.path.join(os.getenv("HOME"), SOCKET_FILE)
+
+"""Raised by a command run by the daemon that has to be run in the client, like
+one that needs to ask for the password. Once the command has written output it
+fails instead, as the client would write the output again."""
+class Fallback(BaseException):
+	pass
+
+
+"""Run argv by a daemon listening on path, streaming its output to stdout/stderr.
+Returns the exit code or None if no daemon is running or it handed the command back.
+Once the daemon got the command it is not run again here: it may have been run."""
+def forward(argv, path=None):
+	if path == None:
+		path = socket_path()
+
+	sock = _connect(path)
+
+	if sock == None:
+		return None
+
+	f = sock.makefile("r+b")
+
+	# stdin passed to the daemon, kept for running the command here after all
+	read_stdin = []
+
+	try:
+		try:
+			_send(f, {"argv": argv, "cwd": os.getcwd(), "tty": sys.stdin.isatty()})
+		except socket.error:
+			# gone before taking the command
+			return None
+
+		try:
+			for line in f:
+				message = json.loads(line)
+
+				if "out" in message:
+					sys.stdout.write(message["out"].encode("utf8"))
+				elif "err" in message:
+					sys.stderr.write(message["err"].encode("utf8"))
+				elif "in" in message:
+					text = sys.stdin.read() if message["in"] == "read" else sys.stdin.readline()
+					read_stdin.append(text)
+
+					_send(f, {"stdin": text.decode("utf8")})
+				elif "exit" in message:
+					return message["exit"]
+				elif "fallback" in message:
+					break
+			else:
+				print >> sys.stderr, "Daemon closed the connection before the command completed"
+				return 1
+		except (socket.error, ValueError) as e:
+			print >> sys.stderr, "Connection to the daemon failed: %s" % (e)
+			return 1
+	finally:
+		f.close()
+		sock.close()
+
+	if len(read_stdin) > 0:
+		sys.stdin = _ReplayedStdin("".join(read_stdin), sys.stdin)
+
+	return None
+
+def _connect(path):
+	if not os.path.exists(path):
+		return None
+
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+	try:
+		sock.connect(path)
+	except socket.error:
+		# left behind by a daemon that is gone
+		sock.close()
+		return None
+
+	return sock
+
+"""Whether a daemon is listening on path"""
+def is_running(path=None):
+	sock = _connect(path if path != None else socket_path())
+
+	if sock == None:
+		return False
+
+	sock.close()
+
+	return True
+
+def _send(f, message):
+	f.write(json.dumps(message) + "\n")
+	f.flush()
+
+"""Stdin consumed already, followed by the rest of the original stdin"""
+class _ReplayedStdin(object):
+
+	def __init__(self, text, stdin):
+		self._lines = text.splitlines(True)
+		self._stdin = stdin
+
+	def read(self):
+		text = "".join(self._lines)
+		self._lines = []
+
+		return text + self._stdin.read()
+
+	def readline(self):
+		if len(self._lines) > 0:
+			return self._lines.pop(0)
+
+		return self._stdin.readline()
+
+	def isatty(self):
+		return self._stdin.isatty()
+
+
+"""Output of the command sent to the client as it is written"""
+class _RemoteOutput(object):
+
+	def __init__(self, f, kind):
+		self._f = f
+		self._kind = kind
+		self.written = False
+
+	def write(self, text):
+		self.written = True
+		_send(self._f, {self._kind: text.decode("utf8", "replace") if isinstance(text, str) else text})
+
+	def flush(self):
+		pass
+
+"""Stdin of the client, read on demand"""
+class _RemoteInput(object):
+
+	def __init__(self, f, tty=False):
+		self._f = f
+		self._tty = tty
+
+	def _read(self, how):
+		_send(self._f, {"in": how})
+
+		message = json.loads(self._f.readline())
+
+		return message["stdin"].encode("utf8")
+
+	def read(self):
+		return self._read("read")
+
+	def readline(self):
+		return self._read("readline")
+
+	def isatty(self):
+		return self._tty
+
+
+"""Serve commands on a Unix socket at path until interrupted. execute(argv) runs a
+command, writing to sys.stdout/sys.stderr and reading sys.stdin, which are connected
+to the client meanwhile. Commands are run one after another as execute() is not
+expected to be thread safe."""
+def serve(path, execute):
+	# the socket is used by the user only
+	old_umask = os.umask(0077)
+
+	try:
+		if os.path.exists(path):
+			os.remove(path)
+
+		server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		server.bind(path)
+		server.listen(16)
+	finally:
+		os.umask(old_umask)
+
+	try:
+		while True:
+			(conn, _address) = server.accept()
+
+			try:
+				_handle(conn, execute)
+			except socket.error:
+				# client went away
+				pass
+			finally:
+				conn.close()
+	finally:
+		server.close()
+		os.remove(path)
+
+def _handle(conn, execute):
+	f = conn.makefile("r+b")
+
+	line = f.readline()
+
+	# probed by is_running()
+	if line == "":
+		return
+
+	request = json.loads(line)
+	argv = map(lambda arg: arg.encode("utf8"), request["argv"])
+
+	streams = (sys.stdout, sys.stderr, sys.stdin)
+
+	outputs = (_RemoteOutput(f, "out"), _RemoteOutput(f, "err"))
+
+	(sys.stdout, sys.stderr) = outputs
+	sys.stdin = _RemoteInput(f, request.get("tty", False))
+
+	code = 0
+
+	# relative paths (like of batch files) are the client's
+	cwd = os.getcwd()
+
+	try:
+		if "cwd" in request:
+			os.chdir(request["cwd"])
+
+		execute(argv)
+	except SystemExit as e:
+		code = _exit_code(e)
+	except Fallback:
+		if any(map(lambda output: output.written, outputs)):
+			print >> sys.stderr, "Session expired while running the command, log in by running a command without the daemon"
+			code = 1
+		else:
+			code = None
+	except Exception as e:
+		print >> sys.stderr, "Daemon failed to run command: %s" % (e)
+		code = 1
+	finally:
+		(sys.stdout, sys.stderr, sys.stdin) = streams
+		os.chdir(cwd)
+
+	if code != None:
+		_send(f, {"exit": code})
+	else:
+		_send(f, {"fallback": True})
+
+	f.close()
+
+# like the interpreter does for sys.exit(code)
+def _exit_code(system_exit):
+	code = system_exit.code
+
+	if code == None:
+		return 0
+
+	if isinstance(code, int):
+		return code
+
+	print >> sys.stderr, code
+
+	return 1
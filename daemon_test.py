@@ -0,0 +1,193 @@
+
+import unittest
+import tempfile
+import shutil
+import time
+import sys
+import os
+import os.path
+import signal
+import StringIO
+import daemon
+import jira
+
+class DaemonTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.dir, "sock")
+
+		self.streams = (sys.stdout, sys.stdin, sys.stderr)
+		self.server_pid = None
+
+	def tearDown(self):
+		(sys.stdout, sys.stdin, sys.stderr) = self.streams
+
+		if self.server_pid != None:
+			os.kill(self.server_pid, signal.SIGKILL)
+			os.waitpid(self.server_pid, 0)
+
+		shutil.rmtree(self.dir)
+
+	# the daemon redirects the standard streams, so it is run in a process of its own
+	def _serve(self, execute):
+		self.server_pid = os.fork()
+
+		if self.server_pid == 0:
+			try:
+				daemon.serve(self.path, execute)
+			finally:
+				os._exit(0)
+
+		while not daemon.is_running(self.path):
+			time.sleep(0.01)
+
+	"""It should not forward without a daemon running"""
+	def test_forward_not_running(self):
+		assert daemon.forward(["get", "A-1"], self.path) == None
+
+	"""It should stream the output of the command and return its exit code"""
+	def test_forward(self):
+		def execute(argv):
+			print "run %s" % (" ".join(argv))
+			sys.exit(3)
+
+		self._serve(execute)
+
+		sys.stdout = StringIO.StringIO()
+
+		code = daemon.forward(["get", "A-1"], self.path)
+		output = sys.stdout.getvalue()
+
+		sys.stdout = self.streams[0]
+
+		assert code == 3
+		assert output == "run get A-1\n"
+
+	"""It should pass stdin of the client on demand"""
+	def test_forward_stdin(self):
+		def execute(argv):
+			sys.stdout.write(sys.stdin.read().upper())
+
+		self._serve(execute)
+
+		sys.stdout = StringIO.StringIO()
+		sys.stdin = StringIO.StringIO("a-1 a-2")
+
+		code = daemon.forward(["get"], self.path)
+		output = sys.stdout.getvalue()
+
+		sys.stdout = self.streams[0]
+
+		assert code == 0
+		assert output == "A-1 A-2"
+
+	"""It should hand back a command and keep its stdin for running it in the client"""
+	def test_forward_fallback(self):
+		def execute(argv):
+			sys.stdin.readline()
+			raise daemon.Fallback()
+
+		self._serve(execute)
+
+		sys.stdin = StringIO.StringIO("a-1\na-2\n")
+
+		assert daemon.forward(["get"], self.path) == None
+		assert sys.stdin.read() == "a-1\na-2\n"
+
+	"""It should fail instead of handing back a command that wrote output already"""
+	def test_forward_fallback_after_output(self):
+		class ExpiringApi(object):
+			def search_stream(self, jql, max_results, fields, start_at, result):
+				# the session expires before the second page
+				if start_at > 0:
+					raise jira.JiraStatusException(401, "/api/2/search", "")
+
+				yield {"key": "A-1", "fields": {}}
+
+				result.update({"total": 2})
+
+		def reauthenticate():
+			raise daemon.Fallback()
+
+		def execute(argv):
+			for issue in jira.SearchResult(ExpiringApi(), "project = A", 2, [], page_size=1, reauthenticate=reauthenticate):
+				print issue._key
+
+		self._serve(execute)
+
+		sys.stdout = StringIO.StringIO()
+		sys.stderr = StringIO.StringIO()
+
+		code = daemon.forward(["query", "project = A"], self.path)
+		(output, errors) = (sys.stdout.getvalue(), sys.stderr.getvalue())
+
+		(sys.stdout, sys.stderr) = (self.streams[0], self.streams[2])
+
+		assert code == 1
+		assert output == "A-1\n"
+		assert errors == "Session expired while running the command, log in by running a command without the daemon\n"
+
+	"""It should tell the command whether stdin of the client is a terminal"""
+	def test_forward_tty(self):
+		class Terminal(StringIO.StringIO):
+			def isatty(self):
+				return True
+
+		def execute(argv):
+			print sys.stdin.isatty()
+
+		self._serve(execute)
+
+		sys.stdout = StringIO.StringIO()
+
+		for stdin in (StringIO.StringIO(""), Terminal("")):
+			sys.stdin = stdin
+			daemon.forward(["get"], self.path)
+
+		output = sys.stdout.getvalue()
+		sys.stdout = self.streams[0]
+
+		assert output == "False\nTrue\n"
+
+	"""It should run the command in the working directory of the client"""
+	def test_forward_cwd(self):
+		def execute(argv):
+			sys.stdout.write(os.getcwd())
+
+		self._serve(execute)
+
+		sys.stdout = StringIO.StringIO()
+		cwd = os.getcwd()
+		os.chdir(self.dir)
+
+		try:
+			code = daemon.forward(["batch", "commands.txt"], self.path)
+		finally:
+			os.chdir(cwd)
+
+		output = sys.stdout.getvalue()
+		sys.stdout = self.streams[0]
+
+		assert code == 0
+		assert os.path.realpath(output) == os.path.realpath(self.dir)
+
+	"""It should fail instead of running the command again if the daemon went away while running it"""
+	def test_forward_dropped(self):
+		def execute(argv):
+			print "commented"
+			sys.stdout.flush()
+			os._exit(0)
+
+		self._serve(execute)
+
+		sys.stdout = StringIO.StringIO()
+		sys.stderr = StringIO.StringIO()
+
+		code = daemon.forward(["comment", "A-1", "done"], self.path)
+		output = sys.stdout.getvalue()
+
+		(sys.stdout, sys.stderr) = (self.streams[0], self.streams[2])
+
+		assert code == 1
+		assert output == "commented\n"
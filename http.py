@@ -1,80 +1,164 @@
 
 import pycurl
 import urllib
-import StringIO
 import re
+import collections
 
-"""Facade for pycurl providing HTTP verb methods and simple interface."""
-class Http(object):
+# seconds a connection may idle before keep-alive probes are sent, and between probes
+KEEPALIVE_IDLE = 60
+KEEPALIVE_INTERVAL = 30
 
+# seconds resolved host names are cached
+DNS_CACHE_TIMEOUT = 600
 
-	def __init__(self, proxy=None, user_agent_prefix=None, no_check_certificate=False, _curl_verbose=False):
-		self.c = pycurl.Curl()
+# number of Transfer records kept in Http.transfers
+TRANSFER_LOG_SIZE = 100
 
-		if proxy != None:
-			self.c.setopt(pycurl.PROXY, proxy)
+# bytes preallocated for a response body at most, whatever its Content-Length:
+# larger bodies grow the buffer as they arrive
+MAX_RESERVED_BYTES = 4 * 1024 * 1024
 
-		if no_check_certificate:
-			self.c.setopt(pycurl.SSL_VERIFYPEER, 0)
+"""Facade for pycurl providing HTTP verb methods and simple interface."""
+class Http(object):
+
+
+	def __init__(self, proxy=None, user_agent_prefix=None, no_check_certificate=False, max_connections=8, _curl_verbose=False):
+		self._proxy = proxy
+		self._no_check_certificate = no_check_certificate
+		self._curl_verbose = _curl_verbose
 
 		if user_agent_prefix != None:
 			# prepend prefix, add pycurl UA perdefault
-			ua = user_agent_prefix + " " + pycurl.version
+			self._ua = user_agent_prefix + " " + pycurl.version
 		else:
-			ua = None
+			self._ua = None
+
+		# upper bound of concurrent transfers in batch()
+		self.max_connections = max_connections
+
+		# easy handles driven by batch(), created on demand and reused
+		self._pool = []
+
+		# kept across batches to keep its connections alive
+		self._multi = None
+
+		# Transfer record per completed request, most recent last
+		self.transfers = collections.deque(maxlen=TRANSFER_LOG_SIZE)
+
+		# DNS cache and TLS sessions (and connections if supported) shared by all
+		# handles, so later requests skip name lookups and resume TLS sessions
+		self._share = pycurl.CurlShare()
+		self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+		self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+
+		if hasattr(pycurl, "LOCK_DATA_CONNECT"):
+			self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_CONNECT)
+
+		self.c = self._new_handle()
 
-		if ua != None:
-			self.c.setopt(pycurl.USERAGENT, ua)
+	def _new_handle(self):
+		c = pycurl.Curl()
 
-		self.c.setopt(pycurl.VERBOSE, 1 if _curl_verbose else 0)
+		# a share is kept on reset()
+		c.setopt(pycurl.SHARE, self._share)
 
-	"""Generic HTTP verb method"""
-	def method(self, method, url, data=None, headers=[], cookies=[]):
+		self._configure(c)
 
-		#c.setopt(pycurl.URL, 'http://stackoverflow.com')
-		self.c.setopt(pycurl.URL, url)
+		return c
+
+	"""Apply the per instance options to an easy handle"""
+	def _configure(self, c):
+		if self._proxy != None:
+			c.setopt(pycurl.PROXY, self._proxy)
+
+		if self._no_check_certificate:
+			c.setopt(pycurl.SSL_VERIFYPEER, 0)
+
+		if self._ua != None:
+			c.setopt(pycurl.USERAGENT, self._ua)
+
+		c.setopt(pycurl.VERBOSE, 1 if self._curl_verbose else 0)
+
+		c.setopt(pycurl.DNS_CACHE_TIMEOUT, DNS_CACHE_TIMEOUT)
+
+		# keep idle connections alive between requests
+		c.setopt(pycurl.TCP_KEEPALIVE, 1)
+		c.setopt(pycurl.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+		c.setopt(pycurl.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+
+		# send Accept-Encoding with all encodings libcurl supports (gzip, deflate,
+		# br if built with brotli), libcurl decodes the body while it arrives
+		c.setopt(pycurl.ENCODING, "")
+
+	"""Set up an easy handle for a request, return the body buffer and the list Set-Cookie values get collected in.
+	The body is written to output if passed, the response headers are put into the
+	response_headers dict (lower case names) if passed."""
+	def _prepare(self, c, method, url, data, headers, cookies, output=None, response_headers=None):
+		c.setopt(pycurl.URL, url)
 
 		if method == 'POST' or method == 'PUT':
 			if data == None:
 				raise Exception("Cannot %s with None data" % (method))
 
 			if method == 'POST':
-				self.c.setopt(pycurl.POST, 1)
+				c.setopt(pycurl.POST, 1)
 			elif method == 'PUT':
-				self.c.setopt(pycurl.CUSTOMREQUEST, "PUT")
+				c.setopt(pycurl.CUSTOMREQUEST, "PUT")
 
 			# convert dict to URL encoded string
 			if type(data) == dict:
 				data = urllib.urlencode(data)
 
-				headers.append("Content-Type: application/x-www-form-urlencoded; charset=UTF-8")
+				# do not append to the caller's (or the default) list
+				headers = headers + ["Content-Type: application/x-www-form-urlencoded; charset=UTF-8"]
 
-			self.c.setopt(pycurl.POSTFIELDSIZE, len(data))
-			self.c.setopt(pycurl.POSTFIELDS, data)
+			c.setopt(pycurl.POSTFIELDSIZE, len(data))
+			c.setopt(pycurl.POSTFIELDS, data)
 		else:
-			self.c.setopt(pycurl.HTTPGET, 1)
+			c.setopt(pycurl.HTTPGET, 1)
 
 		# ["Content-Type: application/json"]
-		self.c.setopt(pycurl.HTTPHEADER, headers)
+		c.setopt(pycurl.HTTPHEADER, headers)
 
 		# "name=value; name=value"
-		self.c.setopt(pycurl.COOKIE, "; ".join(cookies))
+		c.setopt(pycurl.COOKIE, "; ".join(cookies))
 
 		set_cookies = []
 
-		# closure to capture Set-Cookie
+		buf = ResponseBuffer(output)
+
+		# closure to capture Set-Cookie and Content-Length
 		def _write_header(header):
 			match = re.match("^Set-Cookie: (.*)$", header)
 
 			if match:
 				set_cookies.append(match.group(1))
 
+			match = re.match("^Content-Length: *([0-9]+)", header, re.IGNORECASE)
+
+			if match:
+				buf.reserve(int(match.group(1)))
+
+			if response_headers != None:
+				# start over on each response (redirect, 100 Continue)
+				if header.startswith("HTTP/"):
+					response_headers.clear()
+				elif ":" in header:
+					(name, value) = header.split(":", 1)
+					response_headers[name.strip().lower()] = value.strip()
+
 		# use closure to collect cookies sent from the server
-		self.c.setopt(pycurl.HEADERFUNCTION, _write_header)
+		c.setopt(pycurl.HEADERFUNCTION, _write_header)
 
-		buf = StringIO.StringIO()
+		c.setopt(pycurl.WRITEFUNCTION, buf.write)
 
-		self.c.setopt(pycurl.WRITEFUNCTION, buf.write)
+		return (buf, set_cookies)
+
+	"""Generic HTTP verb method. If output (a file like object) is passed, the body is
+	streamed into it instead of being returned. The response headers are put into the
+	response_headers dict if passed."""
+	def method(self, method, url, data=None, headers=[], cookies=[], output=None, response_headers=None):
+		(buf, set_cookies) = self._prepare(self.c, method, url, data, headers, cookies, output, response_headers)
 
 		try:
 			self.c.perform()
@@ -83,23 +167,275 @@ class Http(object):
 
 		status = self.c.getinfo(self.c.RESPONSE_CODE)
 
+		self._log_transfer(self.c, url, status, buf)
+
 		return (status, buf.getvalue(), set_cookies)
 
+	"""Most recent Transfer or None"""
+	def last_transfer(self):
+		if len(self.transfers) == 0:
+			return None
+
+		return self.transfers[-1]
+
+	def _log_transfer(self, c, url, status, buf):
+		# SIZE_DOWNLOAD counts the body bytes as received, before decoding
+		self.transfers.append(Transfer(url, status, int(c.getinfo(pycurl.SIZE_DOWNLOAD)), len(buf)))
+
+	"""Perform requests concurrently on a pool of easy handles driven by pycurl.CurlMulti.
+
+	requests is a list of (method, url, data, headers, cookies) tuples. At most max_connections
+	(defaults to the instance's max_connections) transfers are active at a time. Yields
+	(index, (status, body, set_cookies)) in the order the transfers complete, index being
+	the position of the request in requests."""
+	def batch(self, requests, max_connections=None):
+		if len(requests) == 0:
+			return
+
+		if max_connections == None:
+			max_connections = self.max_connections
+
+		max_connections = max(1, min(max_connections, len(requests)))
+
+		while len(self._pool) < max_connections:
+			self._pool.append(self._new_handle())
+
+		free = self._pool[0:max_connections]
+
+		# handle => (index, buf, set_cookies)
+		active = {}
+		next_index = 0
+
+		multi = self._get_multi()
+
+		try:
+			while next_index < len(requests) or len(active) > 0:
+				# hand queued requests to idle handles
+				while next_index < len(requests) and len(free) > 0:
+					c = free.pop()
+					c.reset()
+					self._configure(c)
+
+					(method, url, data, headers, cookies) = requests[next_index]
+					(buf, set_cookies) = self._prepare(c, method, url, data, headers, cookies)
+
+					active[c] = (next_index, buf, set_cookies)
+					multi.add_handle(c)
+
+					next_index += 1
+
+				while True:
+					(ret, _num_handles) = multi.perform()
+
+					if ret != pycurl.E_CALL_MULTI_PERFORM:
+						break
+
+				while True:
+					(num_queued, ok_list, err_list) = multi.info_read()
+
+					for (c, errno, errmsg) in err_list:
+						multi.remove_handle(c)
+						active.pop(c)
+						free.append(c)
+
+						raise HttpError(pycurl.error(errno, errmsg))
+
+					for c in ok_list:
+						multi.remove_handle(c)
+						(index, buf, set_cookies) = active.pop(c)
+						free.append(c)
+
+						status = c.getinfo(pycurl.RESPONSE_CODE)
+
+						self._log_transfer(c, requests[index][1], status, buf)
+
+						yield (index, (status, buf.getvalue(), set_cookies))
+
+					if num_queued == 0:
+						break
+
+				if len(active) > 0:
+					multi.select(1.0)
+		finally:
+			for c in active:
+				multi.remove_handle(c)
+
+	"""Perform a request while the returned StreamedResponse is iterated, which yields
+	the body in chunks as they arrive. Lets the caller process the body during the transfer."""
+	def stream(self, method, url, data=None, headers=[], cookies=[]):
+		return StreamedResponse(self._stream(method, url, data, headers, cookies))
+
+	def _stream(self, method, url, data, headers, cookies):
+		if len(self._pool) == 0:
+			self._pool.append(self._new_handle())
+
+		c = self._pool[0]
+		c.reset()
+		self._configure(c)
+
+		chunks = _Chunks()
+
+		(buf, set_cookies) = self._prepare(c, method, url, data, headers, cookies, chunks)
+
+		multi = self._get_multi()
+		multi.add_handle(c)
+
+		try:
+			done = False
+
+			while not done:
+				while True:
+					(ret, _num_handles) = multi.perform()
+
+					if ret != pycurl.E_CALL_MULTI_PERFORM:
+						break
+
+				while True:
+					(num_queued, ok_list, err_list) = multi.info_read()
+
+					for (_c, errno, errmsg) in err_list:
+						raise HttpError(pycurl.error(errno, errmsg))
+
+					done = done or len(ok_list) > 0
+
+					if num_queued == 0:
+						break
+
+				while len(chunks) > 0:
+					yield chunks.popleft()
+
+				if not done:
+					multi.select(1.0)
+		finally:
+			multi.remove_handle(c)
+
+		status = c.getinfo(pycurl.RESPONSE_CODE)
+
+		self._log_transfer(c, url, status, buf)
+
+		# final item: the response details
+		yield (status, set_cookies)
+
+	def _get_multi(self):
+		if self._multi == None:
+			self._multi = pycurl.CurlMulti()
+
+		return self._multi
+
 	def close(self):
 		self.c.close()
 
+		if self._multi != None:
+			self._multi.close()
+			self._multi = None
+
+		for c in self._pool:
+			c.close()
+
+		self._pool = []
+
+		self._share.close()
+
 	"""Send HTTP POST passing data, headers and cookies."""
 	def post(self, url, data, headers=[], cookies=[]):
 		return self.method("POST", url, data, headers, cookies)
 
-	"""Send HTTP GET passing headers and cookies."""
-	def get(self, url, headers=[], cookies=[]):
-		return self.method("GET", url, None, headers, cookies)
+	"""Send HTTP GET passing headers and cookies, optionally streaming the body into output
+	and collecting the response headers into response_headers."""
+	def get(self, url, headers=[], cookies=[], output=None, response_headers=None):
+		return self.method("GET", url, None, headers, cookies, output, response_headers)
 
 	"""Send HTTP PUT passing data, headers and cookies."""
 	def put(self, url, data, headers=[], cookies=[]):
 		return self.method("PUT", url, data, headers, cookies)
 
+"""Response body buffer appending in place into a bytearray, sized upfront from
+Content-Length if known, instead of collecting chunks to join them afterwards.
+If an output file is passed the body is streamed into it and not kept."""
+class ResponseBuffer(object):
+
+	def __init__(self, output=None):
+		self._output = output
+		self._data = bytearray()
+		self._length = 0
+
+	"""Preallocate size bytes (up to MAX_RESERVED_BYTES), ignored once data has been written"""
+	def reserve(self, size):
+		size = min(size, MAX_RESERVED_BYTES)
+
+		if self._output == None and self._length == 0 and size > len(self._data):
+			self._data = bytearray(size)
+
+	def write(self, chunk):
+		end = self._length + len(chunk)
+
+		if self._output != None:
+			self._output.write(chunk)
+		elif end <= len(self._data):
+			self._data[self._length:end] = chunk
+		else:
+			# unknown or exceeded size (compressed Content-Length)
+			del self._data[self._length:]
+			self._data.extend(chunk)
+
+		self._length = end
+
+	def __len__(self):
+		return self._length
+
+	"""memoryview of the body without copying it"""
+	def view(self):
+		return memoryview(self._data)[0:min(self._length, len(self._data))]
+
+	"""Body as string (the json module needs one), None if streamed into output"""
+	def getvalue(self):
+		if self._output != None:
+			return None
+
+		# buffer() spares the copy slicing would make
+		return str(buffer(self._data, 0, self._length))
+
+"""Collects the body chunks of a streamed request"""
+class _Chunks(collections.deque):
+
+	write = collections.deque.append
+
+"""Body of a request performed while being iterated, the chunks being yielded as they
+arrive. status and set_cookies are available once the iteration completed."""
+class StreamedResponse(object):
+
+	def __init__(self, transfer):
+		self._transfer = transfer
+
+		self.status = None
+		self.set_cookies = None
+
+	def __iter__(self):
+		for item in self._transfer:
+			if type(item) == tuple:
+				(self.status, self.set_cookies) = item
+			else:
+				yield item
+
+"""Size of a completed request's body on the wire (possibly compressed) and decoded"""
+class Transfer(object):
+
+	def __init__(self, url, status, wire_bytes, decoded_bytes):
+		self.url = url
+		self.status = status
+		self.wire_bytes = wire_bytes
+		self.decoded_bytes = decoded_bytes
+
+	"""Decoded size by wire size, 1.0 for uncompressed or empty bodies"""
+	def ratio(self):
+		if self.wire_bytes == 0:
+			return 1.0
+
+		return float(self.decoded_bytes) / self.wire_bytes
+
+	def __str__(self):
+		return "%d %s: %d bytes on the wire, %d decoded" % (self.status, self.url, self.wire_bytes, self.decoded_bytes)
+
 """Wraps pycurl.error exceptions for HTTP errors"""
 class HttpError(Exception):
 
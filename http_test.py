@@ -6,17 +6,30 @@ from fudge.inspector import arg
 import pycurl
 import http
 import mox
+import StringIO
 
 class HttpTest(unittest.TestCase):
 
-	@fudge.patch("pycurl.Curl")
-	@fudge.patch("StringIO.StringIO")
-	def test_method_post(self, Curl_Mock, StringIO_Mock):
-		(StringIO_Mock.expects_call()
-			.returns_fake()
-			.provides("write")
-			.provides("getvalue").returns("RESPONSE DATA"))
+	# stands in for libcurl writing the body to the WRITEFUNCTION
+	def _respond(self, body):
+		def write_body(write):
+			write(body)
+			return True
+
+		return arg.passes_test(write_body)
+
+	# options every handle gets set up with
+	def _expect_configure(self, mock):
+		mock.expects('setopt').with_args(pycurl.SHARE, arg.any())
+		mock.expects('setopt').with_args(pycurl.VERBOSE, 0)
+		mock.expects('setopt').with_args(pycurl.DNS_CACHE_TIMEOUT, http.DNS_CACHE_TIMEOUT)
+		mock.expects('setopt').with_args(pycurl.TCP_KEEPALIVE, 1)
+		mock.expects('setopt').with_args(pycurl.TCP_KEEPIDLE, http.KEEPALIVE_IDLE)
+		mock.expects('setopt').with_args(pycurl.TCP_KEEPINTVL, http.KEEPALIVE_INTERVAL)
+		mock.expects('setopt').with_args(pycurl.ENCODING, "")
 
+	@fudge.patch("pycurl.Curl")
+	def test_method_post(self, Curl_Mock):
 		mock = (Curl_Mock.expects_call()
 			.returns_fake())
 
@@ -28,7 +41,7 @@ class HttpTest(unittest.TestCase):
 			if option == pycurl.HEADERFUNCTION:
 				value("Set-Cookie: new-cookie=1")
 
-		mock.expects('setopt').with_args(pycurl.VERBOSE, 0)
+		self._expect_configure(mock)
 		mock.expects('setopt').with_args(pycurl.URL, "http://host/path")
 
 		mock.expects('setopt').with_args(pycurl.POST, 1)
@@ -37,7 +50,7 @@ class HttpTest(unittest.TestCase):
 		mock.expects('setopt').with_args(pycurl.HTTPHEADER, ["Hdr-A: 1", "Hdr-B: 2"])
 		mock.expects('setopt').with_args(pycurl.COOKIE, "")
 		mock.provides('setopt').calls(get_header_fn)
-		mock.expects('setopt').with_args(pycurl.WRITEFUNCTION, arg.any())
+		mock.expects('setopt').with_args(pycurl.WRITEFUNCTION, self._respond("RESPONSE DATA"))
 		mock.expects('perform')
 		mock.has_attr(RESPONSE_CODE="RESPONSE_CODE_MOCK")
 		mock.provides('getinfo').calls(lambda _: 200)
@@ -53,13 +66,7 @@ class HttpTest(unittest.TestCase):
 
 
 	@fudge.patch("pycurl.Curl")
-	@fudge.patch("StringIO.StringIO")
-	def test_method_post_dict_data(self, Curl_Mock, StringIO_Mock):
-		(StringIO_Mock.expects_call()
-			.returns_fake()
-			.provides("write")
-			.provides("getvalue").returns("RESPONSE DATA"))
-
+	def test_method_post_dict_data(self, Curl_Mock):
 		mock = (Curl_Mock.expects_call()
 			.returns_fake())
 
@@ -71,7 +78,7 @@ class HttpTest(unittest.TestCase):
 			if option == pycurl.HEADERFUNCTION:
 				value("Set-Cookie: new-cookie=1")
 
-		mock.expects('setopt').with_args(pycurl.VERBOSE, 0)
+		self._expect_configure(mock)
 		mock.expects('setopt').with_args(pycurl.URL, "http://host/path")
 
 		mock.expects('setopt').with_args(pycurl.POST, 1)
@@ -84,7 +91,7 @@ class HttpTest(unittest.TestCase):
 		])
 		mock.expects('setopt').with_args(pycurl.COOKIE, "")
 		mock.provides('setopt').calls(get_header_fn)
-		mock.expects('setopt').with_args(pycurl.WRITEFUNCTION, arg.any())
+		mock.expects('setopt').with_args(pycurl.WRITEFUNCTION, self._respond("RESPONSE DATA"))
 		mock.expects('perform')
 		mock.has_attr(RESPONSE_CODE="RESPONSE_CODE_MOCK")
 		mock.provides('getinfo').calls(lambda _: 200)
@@ -99,12 +106,11 @@ class HttpTest(unittest.TestCase):
 
 
 	@fudge.patch("pycurl.Curl")
-	@fudge.patch("StringIO.StringIO")
-	def test_method_post_no_data(self, Curl_Mock, StringIO_Mock):
+	def test_method_post_no_data(self, Curl_Mock):
 		mock = (Curl_Mock.expects_call()
 			.returns_fake())
 
-		mock.expects('setopt').with_args(pycurl.VERBOSE, 0)
+		self._expect_configure(mock)
 		mock.expects('setopt').with_args(pycurl.URL, "http://host/path")
 
 		h = http.Http()
@@ -112,13 +118,7 @@ class HttpTest(unittest.TestCase):
 		self.assertRaises(Exception, h.method, "POST", None)
 
 	@fudge.patch("pycurl.Curl")
-	@fudge.patch("StringIO.StringIO")
-	def test_method_put(self, Curl_Mock, StringIO_Mock):
-		(StringIO_Mock.expects_call()
-			.returns_fake()
-			.provides("write")
-			.provides("getvalue").returns("RESPONSE DATA"))
-
+	def test_method_put(self, Curl_Mock):
 		mock = (Curl_Mock.expects_call()
 			.returns_fake())
 
@@ -130,7 +130,7 @@ class HttpTest(unittest.TestCase):
 			if option == pycurl.HEADERFUNCTION:
 				value("Set-Cookie: new-cookie=1")
 
-		mock.expects('setopt').with_args(pycurl.VERBOSE, 0)
+		self._expect_configure(mock)
 		mock.expects('setopt').with_args(pycurl.URL, "http://host/path")
 
 		mock.expects('setopt').with_args(pycurl.CUSTOMREQUEST, "PUT")
@@ -139,7 +139,7 @@ class HttpTest(unittest.TestCase):
 		mock.expects('setopt').with_args(pycurl.HTTPHEADER, ["Hdr-A: 1", "Hdr-B: 2"])
 		mock.expects('setopt').with_args(pycurl.COOKIE, "")
 		mock.provides('setopt').calls(get_header_fn)
-		mock.expects('setopt').with_args(pycurl.WRITEFUNCTION, arg.any())
+		mock.expects('setopt').with_args(pycurl.WRITEFUNCTION, self._respond("RESPONSE DATA"))
 		mock.expects('perform')
 		mock.has_attr(RESPONSE_CODE="RESPONSE_CODE_MOCK")
 		mock.provides('getinfo').calls(lambda _: 200)
@@ -155,13 +155,7 @@ class HttpTest(unittest.TestCase):
 
 
 	@fudge.patch("pycurl.Curl")
-	@fudge.patch("StringIO.StringIO")
-	def test_method_put_dict_data(self, Curl_Mock, StringIO_Mock):
-		(StringIO_Mock.expects_call()
-			.returns_fake()
-			.provides("write")
-			.provides("getvalue").returns("RESPONSE DATA"))
-
+	def test_method_put_dict_data(self, Curl_Mock):
 		mock = (Curl_Mock.expects_call()
 			.returns_fake())
 
@@ -173,7 +167,7 @@ class HttpTest(unittest.TestCase):
 			if option == pycurl.HEADERFUNCTION:
 				value("Set-Cookie: new-cookie=1")
 
-		mock.expects('setopt').with_args(pycurl.VERBOSE, 0)
+		self._expect_configure(mock)
 		mock.expects('setopt').with_args(pycurl.URL, "http://host/path")
 
 		mock.expects('setopt').with_args(pycurl.CUSTOMREQUEST, "PUT")
@@ -186,7 +180,7 @@ class HttpTest(unittest.TestCase):
 		])
 		mock.expects('setopt').with_args(pycurl.COOKIE, "")
 		mock.provides('setopt').calls(get_header_fn)
-		mock.expects('setopt').with_args(pycurl.WRITEFUNCTION, arg.any())
+		mock.expects('setopt').with_args(pycurl.WRITEFUNCTION, self._respond("RESPONSE DATA"))
 		mock.expects('perform')
 		mock.has_attr(RESPONSE_CODE="RESPONSE_CODE_MOCK")
 		mock.provides('getinfo').calls(lambda _: 200)
@@ -201,12 +195,11 @@ class HttpTest(unittest.TestCase):
 
 
 	@fudge.patch("pycurl.Curl")
-	@fudge.patch("StringIO.StringIO")
-	def test_method_post_no_data(self, Curl_Mock, StringIO_Mock):
+	def test_method_post_no_data(self, Curl_Mock):
 		mock = (Curl_Mock.expects_call()
 			.returns_fake())
 
-		mock.expects('setopt').with_args(pycurl.VERBOSE, 0)
+		self._expect_configure(mock)
 		mock.expects('setopt').with_args(pycurl.URL, "http://host/path")
 
 		h = http.Http()
@@ -216,13 +209,7 @@ class HttpTest(unittest.TestCase):
 
 
 	@fudge.patch("pycurl.Curl")
-	@fudge.patch("StringIO.StringIO")
-	def test_method_get(self, Curl_Mock, StringIO_Mock):
-		(StringIO_Mock.expects_call()
-			.returns_fake()
-			.provides("write")
-			.provides("getvalue").returns("RESPONSE DATA"))
-
+	def test_method_get(self, Curl_Mock):
 		mock = (Curl_Mock.expects_call()
 			.returns_fake())
 
@@ -234,7 +221,7 @@ class HttpTest(unittest.TestCase):
 			if option == pycurl.HEADERFUNCTION:
 				value("Set-Cookie: new-cookie=1")
 
-		mock.expects('setopt').with_args(pycurl.VERBOSE, 0)
+		self._expect_configure(mock)
 		mock.expects('setopt').with_args(pycurl.URL, "http://host/path")
 
 		mock.expects('setopt').with_args(pycurl.HTTPGET, 1)
@@ -244,7 +231,7 @@ class HttpTest(unittest.TestCase):
 		])
 		mock.expects('setopt').with_args(pycurl.COOKIE, "")
 		mock.provides('setopt').calls(get_header_fn)
-		mock.expects('setopt').with_args(pycurl.WRITEFUNCTION, arg.any())
+		mock.expects('setopt').with_args(pycurl.WRITEFUNCTION, self._respond("RESPONSE DATA"))
 		mock.expects('perform')
 		mock.has_attr(RESPONSE_CODE="RESPONSE_CODE_MOCK")
 		mock.provides('getinfo').calls(lambda _: 200)
@@ -257,15 +244,16 @@ class HttpTest(unittest.TestCase):
 		assert buf == "RESPONSE DATA"
 		assert cookies == ["new-cookie=1"]
 
+		# the getinfo mock answers 200 for SIZE_DOWNLOAD, too
+		transfer = h.last_transfer()
+
+		assert transfer.url == "http://host/path"
+		assert transfer.wire_bytes == 200
+		assert transfer.decoded_bytes == len("RESPONSE DATA")
 
-	@fudge.patch("pycurl.Curl")
-	@fudge.patch("StringIO.StringIO")
-	def test_method_raise_http_exception_on_perform_fail(self, Curl_Mock, StringIO_Mock):
-		(StringIO_Mock.expects_call()
-			.returns_fake()
-			.provides("write")
-			.provides("getvalue").returns("RESPONSE DATA"))
 
+	@fudge.patch("pycurl.Curl")
+	def test_method_raise_http_exception_on_perform_fail(self, Curl_Mock):
 		mock = (Curl_Mock.expects_call()
 			.returns_fake())
 
@@ -282,13 +270,7 @@ class HttpTest(unittest.TestCase):
 
 
 	@fudge.patch("pycurl.Curl")
-	@fudge.patch("StringIO.StringIO")
-	def test_method_raise_original_exception_on_perform_fail(self, Curl_Mock, StringIO_Mock):
-		(StringIO_Mock.expects_call()
-			.returns_fake()
-			.provides("write")
-			.provides("getvalue").returns("RESPONSE DATA"))
-
+	def test_method_raise_original_exception_on_perform_fail(self, Curl_Mock):
 		mock = (Curl_Mock.expects_call()
 			.returns_fake())
 
@@ -320,7 +302,7 @@ class HttpTest(unittest.TestCase):
 		h = http.Http()
 
 		self.mox.StubOutWithMock(h, "method")
-		h.method("GET", "http://host/path", None, ["Hdr-A: 1"], ["cookie=abc"]).AndReturn( (200, "Response", ["set-cookie-a=1", "set-cookie-b=2"]) )
+		h.method("GET", "http://host/path", None, ["Hdr-A: 1"], ["cookie=abc"], None, None).AndReturn( (200, "Response", ["set-cookie-a=1", "set-cookie-b=2"]) )
 
 		self.mox.ReplayAll()
 
@@ -353,3 +335,218 @@ class HttpTest(unittest.TestCase):
 		h.put("http://host/path", "DATA", ["Hdr-A: 1"], ["cookie=abc"])
 
 		self.mox.VerifyAll()
+
+
+class ResponseBufferTest(unittest.TestCase):
+
+	def test_write(self):
+		buf = http.ResponseBuffer()
+
+		buf.write("ABC")
+		buf.write("DEF")
+
+		assert len(buf) == 6
+		assert buf.getvalue() == "ABCDEF"
+		assert buf.view().tobytes() == "ABCDEF"
+
+	def test_write_reserved(self):
+		buf = http.ResponseBuffer()
+		buf.reserve(6)
+
+		data = buf._data
+
+		buf.write("ABC")
+		buf.write("DEF")
+
+		# written into the preallocated array
+		assert buf._data is data
+		assert buf.getvalue() == "ABCDEF"
+
+	def test_write_exceeding_reserved(self):
+		buf = http.ResponseBuffer()
+		buf.reserve(4)
+
+		buf.write("ABC")
+		buf.write("DEF")
+
+		assert len(buf) == 6
+		assert buf.getvalue() == "ABCDEF"
+
+	def test_write_less_than_reserved(self):
+		buf = http.ResponseBuffer()
+		buf.reserve(10)
+
+		buf.write("ABC")
+
+		assert len(buf) == 3
+		assert buf.getvalue() == "ABC"
+		assert buf.view().tobytes() == "ABC"
+
+	@patch("http.MAX_RESERVED_BYTES", 4)
+	def test_write_exceeding_max_reserved(self):
+		buf = http.ResponseBuffer()
+		buf.reserve(1024 * 1024 * 1024)
+
+		# a wrong or hostile Content-Length does not allocate its size
+		assert len(buf._data) == 4
+
+		buf.write("ABC")
+		buf.write("DEF")
+
+		assert buf.getvalue() == "ABCDEF"
+
+	def test_write_to_output(self):
+		output = StringIO.StringIO()
+
+		buf = http.ResponseBuffer(output)
+		buf.reserve(10)
+
+		buf.write("ABC")
+		buf.write("DEF")
+
+		assert len(buf) == 6
+		assert buf.getvalue() == None
+		assert output.getvalue() == "ABCDEF"
+
+
+class HttpBatchTest(unittest.TestCase):
+
+	def _mock_handles(self, Curl_Mock, status=200):
+		handles = []
+
+		# every easy handle remembers its options to let the
+		# multi mock "transfer" to the WRITEFUNCTION of the handle
+		def new_handle():
+			handle = MagicMock()
+			handle.options = {}
+			handle.setopt.side_effect = lambda option, value: handle.options.__setitem__(option, value)
+			handle.getinfo.side_effect = lambda info: status
+			handles.append(handle)
+
+			return handle
+
+		Curl_Mock.side_effect = new_handle
+
+		return handles
+
+	def _mock_multi(self, CurlMulti_Mock, fail=False):
+		added = []
+
+		multi = CurlMulti_Mock.return_value
+		multi.add_handle.side_effect = added.append
+		multi.perform.return_value = (0, 0)
+
+		# complete all added transfers on each read
+		def info_read():
+			done = list(added)
+			del added[:]
+
+			if fail:
+				return (0, [], [(handle, 7, "Couldn't connect") for handle in done])
+
+			for handle in done:
+				handle.options[pycurl.WRITEFUNCTION]("body of " + handle.options[pycurl.URL])
+
+			return (0, done, [])
+
+		multi.info_read.side_effect = info_read
+
+		return multi
+
+	@patch("pycurl.CurlMulti")
+	@patch("pycurl.Curl")
+	def test_batch(self, Curl_Mock, CurlMulti_Mock):
+		handles = self._mock_handles(Curl_Mock)
+		multi = self._mock_multi(CurlMulti_Mock)
+
+		h = http.Http(max_connections=2)
+
+		results = dict(h.batch([
+			("GET", "http://host/a", None, [], []),
+			("POST", "http://host/b", "DATA", ["Hdr-A: 1"], ["cookie=abc"]),
+			("GET", "http://host/c", None, [], [])
+		]))
+
+		assert results[0] == (200, "body of http://host/a", [])
+		assert results[1] == (200, "body of http://host/b", [])
+		assert results[2] == (200, "body of http://host/c", [])
+
+		assert sorted(map(lambda transfer: transfer.url, h.transfers)) == ["http://host/a", "http://host/b", "http://host/c"]
+
+		# the single call handle and a pool of two
+		assert len(handles) == 3
+		assert multi.add_handle.call_count == 3
+		assert multi.remove_handle.call_count == 3
+
+		# the multi handle keeps its connections until closed
+		assert not multi.close.called
+
+		h.close()
+
+		assert multi.close.called
+
+
+	@patch("pycurl.CurlMulti")
+	@patch("pycurl.Curl")
+	def test_batch_reuses_pool(self, Curl_Mock, CurlMulti_Mock):
+		handles = self._mock_handles(Curl_Mock)
+		self._mock_multi(CurlMulti_Mock)
+
+		h = http.Http(max_connections=4)
+
+		list(h.batch([("GET", "http://host/a", None, [], [])] * 4))
+		list(h.batch([("GET", "http://host/a", None, [], [])] * 2))
+
+		assert len(handles) == 5
+		assert CurlMulti_Mock.call_count == 1
+
+
+	@patch("pycurl.CurlMulti")
+	@patch("pycurl.Curl")
+	def test_batch_raise_http_exception_on_transfer_fail(self, Curl_Mock, CurlMulti_Mock):
+		self._mock_handles(Curl_Mock)
+		multi = self._mock_multi(CurlMulti_Mock, fail=True)
+
+		h = http.Http()
+
+		self.assertRaises(http.HttpError, list, h.batch([("GET", "http://host/a", None, [], [])]))
+
+		assert multi.remove_handle.called
+
+
+	@patch("pycurl.CurlMulti")
+	@patch("pycurl.Curl")
+	def test_stream(self, Curl_Mock, CurlMulti_Mock):
+		self._mock_handles(Curl_Mock, status=201)
+
+		added = []
+		reads = []
+
+		multi = CurlMulti_Mock.return_value
+		multi.add_handle.side_effect = added.append
+		multi.perform.return_value = (0, 1)
+
+		# deliver a chunk per round, complete after the second
+		def info_read():
+			handle = added[0]
+			reads.append(handle)
+
+			handle.options[pycurl.WRITEFUNCTION]("chunk %d;" % len(reads))
+
+			if len(reads) < 2:
+				return (0, [], [])
+
+			return (0, [handle], [])
+
+		multi.info_read.side_effect = info_read
+
+		h = http.Http()
+
+		response = h.stream("POST", "http://host/a", "DATA")
+
+		assert response.status == None
+		assert list(response) == ["chunk 1;", "chunk 2;"]
+		assert response.status == 201
+		assert response.set_cookies == []
+		assert multi.select.call_count == 1
+		assert multi.remove_handle.called
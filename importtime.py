@@ -0,0 +1,46 @@
+import sys
+import time
+import __builtin__
+
+"""Report the time spent importing each module to stderr once install()ed, in the
+format of python -X importtime (not available for Python 2):
+
+import time: self [us] | cumulative | imported package
+
+Nested imports are indented and reported before the importing module."""
+
+_original_import = __builtin__.__import__
+
+# time spent in nested imports of the imports in progress
+_nested = []
+
+def install():
+	__builtin__.__import__ = _timed_import
+
+	sys.stderr.write("import time: self [us] | cumulative | imported package\n")
+
+def uninstall():
+	__builtin__.__import__ = _original_import
+
+def _timed_import(name, *args, **kwargs):
+	# only imports that load modules are reported, not lookups in sys.modules
+	loaded = len(sys.modules)
+
+	_nested.append(0)
+	start = time.time()
+
+	try:
+		return _original_import(name, *args, **kwargs)
+	finally:
+		cumulative = time.time() - start
+		nested = _nested.pop()
+
+		if len(_nested) > 0:
+			_nested[-1] += cumulative
+
+		if len(sys.modules) != loaded:
+			sys.stderr.write("import time: %9d | %10d | %s%s\n" % (
+				(cumulative - nested) * 1000000,
+				cumulative * 1000000,
+				"  " * len(_nested),
+				name))
@@ -1,8 +1,20 @@
-import http
+import array
+import bisect
+import calendar
+import itertools
 import json
+import jsonstream
 import re
-import dateutil.parser
+import operator
 import time
+import weakref
+import lazy
+
+# not needed for decoding issues read from elsewhere (mirror)
+http = lazy.LazyModule("http")
+
+# only needed for dates not formatted like JIRA does
+dateutil_parser = lazy.LazyModule("dateutil.parser")
 
 class JiraRestApi(object):
 
@@ -12,6 +24,9 @@ class JiraRestApi(object):
 		# also tells if this instance is authenticated
 		self._auth_cookies = None
 
+		# cache.HttpCache for conditional GETs of issues and comments
+		self.cache = None
+
 		self.http = http.Http(
 			proxy=proxy,
 			user_agent_prefix=user_agent_prefix,
@@ -24,6 +39,10 @@ class JiraRestApi(object):
 	def get_auth_cookies(self):
 		return self._auth_cookies
 
+	# use session cookies without checking them
+	def set_auth_cookies(self, auth_cookies):
+		self._auth_cookies = auth_cookies
+
 	# check auth by passed session cookies and
 	# internally set the auth cookies
 	def check_auth(self, auth_cookies):
@@ -94,15 +113,11 @@ class JiraRestApi(object):
 
 		return json.loads(res)
 
-	def search(self, jql, max_results=10, fields=["summary", "status"]):
+	def search(self, jql, max_results=10, fields=["summary", "status"], start_at=0):
 		if self._auth_cookies == None:
 			raise JiraAuthException("Not authenticated")
 
-		req_json_str = json.dumps({
-			"jql": jql,
-			"fields": fields,
-			"maxResults": max_results
-		})
+		req_json_str = self._search_body(jql, max_results, fields, start_at)
 
 		call = "/api/2/search"
 
@@ -117,21 +132,83 @@ class JiraRestApi(object):
 
 		return json.loads(res, "utf8")
 
-	def get(self, key):
+	"""Search like search(), but yield the issues (raw) one by one while the response arrives,
+	each being decoded as soon as it has been received completely. The other members
+	of the result (total, maxResults, ...) are put into the passed result dict."""
+	def search_stream(self, jql, max_results=10, fields=["summary", "status"], start_at=0, result=None, validate_query=True):
 		if self._auth_cookies == None:
 			raise JiraAuthException("Not authenticated")
 
-		call = "/api/2/issue/%s" % (key)
+		call = "/api/2/search"
 
-		(status, res, _cookies) = self.http.get(
+		parser = jsonstream.ArrayStreamParser("issues")
+
+		response = self.http.stream(
+			"POST",
 			self._base_url + call,
+			self._search_body(jql, max_results, fields, start_at, validate_query),
 			headers=["Content-Type: application/json"],
 			cookies=self._auth_cookies)
 
-		if status != 200:
-			raise JiraStatusException(status, call, str(res))
+		for chunk in response:
+			parser.feed(chunk)
 
-		return json.loads(res, "utf8")
+			for item in parser.pop_items():
+				yield item
+
+		if response.status != 200:
+			raise JiraStatusException(response.status, call, parser.text())
+
+		if result != None:
+			result.update(parser.close())
+
+	"""Run searches concurrently on up to parallel connections. searches is a list of
+	(jql, max_results, fields, start_at[, validate_query]) tuples. Yields (index, result) in the order the
+	searches complete, index being the position in searches."""
+	def search_batch(self, searches, parallel=4):
+		if self._auth_cookies == None:
+			raise JiraAuthException("Not authenticated")
+
+		call = "/api/2/search"
+
+		requests = map(lambda search: (
+			"POST",
+			self._base_url + call,
+			self._search_body(*search),
+			["Content-Type: application/json"],
+			self._auth_cookies), searches)
+
+		for (index, (status, res, _cookies)) in self.http.batch(requests, parallel):
+			if status != 200:
+				raise JiraStatusException(status, call, str(res))
+
+			yield (index, json.loads(res, "utf8"))
+
+	def _search_body(self, jql, max_results, fields, start_at, validate_query=True):
+		body = {
+			"jql": jql,
+			"fields": fields,
+			"maxResults": max_results,
+			"startAt": start_at
+		}
+
+		# do not fail on unknown values (like deleted issue keys)
+		if not validate_query:
+			body["validateQuery"] = False
+
+		return json.dumps(body)
+
+	def get(self, key, fields=None):
+		if self._auth_cookies == None:
+			raise JiraAuthException("Not authenticated")
+
+		call = "/api/2/issue/%s" % (key)
+
+		# only return these fields instead of all
+		if fields != None:
+			call += "?fields=%s" % (",".join(fields))
+
+		return self._get_cached(call)
 
 	def get_comments(self, key):
 		if self._auth_cookies == None:
@@ -139,15 +216,41 @@ class JiraRestApi(object):
 
 		call = "/api/2/issue/%s/comment" % (key)
 
+		return self._get_cached(call)
+
+	# GET call, revalidating a cached response if there is one
+	def _get_cached(self, call):
+		url = self._base_url + call
+		headers = ["Content-Type: application/json"]
+		entry = None
+
+		if self.cache != None:
+			entry = self.cache.lookup(url)
+
+			if entry != None:
+				headers = headers + entry.validators()
+
+		response_headers = {}
+
 		(status, res, _cookies) = self.http.get(
-			self._base_url + call,
-			headers=["Content-Type: application/json"],
-			cookies=self._auth_cookies)
+			url,
+			headers=headers,
+			cookies=self._auth_cookies,
+			response_headers=response_headers)
+
+		# not modified: the cached data is still valid
+		if status == 304 and entry != None:
+			return entry.data
 
 		if status != 200:
 			raise JiraStatusException(status, call, str(res))
 
-		return json.loads(res, "utf8")
+		data = json.loads(res, "utf8")
+
+		if self.cache != None:
+			self.cache.store(url, response_headers, data)
+
+		return data
 
 
 	def add_comment(self, key, comment):
@@ -241,49 +344,149 @@ class JiraAuthException(BaseException):
 	def __init__(self, message):
 		super(BaseException, self).__init__(message)
 
+# the session cookies are no longer accepted
+def _is_auth_expired(jira_status_exception):
+	return jira_status_exception.get_status() == 401
+
 
 
 JiraRestApi._CURL_VERBOSE = False
 
-class Issue(object):
+# dates of JIRA's REST API like "2015-01-23T19:03:43.000+0100"
+_TIMESTAMP_PATTERN = re.compile(r"^(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(\.\d+)?([+-])(\d\d):?(\d\d)$")
 
-	def __init__(self, raw_obj):
-		fields = raw_obj["fields"]
-		self._key = raw_obj["key"].encode("utf8")
-		self._summary = fields["summary"].encode("utf8")
-		self._status = fields["status"]["name"].encode("utf8")
+# parsed dates by their text, issues of a search share many of them
+_timestamps = {}
 
-		if "description" in fields and fields["description"] != None:
-			self._description = fields["description"].encode("utf8")
-		else:
-			self._description = None
+_TIMESTAMPS_CACHED = 10000
 
-		self._type = fields["issuetype"]["name"].encode("utf8")
+"""Seconds since the epoch of a date as formatted by JIRA, dates without time zone
+are local time"""
+def parse_timestamp(text):
+	timestamp = _timestamps.get(text)
 
-		if "assignee" in fields and fields["assignee"] != None:
-			self._assignee = User(fields["assignee"])
-		else:
-			self._assignee = None
+	if timestamp != None:
+		return timestamp
 
-		if "parent" in fields and fields["parent"] != None:
-			self._parent = Issue(fields["parent"])
-		else:
-			self._parent = None
+	match = _TIMESTAMP_PATTERN.match(text)
+
+	if match != None:
+		(year, month, day, hour, minute, second, fraction, sign, offset_hours, offset_minutes) = match.groups()
+
+		offset = (int(offset_hours) * 60 + int(offset_minutes)) * 60
 
-		if "updated" in fields and fields["updated"] != None:
-			_updated = fields["updated"]
-			self._updated = time.mktime(dateutil.parser.parse(_updated).timetuple())
+		timestamp = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second), 0, 0, 0))
+		timestamp = timestamp - offset if sign == "+" else timestamp + offset
+
+		if fraction != None:
+			timestamp += float(fraction)
 		else:
-			_updated = None
+			timestamp = float(timestamp)
+	else:
+		date = dateutil_parser.parse(text)
 
-		if "subtasks" in fields and fields["subtasks"] != None:
-			_subtasks = fields["subtasks"]
-			_subtasks = map(lambda issue: Issue(issue), _subtasks)
-			self._subtasks = _subtasks
+		if date.tzinfo != None:
+			timestamp = calendar.timegm(date.utctimetuple()) + date.microsecond / 1e6
 		else:
-			self._subtasks = []
+			timestamp = time.mktime(date.timetuple()) + date.microsecond / 1e6
+
+	# start over instead of growing without bounds
+	if len(_timestamps) >= _TIMESTAMPS_CACHED:
+		_timestamps.clear()
+
+	_timestamps[text] = timestamp
+
+	return timestamp
+
+# model objects have __slots__: searches build many of them (subtasks, parents)
+class Issue(object):
+
+	__slots__ = [
+		"_key", "_fields", "_identities", "_summary", "_status", "_description", "_type", "_assignee", "_parent",
+		"_updated", "_subtasks", "__weakref__"]
+
+	# the fields read by every list view (Printer.oneline) are decoded right away,
+	# the others when read first (see __getattr__): their raw values are held only
+	# until then. Users and issues of the fields are shared through identities (IdentityMap).
+	def __init__(self, raw_obj, identities=None):
+		# fields not requested are absent
+		fields = raw_obj["fields"] if "fields" in raw_obj else {}
+
+		self._key = raw_obj["key"].encode("utf8")
+		self._identities = identities
+
+		self._summary = None
+		self._status = None
+		self._assignee = None
+		self._parent = None
+		self._subtasks = []
+
+		self._decode(fields)
+
+		# raw values by field, None once all have been decoded
+		self._fields = None
+
+		for field in _LAZY_FIELDS:
+			if field in fields:
+				if self._fields == None:
+					self._fields = {}
+
+				self._fields[field] = fields[field]
+
+	def _decode(self, fields):
+		if "summary" in fields:
+			self._summary = fields["summary"].encode("utf8") if fields["summary"] != None else None
+
+		if "status" in fields:
+			self._status = fields["status"]["name"].encode("utf8") if fields["status"] != None else None
+
+		if "assignee" in fields:
+			self._assignee = _new_user(fields["assignee"], self._identities) if fields["assignee"] != None else None
+
+		if "parent" in fields:
+			self._parent = _new_issue(fields["parent"], self._identities) if fields["parent"] != None else None
 
+		if "subtasks" in fields:
+			self._subtasks = map(lambda subtask: _new_issue(subtask, self._identities), fields["subtasks"]) if fields["subtasks"] != None else []
 
+	# called for slots not set yet only
+	def __getattr__(self, name):
+		if name not in _LAZY_ATTRIBUTES:
+			raise AttributeError(name)
+
+		(field, decode) = _LAZY_ATTRIBUTES[name]
+
+		raw_value = self._fields.pop(field, None) if self._fields != None else None
+		value = decode(raw_value) if raw_value != None else None
+
+		# the raw values are not needed anymore
+		if self._fields != None and len(self._fields) == 0:
+			self._fields = None
+
+		setattr(self, name, value)
+
+		return value
+
+	"""Take over the fields of raw_obj, a newer or more complete response for this issue"""
+	def _merge(self, raw_obj):
+		fields = raw_obj["fields"] if "fields" in raw_obj else {}
+
+		self._decode(fields)
+
+		for (name, (field, _decode)) in _LAZY_ATTRIBUTES.iteritems():
+			if field not in fields:
+				continue
+
+			if self._fields == None:
+				self._fields = {}
+
+			self._fields[field] = fields[field]
+
+			# decoded again when read next
+			try:
+				delattr(self, name)
+			except AttributeError:
+				pass
 
 	def __str__(self):
 		str_ =  "%s [%s] %s" % (self._key, self._status, self._summary)
@@ -300,6 +503,9 @@ class Issue(object):
 		return str_
 
 class Comment(object):
+
+	__slots__ = ["_body", "_author", "_created", "_updated", "_update_author"]
+
 	def __init__(self, raw_obj):
 		self._body = raw_obj["body"].encode("utf8")
 		self._author = raw_obj["author"]["displayName"].encode("utf8")
@@ -310,11 +516,11 @@ class Comment(object):
 		_updated = raw_obj["updated"]
 		_update_author = raw_obj["updateAuthor"]["displayName"].encode("utf8")
 
-		self._created = time.mktime(dateutil.parser.parse(_created).timetuple())
+		self._created = parse_timestamp(_created)
 
 		# if edited, the created and updated time differ
 		if _created != _updated:
-			self._updated = time.mktime(dateutil.parser.parse(_updated).timetuple())
+			self._updated = parse_timestamp(_updated)
 			self._update_author = _update_author
 		else:
 			self._updated = None
@@ -324,6 +530,9 @@ class Comment(object):
 		return "--- %d by %s ------------\n%s" % (self._created, self._author, self._body)
 
 class User(object):
+
+	__slots__ = ["_key", "_display_name", "_email", "__weakref__"]
+
 	def __init__(self, raw_obj):
 		if "name" in raw_obj:
 			name_ = raw_obj["name"]
@@ -341,91 +550,529 @@ class User(object):
 		else:
 			self._email = None
 
+	"""Take over the email address of raw_obj if missing: users in issue fields have none"""
+	def _merge(self, raw_obj):
+		if self._email == None and raw_obj.get("emailAddress") != None:
+			self._email = raw_obj["emailAddress"].encode("utf8")
+
 	def __str__(self):
 		return self._display_name
 
 	"""Equal when other is User and key/name is equal"""
 	def __eq__(self, other):
+		# users of one IdentityMap are the same instance
+		if other is self:
+			return True
+
 		return other != None and type(other) == User and other._key == self._key
 
+"""Users and the issues referenced as parent or subtask by key, sharing one instance
+per key as long as any is in use: the assignees and parents of a search are built
+once. Instances take over the fields of responses returned later. The issues listed
+by a search are built on their own (Issue(raw_obj, identities)): most appear once,
+a reference to each would cost more than it saves."""
+class IdentityMap(object):
+
+	def __init__(self):
+		self._users = _References()
+		self._issues = _References()
+
+	def user(self, raw_obj):
+		key = raw_obj["name"] if "name" in raw_obj else raw_obj.get("key")
+		ref = self._users.get(key)
+		user = ref() if ref != None else None
+
+		if user is None:
+			user = User(raw_obj)
+			self._users.store(key, user)
+		else:
+			user._merge(raw_obj)
+
+		return user
+
+	"""Issue referenced by another one's fields"""
+	def issue(self, raw_obj):
+		key = raw_obj["key"]
+		ref = self._issues.get(key)
+		issue = ref() if ref != None else None
+
+		if issue is None:
+			issue = Issue(raw_obj, self)
+			self._issues.store(key, issue)
+		else:
+			issue._merge(raw_obj)
+
+		return issue
+
+"""Weak references by key. The references of released instances are dropped whenever
+the references doubled, cheaper than weakref.WeakValueDictionary's callbacks."""
+class _References(dict):
+
+	def __init__(self):
+		dict.__init__(self)
+		self._limit = _MIN_REFERENCES
+
+	def store(self, key, instance):
+		self[key] = weakref.ref(instance)
+
+		if len(self) < self._limit:
+			return
+
+		for released in filter(lambda key: self[key]() is None, self.keys()):
+			del self[released]
+
+		self._limit = max(_MIN_REFERENCES, 2 * len(self))
+
+_MIN_REFERENCES = 1024
+
+def _new_user(raw_obj, identities):
+	return identities.user(raw_obj) if identities != None else User(raw_obj)
+
+def _new_issue(raw_obj, identities):
+	return identities.issue(raw_obj) if identities != None else Issue(raw_obj)
+
+# attribute of Issue -> (field, decode(raw value)) for the fields decoded when read first,
+# None for fields absent
+_LAZY_ATTRIBUTES = {
+	"_description": ("description", lambda description: description.encode("utf8")),
+	"_type": ("issuetype", lambda issuetype: issuetype["name"].encode("utf8")),
+	"_updated": ("updated", parse_timestamp)
+}
+
+_LAZY_FIELDS = map(lambda (field, _decode): field, _LAZY_ATTRIBUTES.values())
+
+"""Strings of an IssueBatch column, dictionary encoded: values holds the distinct
+strings (None for empty fields), codes the index into values of each issue"""
+class EncodedColumn(object):
+
+	def __init__(self):
+		self.values = []
+		self.codes = array.array("i")
+		self._codes_by_value = {}
+
+	def append(self, value):
+		code = self._codes_by_value.get(value)
+
+		if code == None:
+			code = len(self.values)
+			self._codes_by_value[value] = code
+			self.values.append(value)
+
+		self.codes.append(code)
+
+# updated of issues without one, never counted by IssueBatch.histogram()
+_UNKNOWN_TIME = float("-inf")
+
+"""Issues of a search held column by column instead of as Issue objects, to count
+many of them: keys, the dictionary encoded (EncodedColumn) status, assignee (user
+name) and type, and the updated timestamps as array. Counts and histograms run on
+whole columns (sorting and bisecting) instead of issue by issue."""
+class IssueBatch(object):
+
+	# issue fields the columns are filled from
+	fields = ["status", "assignee", "issuetype", "updated"]
+
+	def __init__(self):
+		self.keys = []
+		self.status = EncodedColumn()
+		self.assignee = EncodedColumn()
+		self.type = EncodedColumn()
+		self.updated = array.array("d")
+
+	def __len__(self):
+		return len(self.keys)
+
+	"""Add an issue as returned by the REST API"""
+	def append(self, raw_obj):
+		fields = raw_obj["fields"] if "fields" in raw_obj else {}
+
+		self.keys.append(raw_obj["key"].encode("utf8"))
+		self.status.append(_name_of(fields.get("status")))
+		self.assignee.append(_name_of(fields.get("assignee")))
+		self.type.append(_name_of(fields.get("issuetype")))
+		self.updated.append(parse_timestamp(fields["updated"]) if fields.get("updated") != None else _UNKNOWN_TIME)
+
+	def extend(self, raw_objs):
+		for raw_obj in raw_objs:
+			self.append(raw_obj)
+
+	"""Number of issues by value of a column like count_by("status"), or by tuple of
+	values of several columns like count_by("assignee", "status"). Only the values
+	(combinations) occurring are counted."""
+	def count_by(self, *names):
+		columns = map(lambda name: getattr(self, name), names)
+
+		# one code per combination of values, the column codes being its digits
+		codes = columns[0].codes
+
+		for column in columns[1:]:
+			codes = map(operator.add, itertools.imap(operator.mul, codes, itertools.repeat(len(column.values))), column.codes)
+
+		counts = {}
+
+		for (code, count) in _count_codes(codes).iteritems():
+			values = []
+
+			for column in reversed(columns[1:]):
+				(code, column_code) = divmod(code, len(column.values))
+				values.insert(0, column.values[column_code])
+
+			values.insert(0, columns[0].values[code])
+
+			counts[values[0] if len(values) == 1 else tuple(values)] = count
+
+		return counts
+
+	"""Number of issues updated in each interval [edges[i], edges[i + 1]) of the
+	ascending timestamps edges"""
+	def histogram(self, edges):
+		ordered = sorted(self.updated)
+		bounds = map(lambda edge: bisect.bisect_left(ordered, edge), edges)
+
+		return map(operator.sub, bounds[1:], bounds[:-1])
+
+def _name_of(raw_obj):
+	return raw_obj["name"].encode("utf8") if raw_obj != None else None
+
+# code -> occurrences in codes: bisected in the sorted codes instead of counted one by one
+def _count_codes(codes):
+	ordered = sorted(codes)
+	distinct = sorted(set(ordered))
+	starts = map(lambda code: bisect.bisect_left(ordered, code), distinct) + [len(ordered)]
+
+	return dict(zip(distinct, map(operator.sub, starts[1:], starts[:-1])))
+
+# issue fields requested unless a caller asks for less
+ISSUE_FIELDS = ["summary", "description", "assignee", "status", "issuetype", "updated", "parent", "subtasks"]
+
+# issues requested per /api/2/search call, JIRA's default upper limit
+SEARCH_PAGE_SIZE = 50
+
+# issue keys looked up per "key in (...)" search by Jira.get_many()
+GET_MANY_BATCH_SIZE = SEARCH_PAGE_SIZE
+
+ISSUE_KEY_PATTERN = re.compile("^[A-Z][A-Z0-9_]*-[0-9]+$")
+
+"""Issues matching a JQL search, fetched page by page (startAt) while being iterated.
+Only the page currently iterated is held in memory. total and remaining() are
+available once the first page has been fetched.
+
+With parallel > 1 the pages following the first one are fetched concurrently on up
+to parallel connections and yielded in JQL order.
+
+With raw the issues are yielded as returned by the REST API instead of as Issue."""
+class SearchResult(object):
+
+	def __init__(self, jira_api, jql, max_results, fields, page_size=SEARCH_PAGE_SIZE, parallel=1, reauthenticate=None, raw=False, identities=None, validate_query=True):
+		self._jira_api = jira_api
+		self._jql = jql
+		self._max_results = max_results
+		self._fields = fields
+		self._page_size = page_size
+		self._parallel = parallel
+		self._reauthenticate = reauthenticate
+		self._item = (lambda item: item) if raw else (lambda item: Issue(item, identities))
+
+		# JIRA rejects JQL naming unknown values (like keys of deleted issues) unless
+		# not asked to validate it
+		self._validate_query = validate_query
+
+		self.total = None
+		self.fetched = 0
+
+	def __iter__(self):
+		start_at = 0
+		reauthenticated = False
+
+		while start_at < self._max_results:
+			page_size = min(self._page_size, self._max_results - start_at)
+
+			page = {}
+			count = 0
+
+			try:
+				# issues are decoded while the page arrives
+				for item in self._search_stream(page_size, start_at, page):
+					count += 1
+					self.fetched += 1
+					yield self._item(item)
+			except JiraStatusException as jse:
+				# the session expired: nothing of the page has been yielded,
+				# request it again after a new login
+				if not _is_auth_expired(jse) or reauthenticated or self._reauthenticate == None:
+					raise
+
+				if not self._reauthenticate():
+					raise
+
+				reauthenticated = True
+				continue
+
+			self.total = page["total"]
+
+			# the server may cap maxResults below page_size, continue
+			# at what has actually been returned
+			start_at += count
+
+			if count == 0 or start_at >= self.total:
+				break
+
+			if self._parallel > 1:
+				# the first page revealed the total and the page size
+				# accepted by the server: the other pages are independent
+				for issue in self._iter_parallel(start_at, count):
+					yield issue
+
+				break
+
+	def _iter_parallel(self, start_at, page_size):
+		end = min(self.total, self._max_results)
+
+		searches = map(
+			lambda offset: (self._jql, min(page_size, end - offset), self._fields, offset) + (() if self._validate_query else (False,)),
+			range(start_at, end, page_size))
+
+		# pages complete in any order: hold them back until
+		# all preceding pages have been yielded
+		completed = {}
+		next_index = 0
+
+		# indexes of the searches requested by the batch
+		pending = range(len(searches))
+		reauthenticated = False
+
+		while True:
+			try:
+				for (index, page) in self._jira_api.search_batch(map(lambda i: searches[i], pending), self._parallel):
+					completed[pending[index]] = page["issues"]
+
+					while next_index in completed:
+						for item in completed.pop(next_index):
+							self.fetched += 1
+							yield self._item(item)
+
+						next_index += 1
+
+				return
+			except JiraStatusException as jse:
+				# the session expired: request the pages not received
+				# yet again after a new login, like __iter__
+				if not _is_auth_expired(jse) or reauthenticated or self._reauthenticate == None:
+					raise
+
+				if not self._reauthenticate():
+					raise
+
+				reauthenticated = True
+				pending = filter(lambda i: i >= next_index and i not in completed, range(len(searches)))
+
+	def _search_stream(self, page_size, start_at, page):
+		if self._validate_query:
+			return self._jira_api.search_stream(self._jql, page_size, self._fields, start_at, page)
+
+		return self._jira_api.search_stream(self._jql, page_size, self._fields, start_at, page, validate_query=False)
+
+	"""Number of matching issues not fetched because of the max_results limit"""
+	def remaining(self):
+		if self.total == None:
+			return 0
+
+		return max(0, self.total - self.fetched)
+
 class Jira(object):
 
 	def __init__(self, base_url, user_agent_prefix="PyJira", proxy=None):
 		self.jira_api = JiraRestApi(base_url, user_agent_prefix=user_agent_prefix, proxy=proxy)
 		self.me = None
 
+		# raw myself() response for me, to be stored along with the auth cookies
+		self._me_raw = None
+
+		# called when a request is rejected with 401, returns True after a new
+		# login() succeeded; the request is then retried once
+		self.reauthenticate = None
+
+		# get_assignees() results by username fragment, if caching users
+		self._users = None
+
+		# users and issues in use
+		self._identities = IdentityMap()
+
 
 	def close(self):
 		self.jira_api.close()
 
+	"""Revalidate issues and comments against the passed cache.HttpCache"""
+	def use_cache(self, http_cache):
+		self.jira_api.cache = http_cache
+
+	def get_cache(self):
+		return self.jira_api.cache
+
+	"""Keep users found by get_assignees() for the lifetime of this instance"""
+	def cache_users(self):
+		if self._users == None:
+			self._users = {}
+
 
 	# get the auth cookies of a previous login()
 	def get_auth_cookies(self):
 		return self.jira_api.get_auth_cookies()
 
 
+	# get the raw user details of a previous check_auth() or login()
+	def get_me_raw(self):
+		return self._me_raw
+
 	# check auth by passed session cookies and
 	# internally set the auth cookies
 	def check_auth(self, auth_cookies):
 		logged_in =  self.jira_api.check_auth(auth_cookies)
 
 		if logged_in:
-			self.me = self.myself()
+			self._set_me(self.jira_api.myself())
 
 		return logged_in
 
+	"""Use session cookies and user details (get_me_raw()) stored from an earlier
+	check_auth() or login() without asking the server. If the session has expired
+	meanwhile, requests fail with 401 or call reauthenticate."""
+	def resume(self, auth_cookies, me_raw):
+		self.jira_api.set_auth_cookies(auth_cookies)
+		self._set_me(me_raw)
+
+	def _set_me(self, me_raw):
+		self._me_raw = me_raw
+		self.me = self._identities.user(me_raw)
+
 	def myself(self):
-		return User(self.jira_api.myself())
+		return self._identities.user(self._call(self.jira_api.myself))
 
 	# login and get user details
 	def login(self, username, password):
 		logged_in = self.jira_api.login(username, password)
 
 		if logged_in:
-			self.me = self.myself()
+			self._set_me(self.jira_api.myself())
 
 		return logged_in
 
+	# call fn, retrying once after reauthenticate() if the session expired
+	def _call(self, fn, *args):
+		try:
+			return fn(*args)
+		except JiraStatusException as jse:
+			if not _is_auth_expired(jse) or self.reauthenticate == None:
+				raise
 
-	def search(self, jql, max_results=10, fields=["summary", "description", "assignee", "status", "issuetype", "updated", "parent", "subtasks"]):
+			if not self.reauthenticate():
+				raise
+
+			return fn(*args)
+
+
+	def search(self, jql, max_results=10, fields=ISSUE_FIELDS, parallel=1):
 		# fields: summary, description, issuetype, assignee, status, issuetype, updated, parent, subtasks#key, project, reporter, created
 
-		result = self.jira_api.search(jql, max_results, fields)
+		result = self.search_iter(jql, max_results, fields, parallel=parallel)
+
+		items = list(result)
+
+		return (items, result.remaining(), max_results)
+
+	"""Search lazily: returns a SearchResult that walks the result pages when iterated,
+	fetching up to parallel pages at a time. With raw the issues are not decoded into Issue."""
+	def search_iter(self, jql, max_results=10, fields=ISSUE_FIELDS, page_size=SEARCH_PAGE_SIZE, parallel=1, raw=False, validate_query=True):
+		return SearchResult(self.jira_api, jql, max_results, fields, page_size, parallel, self.reauthenticate, raw, self._identities, validate_query)
 
-		issues = result["issues"]
 
-		items = []
+	"""Search filling an IssueBatch with up to max_results issues, no Issue is built"""
+	def search_columns(self, jql, max_results, parallel=1):
+		batch = IssueBatch()
+		batch.extend(self.search_iter(jql, max_results, IssueBatch.fields, parallel=parallel, raw=True))
 
-		for item in issues:
-			items.append(Issue(item))
+		return batch
 
-		remaining = result["total"] - len(issues)
+	def get(self, key, fields=ISSUE_FIELDS):
+		return Issue(self._call(self.jira_api.get, key, fields), self._identities)
 
-		return (items, remaining, result["maxResults"])
+	"""Get issues by a list of keys using concurrent "key in (...)" searches instead
+	of one request per key. Returns (issues, missing_keys), issues being in the
+	order of keys, missing_keys listing keys that are invalid or were not found."""
+	def get_many(self, keys, fields=ISSUE_FIELDS, parallel=4):
+		# unique keys in the passed order
+		unique_keys = []
+		seen = set()
 
+		for key in map(lambda key: key.upper(), keys):
+			if key not in seen:
+				seen.add(key)
+				unique_keys.append(key)
 
-	def get(self, key):
-		return Issue(self.jira_api.get(key))
+		# only pass well formed keys into the JQL
+		valid_keys = filter(lambda key: ISSUE_KEY_PATTERN.match(key), unique_keys)
+
+		batches = [valid_keys[i:i + GET_MANY_BATCH_SIZE] for i in range(0, len(valid_keys), GET_MANY_BATCH_SIZE)]
+
+		searches = map(
+			lambda batch: ("key in (%s)" % (", ".join(batch)), len(batch), fields, 0, False),
+			batches)
+
+		found = {}
+
+		def search_batch():
+			for (_index, result) in self.jira_api.search_batch(searches, parallel):
+				for item in result["issues"]:
+					issue = Issue(item, self._identities)
+					found[issue._key] = issue
+
+		self._call(search_batch)
+
+		issues = [found[key] for key in unique_keys if key in found]
+		missing_keys = [key for key in unique_keys if key not in found]
+
+		return (issues, missing_keys)
+
+	"""Number of issues matching each of jqls, by concurrent searches returning the
+	total only (maxResults 0), in the order of jqls"""
+	def count(self, jqls, parallel=4):
+		searches = map(lambda jql: (jql, 0, [], 0), jqls)
+		totals = [None] * len(jqls)
+
+		def search_batch():
+			for (index, result) in self.jira_api.search_batch(searches, parallel):
+				totals[index] = result["total"]
+
+		self._call(search_batch)
+
+		return totals
 
 	def get_comments(self, key):
-		comments = self.jira_api.get_comments(key)
+		comments = self._call(self.jira_api.get_comments, key)
 		comments = comments["comments"]
 
 		return map(lambda comment: Comment(comment), comments)
 
 	def add_comment(self, key, comment):
-		self.jira_api.add_comment(key, comment)
+		self._call(self.jira_api.add_comment, key, comment)
 
 	def assign(self, key, assignee):
-		self.jira_api.assign(key, assignee)
+		self._call(self.jira_api.assign, key, assignee)
 
 	def unassign(self, key):
-		self.jira_api.assign(key, None)
+		self._call(self.jira_api.assign, key, None)
 
 	def assign_to_me(self, key):
-		self.jira_api.assign(key, self.me._key)
+		self._call(self.jira_api.assign, key, self.me._key)
 
 	def get_assignees(self, username_fragment):
-		users = self.jira_api.get_assignees(username_fragment)
+		if self._users != None and username_fragment in self._users:
+			return self._users[username_fragment]
+
+		users = self._call(self.jira_api.get_assignees, username_fragment)
+		users = map(self._identities.user, users)
+
+		if self._users != None:
+			self._users[username_fragment] = users
 
-		return map(lambda user: User(user), users)
+		return users
@@ -2,8 +2,20 @@
 import unittest
 from mock import patch, Mock, MagicMock
 import fudge
+from fudge.inspector import arg
 import json
 import jira
+import itertools
+
+# numbers of the keys of issues searched
+_issue_numbers = itertools.count(1)
+
+"""Chunks of a http.StreamedResponse"""
+class StreamedResponseStub(list):
+
+	def __init__(self, chunks, status):
+		list.__init__(self, chunks)
+		self.status = status
 
 class JiraRestApiTest(unittest.TestCase):
 
@@ -239,7 +251,8 @@ class JiraRestApiTest(unittest.TestCase):
 		request_form_json = json.dumps({
 			"jql": "SOME JQL WITH A = 1",
 			"fields": ["summary", "status"],
-			"maxResults": 10
+			"maxResults": 10,
+			"startAt": 0
 		})
 
 		(Http_Mock.expects_call()
@@ -263,7 +276,8 @@ class JiraRestApiTest(unittest.TestCase):
 		request_form_json = json.dumps({
 			"jql": "SOME JQL WITH A = 1",
 			"fields": ["summary", "status"],
-			"maxResults": 10
+			"maxResults": 10,
+			"startAt": 0
 		})
 
 		response_json_str = json.dumps({
@@ -294,12 +308,143 @@ class JiraRestApiTest(unittest.TestCase):
 		}
 
 
+	@fudge.patch("http.Http")
+	def test_search_start_at(self, Http_Mock):
+		request_form_json = json.dumps({
+			"jql": "SOME JQL WITH A = 1",
+			"fields": ["summary"],
+			"maxResults": 50,
+			"startAt": 100
+		})
+
+		(Http_Mock.expects_call()
+					.with_args(_curl_verbose=False, user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('post')
+						.with_args(
+							"http://host/base/api/2/search",
+							request_form_json,
+							headers=["Content-Type: application/json"],
+							cookies=["A", "B"])
+						.returns( (200, "{}", []) ))
+
+		api = jira.JiraRestApi("http://host/base")
+
+		# bypass authorization check
+		api._auth_cookies = ["A", "B"]
+
+		assert api.search("SOME JQL WITH A = 1", 50, ["summary"], 100) == {}
+
+
+	@fudge.patch("http.Http")
+	def test_search_batch(self, Http_Mock):
+		def request(start_at):
+			return (
+				"POST",
+				"http://host/base/api/2/search",
+				json.dumps({"jql": "JQL", "fields": ["summary"], "maxResults": 50, "startAt": start_at}),
+				["Content-Type: application/json"],
+				["A", "B"])
+
+		(Http_Mock.expects_call()
+					.with_args(_curl_verbose=False, user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('batch')
+						.with_args([request(50), request(100)], 2)
+						.returns(iter([
+							(1, (200, '{"startAt": 100}', [])),
+							(0, (200, '{"startAt": 50}', []))
+						])))
+
+		api = jira.JiraRestApi("http://host/base")
+
+		# bypass authorization check
+		api._auth_cookies = ["A", "B"]
+
+		results = list(api.search_batch([("JQL", 50, ["summary"], 50), ("JQL", 50, ["summary"], 100)], 2))
+
+		assert results == [(1, {"startAt": 100}), (0, {"startAt": 50})]
+
+
+	@fudge.patch("http.Http")
+	def test_search_batch_unsuccessful(self, Http_Mock):
+		(Http_Mock.expects_call()
+					.with_args(_curl_verbose=False, user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('batch')
+						.returns(iter([(0, (400, "", []))])))
+
+		api = jira.JiraRestApi("http://host/base")
+
+		# bypass authorization check
+		api._auth_cookies = ["A", "B"]
+
+		self.assertRaises(jira.JiraStatusException, list, api.search_batch([("JQL", 50, ["summary"], 50)]))
+
+
+	@fudge.patch("http.Http")
+	def test_search_stream(self, Http_Mock):
+		request_form_json = json.dumps({
+			"jql": "SOME JQL WITH A = 1",
+			"fields": ["summary"],
+			"maxResults": 50,
+			"startAt": 0
+		})
+
+		response = StreamedResponseStub(['{"total": 2, "issues": [{"key": "A-1"},', ' {"key": "A-2"}]}'], 200)
+
+		(Http_Mock.expects_call()
+					.with_args(_curl_verbose=False, user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('stream')
+						.with_args(
+							"POST",
+							"http://host/base/api/2/search",
+							request_form_json,
+							headers=["Content-Type: application/json"],
+							cookies=["A", "B"])
+						.returns(response))
+
+		api = jira.JiraRestApi("http://host/base")
+
+		# bypass authorization check
+		api._auth_cookies = ["A", "B"]
+
+		result = {}
+
+		assert list(api.search_stream("SOME JQL WITH A = 1", 50, ["summary"], 0, result)) == [{"key": "A-1"}, {"key": "A-2"}]
+		assert result == {"total": 2, "issues": []}
+
+
+	@fudge.patch("http.Http")
+	def test_search_stream_unsuccessful(self, Http_Mock):
+		response = StreamedResponseStub(['{"errorMessages": ["Invalid JQL"]}'], 400)
+
+		(Http_Mock.expects_call()
+					.with_args(_curl_verbose=False, user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('stream')
+						.returns(response))
+
+		api = jira.JiraRestApi("http://host/base")
+
+		# bypass authorization check
+		api._auth_cookies = ["A", "B"]
+
+		try:
+			list(api.search_stream("SOME JQL WITH A = 1"))
+			assert False
+		except jira.JiraStatusException as jse:
+			assert jse.get_messages() == ["Invalid JQL"]
+
+
 	@fudge.patch("http.Http")
 	def test_search_unsuccessful(self, Http_Mock):
 		request_form_json = json.dumps({
 			"jql": "SOME JQL WITH A = 1",
 			"fields": ["summary", "status"],
-			"maxResults": 10
+			"maxResults": 10,
+			"startAt": 0
 		})
 
 		response_json_str = json.dumps({
@@ -358,7 +503,8 @@ class JiraRestApiTest(unittest.TestCase):
 						.with_args(
 							"http://host/base/api/2/issue/KEY-12345",
 							headers=["Content-Type: application/json"],
-							cookies=["A", "B"])
+							cookies=["A", "B"],
+							response_headers={})
 						.returns( (200, response_json_str, []) ))
 
 		api = jira.JiraRestApi("http://host/base")
@@ -373,6 +519,81 @@ class JiraRestApiTest(unittest.TestCase):
 		}
 
 
+	@fudge.patch("http.Http")
+	def test_get_fields(self, Http_Mock):
+		(Http_Mock.expects_call()
+					.with_args(_curl_verbose=False, user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('get')
+						.with_args(
+							"http://host/base/api/2/issue/KEY-12345?fields=summary,status",
+							headers=["Content-Type: application/json"],
+							cookies=["A", "B"],
+							response_headers={})
+						.returns( (200, "{}", []) ))
+
+		api = jira.JiraRestApi("http://host/base")
+
+		# bypass authorization check
+		api._auth_cookies = ["A", "B"]
+
+		assert api.get("KEY-12345", ["summary", "status"]) == {}
+
+
+	@fudge.patch("http.Http")
+	def test_get_not_modified(self, Http_Mock):
+		entry = fudge.Fake("CacheEntry").has_attr(data={"key": "KEY-12345"})
+		entry.provides("validators").returns(["If-None-Match: 1"])
+
+		http_cache = (fudge.Fake("HttpCache")
+			.expects("lookup").with_args("http://host/base/api/2/issue/KEY-12345").returns(entry))
+
+		(Http_Mock.expects_call()
+					.with_args(_curl_verbose=False, user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('get')
+						.with_args(
+							"http://host/base/api/2/issue/KEY-12345",
+							headers=["Content-Type: application/json", "If-None-Match: 1"],
+							cookies=["A", "B"],
+							response_headers={})
+						.returns( (304, "", []) ))
+
+		api = jira.JiraRestApi("http://host/base")
+		api.cache = http_cache
+
+		# bypass authorization check
+		api._auth_cookies = ["A", "B"]
+
+		assert api.get("KEY-12345") == {"key": "KEY-12345"}
+
+
+	@fudge.patch("http.Http")
+	def test_get_store_in_cache(self, Http_Mock):
+		def get(url, headers, cookies, response_headers):
+			response_headers["etag"] = "2"
+
+			return (200, '{"key": "KEY-12345"}', [])
+
+		http_cache = (fudge.Fake("HttpCache")
+			.expects("lookup").returns(None)
+			.expects("store").with_args("http://host/base/api/2/issue/KEY-12345", {"etag": "2"}, {"key": "KEY-12345"}))
+
+		(Http_Mock.expects_call()
+					.with_args(_curl_verbose=False, user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('get')
+						.calls(get))
+
+		api = jira.JiraRestApi("http://host/base")
+		api.cache = http_cache
+
+		# bypass authorization check
+		api._auth_cookies = ["A", "B"]
+
+		assert api.get("KEY-12345") == {"key": "KEY-12345"}
+
+
 	@fudge.patch("http.Http")
 	def test_get_unsuccessful(self, Http_Mock):
 		response_json_str = json.dumps({
@@ -387,7 +608,8 @@ class JiraRestApiTest(unittest.TestCase):
 						.with_args(
 							"http://host/base/api/2/issue/KEY-12345",
 							headers=["Content-Type: application/json"],
-							cookies=["A", "B"])
+							cookies=["A", "B"],
+							response_headers={})
 						.returns( (400, response_json_str, []) ))
 
 		api = jira.JiraRestApi("http://host/base")
@@ -430,7 +652,8 @@ class JiraRestApiTest(unittest.TestCase):
 						.with_args(
 							"http://host/base/api/2/issue/KEY-12345/comment",
 							headers=["Content-Type: application/json"],
-							cookies=["A", "B"])
+							cookies=["A", "B"],
+							response_headers={})
 						.returns( (200, response_json_str, []) ))
 
 		api = jira.JiraRestApi("http://host/base")
@@ -459,7 +682,8 @@ class JiraRestApiTest(unittest.TestCase):
 						.with_args(
 							"http://host/base/api/2/issue/KEY-12345/comment",
 							headers=["Content-Type: application/json"],
-							cookies=["A", "B"])
+							cookies=["A", "B"],
+							response_headers={})
 						.returns( (400, response_json_str, []) ))
 
 		api = jira.JiraRestApi("http://host/base")
@@ -850,11 +1074,96 @@ class JiraTest(unittest.TestCase):
 		assert user._display_name == "User Name"
 		assert user._email == "u.name@acme.com"
 
+	@fudge.patch("jira.JiraRestApi")
+	def test_resume(self, JiraRestApi_Mock):
+		myself_json = {
+			"key": "u.name",
+			"displayName": "User Name",
+			"emailAddress": "u.name@acme.com"
+		}
+
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('set_auth_cookies')
+						.with_args(["a", "b"]))
+
+		api = jira.Jira("http://host/base")
+
+		api.resume(["a", "b"], myself_json)
+
+		assert api.me._key == "u.name"
+		assert api.get_me_raw() == myself_json
+
+	@fudge.patch("jira.JiraRestApi")
+	def test_reauthenticate_on_401(self, JiraRestApi_Mock):
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('assign')
+						.with_args("KEY-12345", "user name")
+						.raises(jira.JiraStatusException(401, "/api/2/issue/KEY-12345/assignee", ""))
+					.next_call()
+						.with_args("KEY-12345", "user name"))
+
+		reauthenticate = fudge.Fake("reauthenticate").expects_call().returns(True)
+
+		api = jira.Jira("http://host/base")
+		api.reauthenticate = reauthenticate
+
+		api.assign("KEY-12345", "user name")
+
+	@fudge.patch("jira.JiraRestApi")
+	def test_reauthenticate_failed(self, JiraRestApi_Mock):
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('assign')
+						.with_args("KEY-12345", "user name")
+						.raises(jira.JiraStatusException(401, "/api/2/issue/KEY-12345/assignee", "")))
+
+		reauthenticate = fudge.Fake("reauthenticate").expects_call().returns(False)
+
+		api = jira.Jira("http://host/base")
+		api.reauthenticate = reauthenticate
+
+		self.assertRaises(jira.JiraStatusException, api.assign, "KEY-12345", "user name")
+
+	@fudge.patch("jira.JiraRestApi")
+	@fudge.patch("jira.Issue")
+	def test_search_iter_reauthenticate(self, JiraRestApi_Mock, Issue_Mock):
+		fields = ["summary"]
+
+		def search_stream_expired(jql, max_results, fields, start_at, result):
+			raise jira.JiraStatusException(401, "/api/2/search", "")
+
+		(Issue_Mock.expects_call()
+					.with_arg_count(2)
+					.returns_fake())
+
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('search_stream')
+						.with_args("SOME JQL = 1", 10, fields, 0, arg.any())
+						.calls(search_stream_expired)
+					.next_call()
+						.with_args("SOME JQL = 1", 10, fields, 0, arg.any())
+						.calls(self._test_search_stream(self._test_search_prepare_data(count=2, max_results=10, total=2))))
+
+		reauthenticate = fudge.Fake("reauthenticate").expects_call().returns(True)
+
+		api = jira.Jira("http://host/base")
+		api.reauthenticate = reauthenticate
+
+		assert len(list(api.search_iter("SOME JQL = 1", max_results=10, fields=fields))) == 2
+
 	def _test_search_prepare_data(self, count, max_results, total):
 		issues = []
 
 		for i in range(count):
-			issues.append({"data": "data"})
+			# distinct keys, issues of all pages are held by the identity map
+			issues.append({"key": "KEY-%d" % (next(_issue_numbers)), "data": "data"})
 
 		issues_json = {
 			"issues": issues,
@@ -864,18 +1173,27 @@ class JiraTest(unittest.TestCase):
 
 		return issues_json
 
+	# search_stream() yields the issues and fills in the other members of the result
+	def _test_search_stream(self, result_json):
+		def search_stream(jql, max_results, fields, start_at, result):
+			result.update(dict(result_json, issues=[]))
+
+			return iter(result_json["issues"])
+
+		return search_stream
+
 	# Mocking for the following tests
 	def _test_search_prepare_mocks(self, JiraRestApi_Mock, Issue_Mock, jql, count, fields, issues_json):
 		(Issue_Mock.expects_call()
-					.with_arg_count(1)
+					.with_arg_count(2)
 					.returns_fake())
 
 		(JiraRestApi_Mock.expects_call()
 					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
 					.returns_fake()
-					.expects('search')
-						.with_args(jql, count, fields)
-						.returns(issues_json))
+					.expects('search_stream')
+						.with_args(jql, count, fields, 0, arg.any())
+						.calls(self._test_search_stream(issues_json)))
 
 	@fudge.patch("jira.JiraRestApi")
 	@fudge.patch("jira.Issue")
@@ -959,6 +1277,233 @@ class JiraTest(unittest.TestCase):
 
 
 
+	@fudge.patch("jira.JiraRestApi")
+	@fudge.patch("jira.Issue")
+	def test_search_iter_pages(self, JiraRestApi_Mock, Issue_Mock):
+		fields = ["summary"]
+
+		(Issue_Mock.expects_call()
+					.with_arg_count(2)
+					.returns_fake())
+
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('search_stream')
+						.with_args("SOME JQL = 1", 2, fields, 0, arg.any())
+						.calls(self._test_search_stream(self._test_search_prepare_data(count=2, max_results=2, total=5)))
+					.next_call()
+						.with_args("SOME JQL = 1", 2, fields, 2, arg.any())
+						.calls(self._test_search_stream(self._test_search_prepare_data(count=2, max_results=2, total=5)))
+					.next_call()
+						.with_args("SOME JQL = 1", 2, fields, 4, arg.any())
+						.calls(self._test_search_stream(self._test_search_prepare_data(count=1, max_results=2, total=5))))
+
+		api = jira.Jira("http://host/base")
+
+		result = api.search_iter("SOME JQL = 1", max_results=10, fields=fields, page_size=2)
+
+		assert result.total == None
+		assert len(list(result)) == 5
+		assert result.total == 5
+		assert result.remaining() == 0
+
+	@fudge.patch("jira.JiraRestApi")
+	@fudge.patch("jira.Issue")
+	def test_search_iter_server_capped_page(self, JiraRestApi_Mock, Issue_Mock):
+		fields = ["summary"]
+
+		(Issue_Mock.expects_call()
+					.with_arg_count(2)
+					.returns_fake())
+
+		# server returns less than requested, continue at what has been returned
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('search_stream')
+						.with_args("SOME JQL = 1", 6, fields, 0, arg.any())
+						.calls(self._test_search_stream(self._test_search_prepare_data(count=4, max_results=4, total=20)))
+					.next_call()
+						.with_args("SOME JQL = 1", 2, fields, 4, arg.any())
+						.calls(self._test_search_stream(self._test_search_prepare_data(count=2, max_results=4, total=20))))
+
+		api = jira.Jira("http://host/base")
+
+		result = api.search_iter("SOME JQL = 1", max_results=6, fields=fields, page_size=10)
+
+		assert len(list(result)) == 6
+		assert result.remaining() == 14
+
+	@fudge.patch("jira.JiraRestApi")
+	@fudge.patch("jira.Issue")
+	def test_search_iter_parallel(self, JiraRestApi_Mock, Issue_Mock):
+		fields = ["summary"]
+
+		def page(keys):
+			return {"issues": map(lambda key: {"key": key}, keys), "total": 7, "maxResults": 2}
+
+		Issue_Mock.expects_call().calls(lambda raw, identities: Mock(_key=raw["key"]))
+
+		# the pages after the first complete out of order
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('search_stream')
+						.with_args("SOME JQL = 1", 2, fields, 0, arg.any())
+						.calls(self._test_search_stream(page(["A-1", "A-2"])))
+					.expects('search_batch')
+						.with_args([
+							("SOME JQL = 1", 2, fields, 2),
+							("SOME JQL = 1", 2, fields, 4),
+							("SOME JQL = 1", 1, fields, 6)
+						], 3)
+						.returns(iter([
+							(2, page(["A-7"])),
+							(0, page(["A-3", "A-4"])),
+							(1, page(["A-5", "A-6"]))
+						])))
+
+		api = jira.Jira("http://host/base")
+
+		result = api.search_iter("SOME JQL = 1", max_results=10, fields=fields, page_size=2, parallel=3)
+
+		assert map(lambda issue: issue._key, result) == ["A-1", "A-2", "A-3", "A-4", "A-5", "A-6", "A-7"]
+		assert result.remaining() == 0
+
+	@fudge.patch("jira.JiraRestApi")
+	def test_search_iter_not_validated(self, JiraRestApi_Mock):
+		fields = ["summary"]
+
+		def page(keys):
+			return {"issues": map(lambda key: {"key": key}, keys), "total": 3, "maxResults": 1}
+
+		def search_stream(jql, max_results, fields, start_at, result, validate_query):
+			assert not validate_query
+
+			return self._test_search_stream(page(["A-1"]))(jql, max_results, fields, start_at, result)
+
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('search_stream')
+						.calls(search_stream)
+					.expects('search_batch')
+						.with_args([
+							("key in (A-1, A-2, A-3)", 1, fields, 1, False),
+							("key in (A-1, A-2, A-3)", 1, fields, 2, False)
+						], 2)
+						.returns(iter([
+							(0, page(["A-2"])),
+							(1, page(["A-3"]))
+						])))
+
+		api = jira.Jira("http://host/base")
+
+		result = api.search_iter("key in (A-1, A-2, A-3)", max_results=3, fields=fields, page_size=1, parallel=2, raw=True, validate_query=False)
+
+		assert map(lambda item: item["key"], result) == ["A-1", "A-2", "A-3"]
+
+	@fudge.patch("jira.JiraRestApi")
+	@fudge.patch("jira.Issue")
+	def test_search_iter_parallel_reauthenticate(self, JiraRestApi_Mock, Issue_Mock):
+		fields = ["summary"]
+
+		def page(keys):
+			return {"issues": map(lambda key: {"key": key}, keys), "total": 7, "maxResults": 2}
+
+		def search_batch_expired(searches, parallel):
+			yield (1, page(["A-5", "A-6"]))
+
+			raise jira.JiraStatusException(401, "/api/2/search", "")
+
+		Issue_Mock.expects_call().calls(lambda raw, identities: Mock(_key=raw["key"]))
+
+		# the session expires after the second page: the others are requested again
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('search_stream')
+						.with_args("SOME JQL = 1", 2, fields, 0, arg.any())
+						.calls(self._test_search_stream(page(["A-1", "A-2"])))
+					.expects('search_batch')
+						.with_args([
+							("SOME JQL = 1", 2, fields, 2),
+							("SOME JQL = 1", 2, fields, 4),
+							("SOME JQL = 1", 1, fields, 6)
+						], 3)
+						.calls(search_batch_expired)
+					.next_call()
+						.with_args([
+							("SOME JQL = 1", 2, fields, 2),
+							("SOME JQL = 1", 1, fields, 6)
+						], 3)
+						.returns(iter([
+							(1, page(["A-7"])),
+							(0, page(["A-3", "A-4"]))
+						])))
+
+		reauthenticate = fudge.Fake("reauthenticate").expects_call().returns(True)
+
+		api = jira.Jira("http://host/base")
+		api.reauthenticate = reauthenticate
+
+		result = api.search_iter("SOME JQL = 1", max_results=10, fields=fields, page_size=2, parallel=3)
+
+		assert map(lambda issue: issue._key, result) == ["A-1", "A-2", "A-3", "A-4", "A-5", "A-6", "A-7"]
+		assert result.remaining() == 0
+
+	@fudge.patch("jira.JiraRestApi")
+	@fudge.patch("jira.Issue")
+	@patch("jira.GET_MANY_BATCH_SIZE", 2)
+	def test_get_many(self, JiraRestApi_Mock, Issue_Mock):
+		fields = ["summary"]
+
+		def result(keys):
+			return {"issues": map(lambda key: {"key": key}, keys), "total": len(keys), "maxResults": 2}
+
+		Issue_Mock.expects_call().calls(lambda raw, identities: Mock(_key=raw["key"]))
+
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('search_batch')
+						.with_args([
+							("key in (A-3, A-1)", 2, fields, 0, False),
+							("key in (B-7)", 1, fields, 0, False)
+						], 4)
+						.returns(iter([
+							(1, result(["B-7"])),
+							(0, result(["A-1"]))
+						])))
+
+		api = jira.Jira("http://host/base")
+
+		(issues, missing_keys) = api.get_many(["A-3", "a-1", "B-7", "A-1", "X\" OR 1=1"], fields=fields)
+
+		assert map(lambda issue: issue._key, issues) == ["A-1", "B-7"]
+		assert missing_keys == ["A-3", "X\" OR 1=1"]
+
+
+	@fudge.patch("jira.JiraRestApi")
+	def test_count(self, JiraRestApi_Mock):
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('search_batch')
+						.with_args([
+							("status = Open", 0, [], 0),
+							("status = Closed", 0, [], 0)
+						], 16)
+						.returns(iter([
+							(1, {"issues": [], "total": 7, "maxResults": 0}),
+							(0, {"issues": [], "total": 3, "maxResults": 0})
+						])))
+
+		api = jira.Jira("http://host/base")
+
+		assert api.count(["status = Open", "status = Closed"], parallel=16) == [3, 7]
+
 
 	@fudge.patch("jira.JiraRestApi")
 	def test_get_parent(self, JiraRestApi_Mock):
@@ -997,7 +1542,7 @@ class JiraTest(unittest.TestCase):
 					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
 					.returns_fake()
 					.expects('get')
-						.with_args("KEY-12345")
+						.with_args("KEY-12345", jira.ISSUE_FIELDS)
 						.returns(issue_json))
 
 		api = jira.Jira("http://host/base")
@@ -1016,6 +1561,38 @@ class JiraTest(unittest.TestCase):
 		assert issue._parent._status == "resolved"
 		assert issue._parent._summary == "Parent's summary"
 
+	@fudge.patch("jira.JiraRestApi")
+	def test_get_projected_fields(self, JiraRestApi_Mock):
+		issue_json = {
+			"key": "KEY-12345",
+			"fields": {
+				"status": {
+					"name": "open"
+				}
+			}
+		}
+
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('get')
+						.with_args("KEY-12345", ["status"])
+						.returns(issue_json))
+
+		api = jira.Jira("http://host/base")
+
+		issue = api.get("KEY-12345", fields=["status"])
+
+		assert issue._key == "KEY-12345"
+		assert issue._status == "open"
+		assert issue._summary == None
+		assert issue._type == None
+		assert issue._description == None
+		assert issue._assignee == None
+		assert issue._updated == None
+		assert issue._parent == None
+		assert issue._subtasks == []
+
 	@fudge.patch("jira.JiraRestApi")
 	def test_get_subtasks(self, JiraRestApi_Mock):
 		issue_json = {
@@ -1055,7 +1632,7 @@ class JiraTest(unittest.TestCase):
 					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
 					.returns_fake()
 					.expects('get')
-						.with_args("KEY-12345")
+						.with_args("KEY-12345", jira.ISSUE_FIELDS)
 						.returns(issue_json))
 
 		api = jira.Jira("http://host/base")
@@ -1249,3 +1826,194 @@ class JiraTest(unittest.TestCase):
 		assert assignees[1]._key == "user.name2"
 		assert assignees[1]._display_name == "User Name 2"
 		assert assignees[1]._email == "u2@acme.com"
+
+	@fudge.patch("jira.JiraRestApi")
+	def test_get_assignees_cached(self, JiraRestApi_Mock):
+		assignees_json = [
+			{"key": "user.name1", "displayName": "User Name 1", "emailAddress": "u1@acme.com"}
+		]
+
+		# called once only
+		(JiraRestApi_Mock.expects_call()
+					.with_args("http://host/base", user_agent_prefix="PyJira", proxy=None)
+					.returns_fake()
+					.expects('get_assignees')
+						.with_args("user na")
+						.returns(assignees_json)
+						.times_called(1))
+
+		api = jira.Jira("http://host/base")
+		api.cache_users()
+
+		assert api.get_assignees("user na")[0]._key == "user.name1"
+		assert api.get_assignees("user na")[0]._key == "user.name1"
+
+	def test_model_without_instance_dicts(self):
+		issue = jira.Issue({"key": "KEY-1", "fields": {"assignee": {"name": "user.name", "displayName": "User Name"}}})
+
+		assert not hasattr(issue, "__dict__")
+		assert not hasattr(issue._assignee, "__dict__")
+
+	def test_issue_fields_decoded_when_read(self):
+		issue = jira.Issue({"key": "KEY-1", "fields": {
+			"summary": u"Summary",
+			"assignee": {"name": "user.name", "displayName": "User Name"},
+			"subtasks": [{"key": "KEY-2"}]
+		}})
+
+		assert issue._summary == "Summary"
+		assert issue._assignee is issue._assignee
+		assert issue._assignee._key == "user.name"
+		assert issue._subtasks[0]._key == "KEY-2"
+		assert issue._description == None
+		assert issue._parent == None
+
+		self.assertRaises(AttributeError, getattr, issue, "_unknown")
+
+	def test_issue_raw_fields_released(self):
+		issue = jira.Issue({"key": "KEY-1", "fields": {
+			"summary": u"Summary",
+			"description": u"Description",
+			"issuetype": {"name": u"Bug"},
+			"updated": u"2015-01-23T19:03:43.000+0100"
+		}})
+
+		assert issue._fields == {"description": u"Description", "issuetype": {"name": u"Bug"}, "updated": u"2015-01-23T19:03:43.000+0100"}
+		assert issue._description == "Description"
+		assert issue._type == "Bug"
+		assert "description" not in issue._fields
+		assert issue._updated == 1422036223
+		assert issue._fields == None
+
+class IdentityMapTest(unittest.TestCase):
+
+	def setUp(self):
+		self.identities = jira.IdentityMap()
+
+	def test_user_shared(self):
+		me = self.identities.user({"name": "user.name", "displayName": "User Name"})
+		issue = jira.Issue({"key": "KEY-1", "fields": {"assignee": {"name": "user.name", "displayName": "User Name"}}}, self.identities)
+
+		assert issue._assignee is me
+		assert issue._assignee == me
+
+	def test_parent_shared(self):
+		parent = {"key": "KEY-1", "fields": {"summary": u"Parent"}}
+		first = jira.Issue({"key": "KEY-2", "fields": {"parent": parent}}, self.identities)
+		second = jira.Issue({"key": "KEY-3", "fields": {"parent": parent}}, self.identities)
+
+		assert first._parent is second._parent
+		assert first._parent._parent == None
+
+	"""It should keep references to the parents only, not to the issues listed"""
+	def test_issue_not_shared(self):
+		raw_obj = {"key": "KEY-2", "fields": {"parent": {"key": "KEY-1", "fields": {}}}}
+		issue = jira.Issue(raw_obj, self.identities)
+
+		assert jira.Issue(raw_obj, self.identities) is not issue
+		assert self.identities._issues.keys() == ["KEY-1"]
+
+	def test_issue_merged(self):
+		stub = self.identities.issue({"key": "KEY-1", "fields": {"summary": u"Summary", "status": {"name": u"Open"}}})
+
+		assert stub._description == None
+
+		issue = self.identities.issue({"key": "KEY-1", "fields": {"status": {"name": u"Closed"}, "description": u"Description"}})
+
+		assert issue is stub
+		assert issue._summary == "Summary"
+		assert issue._status == "Closed"
+		assert issue._description == "Description"
+
+	def test_user_merged(self):
+		user = self.identities.user({"name": "user.name", "displayName": "User Name"})
+
+		assert self.identities.user({"name": "user.name", "displayName": "User Name", "emailAddress": "user@host"}) is user
+		assert user._email == "user@host"
+
+	def test_released_when_unused(self):
+		self.identities.issue({"key": "KEY-1", "fields": {"summary": u"Summary"}})
+
+		assert self.identities.issue({"key": "KEY-1", "fields": {}})._summary == None
+
+	def test_references_dropped(self):
+		for i in range(3 * jira._MIN_REFERENCES):
+			self.identities.issue({"key": "KEY-%d" % (i), "fields": {}})
+
+		assert len(self.identities._issues) <= jira._MIN_REFERENCES
+
+class IssueBatchTest(unittest.TestCase):
+
+	def setUp(self):
+		def item(key, status, assignee, updated):
+			return {"key": key, "fields": {
+				"status": {"name": status},
+				"assignee": {"name": assignee} if assignee != None else None,
+				"issuetype": {"name": u"Bug"},
+				"updated": updated
+			}}
+
+		self.batch = jira.IssueBatch()
+		self.batch.extend([
+			item(u"KEY-1", u"Open", u"j.doe", u"2015-01-23T19:03:43.000+0100"),
+			item(u"KEY-2", u"Closed", u"j.doe", u"2015-01-20T10:00:00.000+0100"),
+			item(u"KEY-3", u"Open", None, u"2015-01-10T10:00:00.000+0100"),
+			item(u"KEY-4", u"Open", u"j.doe", None)
+		])
+
+	def test_columns(self):
+		assert len(self.batch) == 4
+		assert self.batch.keys == ["KEY-1", "KEY-2", "KEY-3", "KEY-4"]
+		assert self.batch.status.values == ["Open", "Closed"]
+		assert list(self.batch.status.codes) == [0, 1, 0, 0]
+
+	def test_count_by(self):
+		assert self.batch.count_by("status") == {"Open": 3, "Closed": 1}
+		assert self.batch.count_by("assignee") == {"j.doe": 3, None: 1}
+		assert self.batch.count_by("type") == {"Bug": 4}
+
+	def test_count_by_columns(self):
+		assert self.batch.count_by("assignee", "status") == {
+			("j.doe", "Open"): 2,
+			("j.doe", "Closed"): 1,
+			(None, "Open"): 1
+		}
+
+	def test_histogram(self):
+		edges = [0, jira.parse_timestamp("2015-01-15T00:00:00.000+0000"), jira.parse_timestamp("2015-01-23T00:00:00.000+0000"), float("inf")]
+
+		# issues without updated are not counted
+		assert self.batch.histogram(edges) == [1, 1, 1]
+
+	def test_empty(self):
+		batch = jira.IssueBatch()
+
+		assert batch.count_by("status") == {}
+		assert batch.count_by("status", "assignee") == {}
+		assert batch.histogram([0, 1]) == [0]
+
+	def test_search_columns(self):
+		api = jira.Jira("http://host/base")
+		api.search_iter = Mock(return_value=[{"key": u"KEY-1", "fields": {"status": {"name": u"Open"}}}])
+
+		batch = api.search_columns("SOME JQL = 1", 1000, parallel=4)
+
+		api.search_iter.assert_called_once_with("SOME JQL = 1", 1000, jira.IssueBatch.fields, parallel=4, raw=True)
+		assert batch.count_by("status") == {"Open": 1}
+
+class ParseTimestampTest(unittest.TestCase):
+
+	def test_parse_timestamp(self):
+		assert jira.parse_timestamp("2015-01-23T19:03:43.000+0100") == 1422036223
+		assert jira.parse_timestamp("2015-01-23T13:03:43.250-0500") == 1422036223.25
+		assert jira.parse_timestamp("2015-01-23T18:03:43+00:00") == 1422036223
+
+	def test_parse_timestamp_fallback(self):
+		assert jira.parse_timestamp("2015-01-23T18:03:43.5Z") == 1422036223.5
+		assert jira.parse_timestamp("23 Jan 2015 18:03:43 GMT") == 1422036223
+
+	def test_parse_timestamp_cached(self):
+		text = "2015-01-23T19:03:44.000+0100"
+
+		assert jira.parse_timestamp(text) == 1422036224
+		assert jira._timestamps[text] == 1422036224
@@ -1,23 +1,237 @@
 import sys
 import os
 import os.path
-import ConfigParser
-import crypt
-import getpass
-import jira
-import datetime
-from printer import Printer
+
+# report the time spent importing modules (like python -X importtime)
+if __name__ == "__main__" and "--import-time" in sys.argv[1:]:
+	import importtime
+	importtime.install()
+
+import daemon
+
+# global options followed by a value, like "-p 8"
+VALUE_OPTIONS = ["-l", "--limit", "-p", "--parallel"]
+
+"""Subcommand of argv (without the program) or None, skipping the global options
+without loading argparse"""
+def _subcommand(argv):
+	args = iter(argv)
+
+	for arg in args:
+		if arg in VALUE_OPTIONS:
+			next(args, None)
+		elif not arg.startswith("-"):
+			return arg
+
+	return None
+
+# hand the command to a running daemon before loading anything else
+if __name__ == "__main__" and _subcommand(sys.argv[1:]) not in ("daemon", "shell"):
+	_exit_code = daemon.forward(sys.argv[1:])
+
+	if _exit_code != None:
+		sys.exit(_exit_code)
+
+import time
+import threading
+import Queue
+import copy
+import shlex
 import argparse
+import lazy
 from release import VERSION, BINARY_NAME
 
+# imported when used, not for --help/--version or by a daemon client
+jira = lazy.LazyModule("jira")
+cache = lazy.LazyModule("cache")
+mirror = lazy.LazyModule("mirror")
+jql_parser = lazy.LazyModule("jql")
+crypt = lazy.LazyModule("crypt")
+printer = lazy.LazyModule("printer")
+ConfigParser = lazy.LazyModule("ConfigParser")
+getpass = lazy.LazyModule("getpass")
+json = lazy.LazyModule("json")
+
 # in $HOME
 CONFIG_FILE=".pyjirarc"
 
 DEFAULT_STORE_PATH = ".pyjirastore"
 
+DEFAULT_MIRROR_PATH = ".pyjiramirror"
+
+# seconds a synced project answers queries without asking JIRA
+DEFAULT_MIRROR_MAX_AGE = 900
+
+# seconds a stored session is used without checking it with the server
+DEFAULT_SESSION_TTL = 3600
+
 # default limit for issues returned from a query
 MAX_ISSUES_LIMIT = 50
 
+# issues counted by stats at most
+STATS_MAX_ISSUES = 100000
+
+# default and upper bound for concurrent requests (result pages, issue batches)
+DEFAULT_PARALLEL = 4
+MAX_PARALLEL = 16
+
+# separates the row predicates of counts from the column predicates
+COUNTS_SEPARATOR = "/"
+
+# read-only subcommands run while a stored session is being validated
+SPECULATIVE_COMMANDS = ["query", "filter", "get", "comments", "stats", "counts"]
+
+# subcommands not run from a batch or the shell
+BATCH_EXCLUDED_COMMANDS = ["batch", "shell", "serve"]
+SHELL_EXCLUDED_COMMANDS = ["shell", "serve"]
+
+# answered from the mirror only
+LOCAL_COMMANDS = ["grep"]
+
+SHELL_PROMPT = BINARY_NAME + "> "
+
+# seconds, far beyond any command
+BATCH_WAIT_TIMEOUT = 86400
+
+"""Issue keys a command was given (upper case), none for invalid commands"""
+def _issue_keys(args):
+	if isinstance(args, str) or getattr(args, "key", None) == None:
+		return []
+
+	keys = args.key if isinstance(args.key, list) else [args.key]
+
+	return map(lambda key: key.upper(), keys)
+
+"""Subcommands whose parsers are built only when chosen on the command line"""
+class LazySubParsersAction(argparse._SubParsersAction):
+
+	def __init__(self, *args, **kwargs):
+		super(LazySubParsersAction, self).__init__(*args, **kwargs)
+
+		self._builders = {}
+
+	"""Add subcommand name, build(name) is called to add_parser() it once it is used"""
+	def add_lazy_parser(self, name, help, build):
+		# listed in the help of the main parser
+		self._choices_actions.append(self._ChoicesPseudoAction(name, help))
+
+		# a valid choice before being built
+		self._name_parser_map[name] = None
+		self._builders[name] = build
+
+	def __call__(self, parser, namespace, values, option_string=None):
+		name = values[0]
+
+		if name in self._builders:
+			self._builders.pop(name)(name)
+
+		super(LazySubParsersAction, self).__call__(parser, namespace, values, option_string)
+
+"""Stdout collecting the output of each thread that capture()s it separately"""
+class ThreadOutput(object):
+
+	def __init__(self, stdout):
+		self.stdout = stdout
+
+		self._local = threading.local()
+		self._lock = threading.Lock()
+
+	def capture(self):
+		self._local.captured = []
+
+	"""Stop capturing, returns the output captured"""
+	def release(self):
+		captured = self._local.captured
+		self._local.captured = None
+
+		return "".join(captured)
+
+	"""Stop capturing for a while, returns the output captured so far for resume()"""
+	def suspend(self):
+		captured = self._local.captured
+		self._local.captured = None
+
+		return captured
+
+	def resume(self, captured):
+		self._local.captured = captured
+
+	def write(self, text):
+		captured = getattr(self._local, "captured", None)
+
+		if captured != None:
+			captured.append(text)
+		else:
+			self.write_through(text)
+
+	def write_through(self, text):
+		with self._lock:
+			self.stdout.write(text)
+
+	def flush(self):
+		with self._lock:
+			self.stdout.flush()
+
+"""Checks stored session cookies in the background, using a client of its own"""
+class SessionValidation(threading.Thread):
+
+	def __init__(self, url, proxy, auth_cookies):
+		super(SessionValidation, self).__init__()
+
+		self.daemon = True
+
+		self._url = url
+		self._proxy = proxy
+		self._auth_cookies = auth_cookies
+
+		self.authenticated = False
+		self.me_raw = None
+
+		self.done = threading.Event()
+
+	def run(self):
+		validation_jira = jira.Jira(self._url, user_agent_prefix="PyJiraCLI", proxy=self._proxy)
+
+		try:
+			self.authenticated = validation_jira.check_auth(self._auth_cookies)
+			self.me_raw = validation_jira.get_me_raw()
+		except Exception:
+			# login again instead of running into the same error
+			self.authenticated = False
+		finally:
+			validation_jira.close()
+			self.done.set()
+
+	def succeeded(self):
+		return self.done.is_set() and self.authenticated
+
+"""Stdout of a command run before its session has been validated: output is held
+back until the validation succeeded and passed through from then on"""
+class SpeculativeOutput(object):
+
+	def __init__(self, stdout, validation):
+		self._stdout = stdout
+		self._validation = validation
+		self._held = []
+
+	def write(self, text):
+		if self._validation.succeeded():
+			self.release()
+			self._stdout.write(text)
+		else:
+			self._held.append(text)
+
+	def flush(self):
+		if self._validation.succeeded():
+			self.release()
+			self._stdout.flush()
+
+	"""Write the held back output"""
+	def release(self):
+		if len(self._held) > 0:
+			self._stdout.write("".join(self._held))
+			self._held = []
+
 class PyJiraCli(object):
 
 	def _fail(self, message):
@@ -60,6 +274,11 @@ class PyJiraCli(object):
 		if self.store_pw == None:
 			self._fail("No session store password configured.\nPlease add [store] with key=<password>")
 
+		try:
+			self.session_ttl = int(self._get_option(self.config, "store", "ttl", DEFAULT_SESSION_TTL))
+		except ValueError:
+			self._fail("Invalid session TTL.\nPlease set [store] ttl=<seconds>")
+
 		if self.url == None:
 			self._fail("Jira URL not configured.\nPlease add [jira] with url=https://<host>/path/ending/with/rest")
 
@@ -68,6 +287,33 @@ class PyJiraCli(object):
 		if self.username == None:
 			self._fail("Jira username not configured.\nPlease add [jira] with user=<username>")
 
+		# optional cache of issues and comments, revalidated with each request
+		self.cache_path = self._get_option(self.config, "cache", "path")
+
+		if self.cache_path != None:
+			self.cache_path = os.path.join(home_path, self.cache_path)
+
+		try:
+			self.cache_max_entries = int(self._get_option(self.config, "cache", "max_entries", cache.DEFAULT_MAX_ENTRIES))
+			self.cache_max_size = int(self._get_option(self.config, "cache", "max_size", cache.DEFAULT_MAX_SIZE / 1024 / 1024)) * 1024 * 1024
+		except ValueError:
+			self._fail("Invalid cache limit.\nPlease set [cache] max_entries=<count> and max_size=<megabytes>")
+
+		# local copy of the issues of filters and projects, see sync
+		self.mirror_path = os.path.join(home_path, self._get_option(self.config, "mirror", "path", DEFAULT_MIRROR_PATH))
+
+		projects = self._get_option(self.config, "mirror", "projects", "")
+		self.mirror_projects = filter(lambda project: project != "", map(lambda project: project.strip(), projects.split(",")))
+
+		try:
+			self.mirror_max_age = int(self._get_option(self.config, "mirror", "max_age", DEFAULT_MIRROR_MAX_AGE))
+		except ValueError:
+			self._fail("Invalid mirror age.\nPlease set [mirror] max_age=<seconds>")
+
+		self._mirror = None
+
+	# returns the session as dict with the auth "cookies", the "myself" user details
+	# and when the session has been "validated" the last time
 	def _load_session(self):
 		c = crypt.Cryptor(self.store_pw)
 
@@ -82,30 +328,64 @@ class PyJiraCli(object):
 
 				serialized_session = c.decrypt(crypted_content)
 
-				return serialized_session.split("; ")
+				try:
+					session = json.loads(serialized_session)
+				except ValueError:
+					# stored by an older version: cookies only, never validated
+					return {
+						"cookies": serialized_session.split("; "),
+						"myself": None,
+						"validated": None
+					}
+
+				# cookies are sent as byte strings
+				session["cookies"] = map(lambda cookie: cookie.encode("utf8"), session["cookies"])
+
+				return session
 
 	def _store_session(self):
 		c = crypt.Cryptor(self.store_pw)
 
 		with open(self.store_path, "w+") as f:
 			if self._session != None:
-				serialized_session = "; ".join(self._session)
+				serialized_session = json.dumps(self._session)
 
 				f.write(c.encrypt(serialized_session))
 			else:
 				f.write("")
 
+	# remember the session of the current check_auth() or login()
+	def _validated_session(self):
+		self._session = {
+			"cookies": self.jira.get_auth_cookies(),
+			"myself": self.jira.get_me_raw(),
+			"validated": time.time()
+		}
+
+		self._store_session()
+
+	# trust a recently validated session without asking the server
+	def _is_session_fresh(self):
+		validated = self._session["validated"]
+
+		if validated == None or self._session["myself"] == None:
+			return False
+
+		return 0 <= time.time() - validated < self.session_ttl
+
 
 	def _jira_check_auth(self):
-		is_authenticated = self.jira.check_auth(self._session)
+		is_authenticated = self.jira.check_auth(self._session["cookies"])
 
 		if not is_authenticated:
 			self._session = None
+		else:
+			self._validated_session()
 
 		return is_authenticated
 
-	def _jira_auth(self):
-		print "No session stored. Please authenticate as \"%s\"." % (self.username)
+	def _jira_auth(self, reason="No session stored."):
+		print "%s Please authenticate as \"%s\"." % (reason, self.username)
 
 		try:
 			jira_password = getpass.getpass("Password: ")
@@ -116,50 +396,279 @@ class PyJiraCli(object):
 		is_authenticated = self.jira.login(self.username, jira_password)
 
 		if is_authenticated:
-			self._session = self.jira.get_auth_cookies()
+			self._validated_session()
 
 		return is_authenticated
 
+	# called by jira.Jira when a request was rejected because the session expired
+	def _jira_reauth(self):
+		self._session = None
+		self._store_session()
 
+		return self._jira_auth("Session expired.")
 
-	def _init(self):
+
+
+	def _new_jira(self):
 		# jira.JiraRestApi._CURL_VERBOSE = True
-		self.jira = jira.Jira(self.url, user_agent_prefix="PyJiraCLI", proxy=self.proxy)
+		new_jira = jira.Jira(self.url, user_agent_prefix="PyJiraCLI", proxy=self.proxy)
 
-		self._session = self._load_session()
+		if self.cache_path != None:
+			new_jira.use_cache(cache.HttpCache(
+				self.cache_path,
+				self.username,
+				max_entries=self.cache_max_entries,
+				max_size=self.cache_max_size))
+
+		return new_jira
+
+	def _init(self):
+		self.jira = self._new_jira()
+
+		self.jira.reauthenticate = self._jira_reauth
+
+		# the session has been loaded by run() already
+		self._validation = None
 
 		if self._session != None:
+			if self._is_session_fresh():
+				# skip checking the session, an expired one is renewed on 401
+				self.jira.resume(self._session["cookies"], self._session["myself"])
+
+			elif self._can_speculate():
+				# run the command while the session is being checked
+				self.jira.resume(self._session["cookies"], self._session["myself"])
+
+				self._validation = SessionValidation(self.url, self.proxy, self._session["cookies"])
+				self._validation.start()
+
 			# resets _session if not valid
-			if not self._jira_check_auth():
+			elif not self._jira_check_auth():
 				self._store_session()
 				print "Stored session was no longer authenticated. Try to login ..."
 
 		if self._session == None:
 			if not self._jira_auth():
 				self._fail("Failed to login.")
+
+		self.printer = printer.Printer(me=self.jira.me, width=80)
+
+	# for commands answered from the mirror: no connection, no session check
+	def _init_local(self):
+		self._validation = None
+
+		me = None
+
+		if self._session != None and self._session["myself"] != None:
+			me = jira.User(self._session["myself"])
+
+		self.printer = printer.Printer(me=me, width=80)
+
+	def _open_mirror(self):
+		if self._mirror == None:
+			self._mirror = mirror.Mirror(self.mirror_path)
+
+		return self._mirror
+
+	# whether the command is answered from the mirror
+	def _is_local(self):
+		if getattr(self._parsed, "local", False) or self._parsed.func.__name__ in LOCAL_COMMANDS:
+			return True
+
+		jql = self._command_jql(self._parsed)
+
+		if jql == None:
+			return False
+
+		# the command runs as planned here, even if the mirror expires meanwhile
+		self._parsed.query_plan = self._plan_query(jql)
+
+		return self._parsed.query_plan[0] != None
+
+	# the JQL run by query and filter
+	def _command_jql(self, args):
+		if args.func.__name__ in ("query", "stats"):
+			return " ".join(args.query)
+
+		if args.func.__name__ == "filter":
+			return self._get_option(self.config, "filters", args.name, None)
+
+		return None
+
+	def _my_name(self):
+		if self._session == None or self._session["myself"] == None:
+			return None
+
+		return self._session["myself"]["name"]
+
+	"""Returns (jql.Query, explanation) if jql can be answered from the mirror,
+	otherwise (None, explanation why it is sent to JIRA)"""
+	def _plan_query(self, jql):
+		# do not create the mirror just to find out that it is empty
+		if len(self.mirror_projects) == 0 or not os.path.exists(self.mirror_path):
+			return (None, "no [mirror] projects synced")
+
+		try:
+			query = jql_parser.parse(jql)
+		except jql_parser.UnsupportedQuery as e:
+			return (None, "not supported by the mirror: %s" % (e))
+
+		projects = query.projects()
+
+		if projects == None:
+			return (None, "not limited to projects")
+
+		if query.uses_current_user() and self._my_name() == None:
+			return (None, "currentUser() is not known yet")
+
+		ages = []
+
+		for project in projects:
+			mirrored = filter(lambda mirror_project: mirror_project.upper() == project.upper(), self.mirror_projects)
+
+			if len(mirrored) == 0:
+				return (None, "project %s is not mirrored" % (project))
+
+			last_sync = self._open_mirror().last_sync("project:" + mirrored[0])
+
+			if last_sync == None:
+				return (None, "project %s has not been synced yet" % (project))
+
+			if not last_sync[2]:
+				return (None, "project %s has been truncated by the last sync (more than %d issues)" % (project, mirror.MAX_MIRRORED_ISSUES))
+
+			age = time.time() - last_sync[1]
+
+			if age > self.mirror_max_age:
+				return (None, "project %s has been synced %d minutes ago" % (project, age / 60))
+
+			ages.append(age)
+
+		# like display names or email addresses, or users without issues
+		unknown_users = self._open_mirror().unknown_users(filter(lambda user: user.lower() != (self._my_name() or "").lower(), query.users()))
+
+		if len(unknown_users) > 0:
+			return (None, "no mirrored issue is assigned to user %s" % (unknown_users[0]))
+
+		return (query, "synced %d minutes ago" % (max(ages) / 60))
+
+	# the plan of the command's JQL made by _is_local(), planned now for commands
+	# run by the shell, a batch or the daemon
+	def _command_plan(self, jql, args):
+		plan = getattr(args, "query_plan", None)
+
+		return plan if plan != None else self._plan_query(jql)
+
+	# user details are needed to run a command before the session has been checked
+	def _can_speculate(self):
+		return self._session["myself"] != None and self._parsed.func.__name__ in SPECULATIVE_COMMANDS
+
+	# returns False if the command failed with a Jira error
+	def _dispatch(self, args):
+		try:
+			# run configured subcommand with parsed args
+			args.func(args)
+
+			return True
+
+		except jira.JiraStatusException as jse:
+			messages = jse.get_messages()
+
+			if len(messages) > 1:
+				messages = "\n- " + ("\n- ".join(messages))
 			else:
-				self._store_session()
+				messages = messages[0]
+
+			print "Jira error (%d): %s" % (jse.get_status(), messages)
+
+		except jira.JiraAuthException as jae:
+			print jae
+
+		return False
+
+	"""Dispatch the command while the session is being validated. Its output is held
+	back until the session turned out to be valid; otherwise the output is discarded
+	and the command is run again after login."""
+	def _dispatch_speculative(self):
+		stdout = sys.stdout
+		output = SpeculativeOutput(stdout, self._validation)
+
+		exit = None
+
+		sys.stdout = output
+
+		# a 401 is expected for an invalid session, do not ask for the password yet
+		self.jira.reauthenticate = None
+
+		try:
+			self._dispatch(self._parsed)
+		except SystemExit as e:
+			exit = e
+		finally:
+			sys.stdout = stdout
+			self.jira.reauthenticate = self._jira_reauth
+
+		self._validation.join()
+
+		if self._validation.authenticated:
+			output.release()
+
+			self.jira.resume(self._session["cookies"], self._validation.me_raw)
+			self._validated_session()
+
+			if exit != None:
+				raise exit
+
+			return
 
-		self.printer = Printer(me=self.jira.me, width=80)
+		self._session = None
+		self._store_session()
+		print "Stored session was no longer authenticated. Try to login ..."
 
-	def _query(self, query, limit):
+		if not self._jira_auth():
+			self._fail("Failed to login.")
+
+		self._dispatch(self._parsed)
+
+	def _query(self, query, args):
 		# summary, assignee, reporter, status, created, updated, description, parent, project, subtasks
 
-		(issues, remaining_results, limited_to) = self.jira.search(query, max_results=limit)
+		(local_query, explanation) = self._command_plan(query, args)
+
+		if args.explain:
+			print >> sys.stderr, "%s: %s" % ("Mirror" if local_query != None else "JIRA", explanation)
+
+		if local_query != None:
+			(items, total) = self._open_mirror().select(local_query, self._my_name(), args.query_limit)
+
+			self._print_mirrored(items, total, args)
+			return
+
+		limit = args.query_limit
+		render_mode = "tree" if args.render_tree else "oneline"
+
+		# print issues page by page while they arrive
+		issues = self.jira.search_iter(
+			query,
+			max_results=limit,
+			fields=printer.Printer.fields[render_mode],
+			parallel=args.parallel)
 
 		for issue in issues:
-			if self._parsed.render_tree:
+			if args.render_tree:
 				print self.printer.tree(issue)
 			else:
 				print self.printer.oneline(issue)
 
+		remaining_results = issues.remaining()
+
 		if remaining_results > 0:
-			print "%d Issues remaining (limited to %d)" % (remaining_results, limited_to)
+			print "%d Issues remaining (limited to %d)" % (remaining_results, limit)
 
 	def query(self, args):
 		query = " ".join(args.query)
 
-		self._query(query, args.query_limit)
+		self._query(query, args)
 
 	def filter(self, args):
 		jql = self._get_option(self.config, "filters", args.name, None)
@@ -167,13 +676,151 @@ class PyJiraCli(object):
 		if jql == None:
 			self._fail("Filter \"%s\" not found" % args.name)
 
-		self._query(jql, args.query_limit)
+		if args.local:
+			self._query_local(args.name, args)
+		else:
+			self._query(jql, args)
+
+	def _query_local(self, name, args):
+		local_mirror = self._open_mirror()
+
+		if local_mirror.last_sync(name) == None:
+			self._fail("Filter \"%s\" has not been synced yet" % (name))
+
+		if args.explain:
+			print >> sys.stderr, "Mirror: issues of filter %s as of its last sync" % (name)
+
+		(items, total) = local_mirror.filter_issues(name, args.query_limit)
+
+		self._print_mirrored(items, total, args)
+
+	def _print_mirrored(self, items, total, args):
+		for item in items:
+			if args.render_tree:
+				print self.printer.tree(jira.Issue(item))
+			else:
+				print self.printer.oneline(jira.Issue(item))
+
+		if total > len(items):
+			print "%d Issues remaining (limited to %d)" % (total - len(items), args.query_limit)
 
 	def get(self, args):
-		issue = self.jira.get(args.key)
+		keys = args.key
 
-		print self.printer.card(issue)
+		# nothing to read from a terminal unless asked to
+		if len(keys) == 0 and sys.stdin.isatty():
+			self._fail("No issue keys given: pass them as arguments, or pipe them to stdin (or pass \"-\" to type them)")
 
+		# read whitespace separated keys from stdin
+		if len(keys) == 0 or keys == ["-"]:
+			keys = sys.stdin.read().split()
+
+			# keep them for running the command again
+			args.key = keys
+
+		if args.local:
+			self._get_local(keys)
+			return
+
+		if len(keys) == 1:
+			print self.printer.card(self.jira.get(keys[0], fields=printer.Printer.fields["card"]))
+			return
+
+		(issues, missing_keys) = self.jira.get_many(
+			keys,
+			fields=printer.Printer.fields["card"],
+			parallel=args.parallel)
+
+		for issue in issues:
+			print self.printer.card(issue)
+
+		if len(missing_keys) > 0:
+			self._fail("Issues not found: %s" % (", ".join(missing_keys)))
+
+
+	def stats(self, args):
+		jql = " ".join(args.query)
+
+		(local_query, explanation) = self._command_plan(jql, args)
+
+		if args.explain:
+			print >> sys.stderr, "%s: %s" % ("Mirror" if local_query != None else "JIRA", explanation)
+
+		if local_query != None:
+			batch = jira.IssueBatch()
+			batch.extend(self._open_mirror().select(local_query, self._my_name(), STATS_MAX_ISSUES)[0])
+		else:
+			batch = self.jira.search_columns(jql, STATS_MAX_ISSUES, args.parallel)
+
+		print self.printer.stats(batch, time.time())
+
+	def counts(self, args):
+		predicates = args.predicates
+
+		if COUNTS_SEPARATOR in predicates:
+			rows = predicates[0:predicates.index(COUNTS_SEPARATOR)]
+			columns = predicates[predicates.index(COUNTS_SEPARATOR) + 1:]
+		else:
+			rows = predicates
+			columns = []
+
+		if len(rows) == 0:
+			self._fail("No JQL to count given")
+
+		if len(columns) == 0:
+			jqls = rows
+		else:
+			jqls = ["(%s) AND (%s)" % (row, column) for row in rows for column in columns]
+
+		totals = self.jira.count(jqls, min(len(jqls), args.parallel))
+
+		print self.printer.counts(rows, columns, totals)
+
+	def grep(self, args):
+		(items, total) = self._open_mirror().search(args.text, args.query_limit)
+
+		self._print_mirrored(items, total, args)
+
+	def _get_local(self, keys):
+		keys = map(lambda key: key.upper(), keys)
+		items = self._open_mirror().get(keys)
+
+		for key in keys:
+			if key in items:
+				print self.printer.card(jira.Issue(items[key]))
+
+		missing_keys = filter(lambda key: key not in items, keys)
+
+		if len(missing_keys) > 0:
+			self._fail("Issues not mirrored: %s" % (", ".join(missing_keys)))
+
+	def sync(self, args):
+		names = args.name
+
+		# all filters and projects if none is named
+		if len(names) == 0:
+			names = self.config.options("filters") if self.config.has_section("filters") else []
+			names = names + map(lambda project: "project:" + project, self.mirror_projects)
+
+		local_mirror = self._open_mirror()
+
+		for name in names:
+			if name.startswith("project:"):
+				jql = "project = %s" % (name[len("project:"):])
+			else:
+				jql = self._get_option(self.config, "filters", name, None)
+
+				if jql == None:
+					self._fail("Filter \"%s\" not found" % name)
+
+			(fetched, total, incremental, complete) = local_mirror.sync(self.jira, name, jql, args.parallel)
+
+			print "%s: %d issues, %d fetched%s%s" % (
+				name,
+				total,
+				fetched,
+				" (changed since last sync)" if incremental else "",
+				"" if complete else ", truncated: more issues match (queries go to JIRA)")
 
 	def comments(self, args):
 		comments = self.jira.get_comments(args.key)
@@ -229,6 +876,299 @@ class PyJiraCli(object):
 		for user in users:
 			print "%s %s (%s)" % (user._key.ljust(20), user._display_name, user._email)
 
+	def batch(self, args):
+		if args.file == None or args.file == "-":
+			# the daemon's stdin of the client reads all or a line only
+			lines = sys.stdin.read().splitlines(True)
+		else:
+			try:
+				with open(args.file, "r") as f:
+					lines = f.readlines()
+			except IOError as e:
+				self._fail("Failed to read batch file: %s" % (e))
+
+		# (line number, command line, parsed args or an error message if invalid)
+		commands = []
+
+		for (line_no, line) in enumerate(lines, 1):
+			line = line.strip()
+
+			if line == "" or line.startswith("#"):
+				continue
+
+			commands.append((line_no, line, self._parse_batch_line(line)))
+
+		chains = self._batch_chains(commands)
+
+		workers = min(args.parallel, len(chains))
+
+		output = ThreadOutput(sys.stdout)
+		sys.stdout = output
+
+		# workers log in one at a time
+		self._auth_lock = threading.Lock()
+
+		todo = Queue.Queue()
+		done = Queue.Queue()
+
+		for chain in chains:
+			todo.put(map(lambda index: (index, commands[index][2]), chain))
+
+		for _i in range(workers):
+			worker = threading.Thread(target=self._batch_worker, args=(todo, done, output))
+			worker.daemon = True
+			worker.start()
+
+		results = []
+
+		# output of commands completing in any order
+		completed = {}
+
+		try:
+			# print the output of each command in the order of the lines
+			while len(results) < len(commands):
+				# a timeout keeps waiting interruptible
+				(index, result) = done.get(True, BATCH_WAIT_TIMEOUT)
+				completed[index] = result
+
+				while len(results) in completed:
+					result = completed.pop(len(results))
+					output.write_through(result[1])
+					results.append(result[0])
+		finally:
+			sys.stdout = output.stdout
+
+		failed = len(filter(lambda status: status != 0, results))
+
+		print "Batch: %d commands, %d failed" % (len(commands), failed)
+
+		for ((line_no, line, _args), status) in zip(commands, results):
+			print "%4d %-10s %s" % (line_no, "ok" if status == 0 else "failed (%d)" % (status), line)
+
+		if failed > 0:
+			sys.exit(1)
+
+	# lines are shell-like (get ACME-1 ACME-2) or a JSON array (["get", "ACME-1", "ACME-2"])
+	def _parse_batch_line(self, line):
+		try:
+			if line.startswith("["):
+				argv = map(lambda arg: arg.encode("utf8"), json.loads(line))
+			else:
+				argv = shlex.split(line)
+
+			parsed = self._parser.parse_args(argv)
+		except (Exception, SystemExit):
+			# argparse reported the details to stderr already
+			return "Invalid command: %s" % (line)
+
+		if parsed.func.__name__ in BATCH_EXCLUDED_COMMANDS:
+			return "Not available in a batch: %s" % (line)
+
+		return parsed
+
+	# indexes of the commands in chains of commands on the same issues (directly or
+	# through another command, like "get ACME-1 ACME-2"), in the order of the lines:
+	# the chains run in parallel, the commands of a chain one after another
+	def _batch_chains(self, commands):
+		chains = {}
+		chain_keys = {}
+		chain_of_key = {}
+
+		for (index, (_line_no, _line, args)) in enumerate(commands):
+			keys = _issue_keys(args)
+
+			# chains sharing a key with the command are joined into the first one
+			ids = sorted(set(map(lambda key: chain_of_key[key], filter(lambda key: key in chain_of_key, keys))))
+			chain_id = ids[0] if len(ids) > 0 else index
+
+			chain = chains.setdefault(chain_id, [])
+			joined_keys = chain_keys.setdefault(chain_id, set())
+			joined_keys.update(keys)
+
+			for other_id in ids[1:]:
+				chain.extend(chains.pop(other_id))
+				joined_keys.update(chain_keys.pop(other_id))
+
+			chain.append(index)
+
+			for key in joined_keys:
+				chain_of_key[key] = chain_id
+
+		return map(lambda chain_id: sorted(chains[chain_id]), sorted(chains.keys()))
+
+	# runs commands on a Jira instance of its own as these are not thread safe
+	def _batch_worker(self, todo, done, output):
+		worker = copy.copy(self)
+		worker.jira = self._new_jira()
+
+		# SQLite connections are bound to their thread
+		worker._mirror = None
+		worker.jira.resume(self.jira.get_auth_cookies(), self.jira.get_me_raw())
+		worker.jira.reauthenticate = lambda: self._batch_reauth(worker.jira, output)
+
+		try:
+			while True:
+				try:
+					chain = todo.get_nowait()
+				except Queue.Empty:
+					return
+
+				for (index, args) in chain:
+					output.capture()
+					status = 2
+
+					try:
+						if isinstance(args, str):
+							print args
+						else:
+							# run by this worker
+							args.func = getattr(worker, args.func.__name__)
+
+							status = 0 if worker._dispatch(args) else 1
+					except SystemExit as e:
+						status = e.code if isinstance(e.code, int) else 1
+					except daemon.Fallback:
+						# the daemon can not ask for the password, the other lines go on
+						print "Failed: session expired, log in by running a command without the daemon"
+						status = 1
+					except BaseException as e:
+						# report every line, the batch waits for all of them
+						print "Failed: %s" % (e if str(e) != "" else type(e).__name__)
+						status = 1
+					finally:
+						done.put((index, (status, output.release())))
+		finally:
+			worker.jira.close()
+
+			if worker._mirror != None:
+				worker._mirror.close()
+
+	# log in once for all workers, the others take over the new session
+	def _batch_reauth(self, worker_jira, output):
+		with self._auth_lock:
+			if self.jira.get_auth_cookies() == worker_jira.get_auth_cookies():
+				# the password prompt is not part of the command's output
+				captured = output.suspend()
+
+				try:
+					if not self.jira.reauthenticate():
+						return False
+				finally:
+					output.resume(captured)
+
+			worker_jira.resume(self.jira.get_auth_cookies(), self.jira.get_me_raw())
+
+			return True
+
+	def shell(self, args):
+		self._keep_warm()
+
+		try:
+			# line editing and history for raw_input() where available
+			import readline
+		except ImportError:
+			pass
+
+		print "Enter commands like \"get ACME-42\", \"help\" to list them or \"exit\"."
+
+		while True:
+			try:
+				line = raw_input(SHELL_PROMPT).strip()
+			except EOFError:
+				print ""
+				break
+			except KeyboardInterrupt:
+				print ""
+				continue
+
+			if line == "":
+				continue
+
+			if line == "exit" or line == "quit":
+				break
+
+			if line == "help":
+				self._parser.print_help()
+				continue
+
+			try:
+				command_args = self._parser.parse_args(shlex.split(line))
+			except Exception as e:
+				# unbalanced quotes or a limit out of range
+				print "Invalid command: %s" % (e)
+				continue
+			except SystemExit:
+				# argparse printed the usage or help
+				continue
+
+			if command_args.func.__name__ in SHELL_EXCLUDED_COMMANDS:
+				print "Not available in the shell: %s" % (line)
+				continue
+
+			try:
+				self._dispatch(command_args)
+			except SystemExit:
+				# the command printed why it failed
+				pass
+			except KeyboardInterrupt:
+				print ""
+			except Exception as e:
+				print "Failed: %s" % (e)
+
+	# for long running processes: keep issues, comments and users in memory
+	def _keep_warm(self):
+		self.jira.use_cache(cache.MemoryCache(self.jira.get_cache(), max_entries=self.cache_max_entries))
+		self.jira.cache_users()
+
+	def serve(self, args):
+		self._keep_warm()
+
+		# there is no terminal to ask for the password
+		self.jira.reauthenticate = self._daemon_reauth
+
+		path = daemon.socket_path()
+
+		if daemon.is_running(path):
+			self._fail("Daemon is running already.")
+
+		print "Running commands sent to %s (Ctrl-C to stop)" % (path)
+
+		try:
+			daemon.serve(path, self.execute)
+		except KeyboardInterrupt:
+			print ""
+
+	"""Run a command sent to the daemon"""
+	def execute(self, argv):
+		try:
+			self._parsed = self._parser.parse_args(argv)
+		except Exception as e:
+			self._fail(e)
+
+		if self._parsed.func == self.serve:
+			self._fail("Daemon is running already.")
+
+		if self._parsed.func == self.shell:
+			self._fail("The shell is not available through the daemon.")
+
+		self._dispatch(self._parsed)
+
+	# use a session stored by a login of another invocation meanwhile,
+	# or let the client run the command and ask for the password (the command fails
+	# if it has written output already, see daemon.Fallback)
+	def _daemon_reauth(self):
+		session = self._load_session()
+
+		if session == None or session["cookies"] == self.jira.get_auth_cookies():
+			raise daemon.Fallback()
+
+		self._session = session
+
+		me_raw = session["myself"] if session["myself"] != None else self.jira.get_me_raw()
+		self.jira.resume(session["cookies"], me_raw)
+
+		return True
+
 	def _parse_args(self):
 		self.parser = argparse.ArgumentParser()
 		subparsers = self.parser.add_subparsers(
@@ -239,29 +1179,36 @@ class PyJiraCli(object):
 	def _get_cmd_subparser(self, subparsers, fn, names, help, arguments):
 		subparser_no = 0
 
-		for name in names:
-			cmd_help = help
-
-			if subparser_no > 0:
-				cmd_help += " (alias for %s)" % names[0]
-
-			cmd_parser = subparsers.add_parser(name, help=cmd_help)
+		# arguments lists named positional arguments and switches
+		# (like "--local") with their configs (nargs, help, etc)
+		def build(name):
+			cmd_parser = subparsers.add_parser(name)
 			cmd_parser.set_defaults(func=fn)
 
-			# iterate over all argument config options
-			# arguments maps a named positional argument
-			# to their configs (nargs, help, etc)
-			for arg_name, config in arguments.iteritems():
+			for arg_name, config in arguments:
+				if arg_name.startswith("-"):
+					cmd_parser.add_argument(arg_name, action="store_true", help=config["help"])
+					continue
+
 				cmd_parser.add_argument(
 					arg_name,
 					nargs=(config["nargs"] if "nargs" in config else None),
 					type=str,
 					help=config["help"])
 
+		for name in names:
+			cmd_help = help
+
+			if subparser_no > 0:
+				cmd_help += " (alias for %s)" % names[0]
+
+			# parsers are built for the subcommand used only
+			subparsers.add_lazy_parser(name, cmd_help, build)
+
 			subparser_no += 1
 
 
-	def run(self):
+	def _create_parser(self):
 		parser = argparse.ArgumentParser(
 			prog=BINARY_NAME,
 			description="Interact with JIRA using the command line interface.",
@@ -297,6 +1244,32 @@ class PyJiraCli(object):
 			action=LimitSwitchAction
 		)
 
+		class ParallelSwitchAction(argparse.Action):
+			def __call__(self, parser, namespace, values, option_string=None):
+				if values > MAX_PARALLEL or values <= 0:
+					raise Exception("Parallel %d exceeds range 1 - %d" % (values, MAX_PARALLEL))
+
+				setattr(namespace, self.dest, values)
+
+		parser.add_argument(
+			'-p', '--parallel',
+			dest="parallel",
+			type=int,
+			default=DEFAULT_PARALLEL,
+			metavar='N',
+			help="Run up to N requests concurrently when searching/filtering or getting many issues (defaults to %d)" % (DEFAULT_PARALLEL),
+			action=ParallelSwitchAction
+		)
+
+		parser.add_argument(
+			'--import-time',
+			dest="import_time",
+			help="Report the time spent importing modules to stderr (like python -X importtime)",
+			action='store_true'
+		)
+
+		parser.register('action', 'parsers', LazySubParsersAction)
+
 		subparsers = parser.add_subparsers(
 			title='COMMANDS')
 
@@ -304,110 +1277,208 @@ class PyJiraCli(object):
 			subparsers,
 			self.query,
 			["jql", "search", "query"],
-			"Query by JQL", {
-				"query": {
+			"Query by JQL", [
+				("query", {
 					"nargs": "+",
 					"help": 'JQL like "project = ACME and status = Open"'
-				}
-			})
+				}),
+				("--explain", {
+					"help": "Tell whether the query is answered from the mirror (see sync) or by JIRA, and why"
+				})
+			])
 
 		self._get_cmd_subparser(
 			subparsers,
 			self.get,
 			["get", "show", "issue"],
-			"Get issue details", {
-				"key": {
+			"Get issue details", [
+				("key", {
+					"nargs": "*",
+					"help": 'Issue keys like "ACME-123" (read from stdin if "-", or if omitted and stdin is not a terminal)'
+				}),
+				("--local", {
+					"help": "Get the issues from the mirror (see sync) instead of JIRA"
+				})
+			])
+
+		self._get_cmd_subparser(
+			subparsers,
+			self.filter,
+			["filter"],
+			"Query by named filter", [
+				("name", {
+					"help": 'Named query like "acme-status-open"'
+				}),
+				("--local", {
+					"help": "Get the issues from the mirror (see sync) instead of JIRA"
+				}),
+				("--explain", {
+					"help": "Tell whether the query is answered from the mirror (see sync) or by JIRA, and why"
+				})
+			])
+
+		self._get_cmd_subparser(
+			subparsers,
+			self.grep,
+			["grep"],
+			"Search the summaries, descriptions and comments of mirrored issues (see sync), best matches first", [
+				("text", {
+					"nargs": "+",
+					"help": 'Words contained by the issues like "timeout" (parts of words match, too)'
+				})
+			])
+
+		self._get_cmd_subparser(
+			subparsers,
+			self.stats,
+			["stats"],
+			"Count the issues matching JQL by status, assignee, type and age of their last update", [
+				("query", {
+					"nargs": "+",
+					"help": 'JQL like "project = ACME and status != Closed"'
+				}),
+				("--explain", {
+					"help": "Tell whether the query is answered from the mirror (see sync) or by JIRA, and why"
+				})
+			])
+
+		self._get_cmd_subparser(
+			subparsers,
+			self.counts,
+			["counts"],
+			"Count the issues matching JQL predicates, rows %s columns, as table (JIRA returns the totals only)" % (COUNTS_SEPARATOR), [
+				("predicates", {
+					"nargs": "+",
+					"help": 'JQL like "project = ACME" "project = FOO" %s "status = Open" "status = Closed" (counts of both projects by status)' % (COUNTS_SEPARATOR)
+				})
+			])
+
+		self._get_cmd_subparser(
+			subparsers,
+			self.sync,
+			["sync"],
+			"Mirror the issues of filters and [mirror] projects for --local, fetching changed issues only after the first sync", [
+				("name", {
+					"nargs": "*",
+					"help": 'Named queries like "acme-status-open" or "project:ACME" (all if omitted)'
+				})
+			])
+
+		self._get_cmd_subparser(
+			subparsers,
+			self.comment,
+			["comment"],
+			"Comment on issue", [
+				("key", {
+					"help": 'Issue key like "ACME-123"'
+				}),
+				("comment", {
+					"nargs": "+",
+					"help": 'Comment text like "Deployed application to *QA*"'
+				})
+			])
+
+		self._get_cmd_subparser(
+			subparsers,
+			self.comments,
+			["comments"],
+			"Show comments of issue", [
+				("key", {
+					"help": 'Issue key like "ACME-123"'
+				})
+			])
+
+		self._get_cmd_subparser(
+			subparsers,
+			self.assign,
+			["assign"],
+			"Assign issue to someone", [
+				("key", {
 					"help": 'Issue key like "ACME-123"'
-				}
-			})
-
-		parser_filter = subparsers.add_parser('filter', help="Query by named filter")
-		parser_filter.set_defaults(func=self.filter)
-		parser_filter.add_argument(
-			'name',
-			type=str,
-			help='Named query like "acme-status-open"')
-
-		parser_comment = subparsers.add_parser('comment', help="Comment on issue")
-		parser_comment.set_defaults(func=self.comment)
-		parser_comment.add_argument(
-			'key',
-			type=str,
-			help='Issue key like "ACME-123"')
-		parser_comment.add_argument(
-			'comment',
-			nargs="+",
-			type=str,
-			help='Comment text like "Deployed application to *QA*"')
-
-		parser_comments = subparsers.add_parser('comments', help="Show comments of issue")
-		parser_comments.set_defaults(func=self.comments)
-		parser_comments.add_argument(
-			'key',
-			type=str,
-			help='Issue key like "ACME-123"')
-
-		parser_assign = subparsers.add_parser('assign', help="Assign issue to someone")
-		parser_assign.set_defaults(func=self.assign)
-		parser_assign.add_argument(
-			'key',
-			type=str,
-			help='Issue key like "ACME-123"')
-		parser_assign.add_argument(
-			'name',
-			type=str,
-			help='User name or name fragment like "j.d" or "j.doe" or "John"')
-
-		parser_unassign = subparsers.add_parser('unassign', help="Unassign")
-		parser_unassign.set_defaults(func=self.unassign)
-		parser_unassign.add_argument(
-			'key',
-			type=str,
-			help='Issue key like "ACME-123"')
+				}),
+				("name", {
+					"help": 'User name or name fragment like "j.d" or "j.doe" or "John"'
+				})
+			])
+
+		self._get_cmd_subparser(
+			subparsers,
+			self.unassign,
+			["unassign"],
+			"Unassign", [
+				("key", {
+					"help": 'Issue key like "ACME-123"'
+				})
+			])
 
 		self._get_cmd_subparser(
 			subparsers,
 			self.assign_to_me,
 			["assignme", "tome"],
-			"Assign issue to me", {
-				"key": {
+			"Assign issue to me", [
+				("key", {
 					"help": 'Issue key like "ACME-123"'
-				}
-			})
+				})
+			])
 
-		parser_assignees = subparsers.add_parser('assignees', help="List assignees by name fragment")
-		parser_assignees.set_defaults(func=self.assignees)
-		parser_assignees.add_argument(
-			'username_fragement',
-			type=str,
-			help='User name or name fragment like "j.d" or "j.doe" or "John"')
+		self._get_cmd_subparser(
+			subparsers,
+			self.assignees,
+			["assignees"],
+			"List assignees by name fragment", [
+				("username_fragement", {
+					"help": 'User name or name fragment like "j.d" or "j.doe" or "John"'
+				})
+			])
 
+		self._get_cmd_subparser(
+			subparsers,
+			self.batch,
+			["batch"],
+			"Run commands read from a file, one per line, on up to -p N workers (commands on the same issue in the order of the lines)", [
+				("file", {
+					"nargs": "?",
+					"help": 'File with one command per line like "comment ACME-123 Deployed" or ["comment", "ACME-123", "Deployed"] (stdin if omitted or "-")'
+				})
+			])
 
-		try:
-			self._parsed = parser.parse_args(sys.argv[1:])
-		except Exception as e:
-			self._fail(e)
+		self._get_cmd_subparser(
+			subparsers,
+			self.shell,
+			["shell"],
+			"Enter commands at a prompt, keeping the session, connections and caches open",
+			[])
 
-		self._read_config()
-		self._init()
+		self._get_cmd_subparser(
+			subparsers,
+			self.serve,
+			["daemon"],
+			"Keep the session and connections open and run the commands of other invocations",
+			[])
+
+		return parser
 
+	def run(self):
+		self._parser = self._create_parser()
 
 		try:
-			# run configured subcommand with parsed args
-			self._parsed.func(self._parsed)
+			self._parsed = self._parser.parse_args(sys.argv[1:])
+		except Exception as e:
+			self._fail(e)
 
-		except jira.JiraStatusException as jse:
-			messages = jse.get_messages()
+		self._read_config()
 
-			if len(messages) > 1:
-				messages = "\n- " + ("\n- ".join(messages))
-			else:
-				messages = messages[0]
+		self._session = self._load_session()
 
-			print "Jira error (%d): %s" % (jse.get_status(), messages)
+		if self._is_local():
+			self._init_local()
+		else:
+			self._init()
 
-		except jira.JiraAuthException as jae:
-			print jae
+		if self._validation != None:
+			self._dispatch_speculative()
+		else:
+			self._dispatch(self._parsed)
 
 
 if __name__ == "__main__":
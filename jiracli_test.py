@@ -0,0 +1,447 @@
+import unittest
+import time
+import sys
+import StringIO
+import tempfile
+import shutil
+import os.path
+from mock import Mock, patch
+import daemon
+import jiracli
+import mirror
+import mirror_test
+
+class SubcommandTest(unittest.TestCase):
+
+	"""It should skip the global options and their values"""
+	def test_subcommand(self):
+		assert jiracli._subcommand(["shell"]) == "shell"
+		assert jiracli._subcommand(["-p", "8", "shell"]) == "shell"
+		assert jiracli._subcommand(["-s", "--limit", "10", "filter", "mine"]) == "filter"
+		assert jiracli._subcommand(["--version"]) == None
+
+"""SessionValidation completing when joined"""
+class FakeValidation(object):
+
+	def __init__(self, authenticated):
+		self.authenticated = authenticated
+		self.me_raw = {"name": "me", "displayName": "Me"}
+		self.finished = False
+
+	def join(self):
+		self.finished = True
+
+	def succeeded(self):
+		return self.finished and self.authenticated
+
+class SpeculativeTest(unittest.TestCase):
+
+	def setUp(self):
+		self.stdout = sys.stdout
+		self.output = StringIO.StringIO()
+		sys.stdout = self.output
+
+		# output released while the command runs
+		self.output_while_running = []
+		self.runs = 0
+
+		def get(args):
+			self.runs += 1
+
+			print "issue %d" % (self.runs)
+			self.output_while_running.append(self.output.getvalue())
+
+			if args.key == ["EXIT"]:
+				sys.exit(3)
+
+		self.cli = jiracli.PyJiraCli()
+		self.cli.get = get
+		self.cli._parser = self.cli._create_parser()
+		self.cli.jira = Mock()
+		self.cli._session = {"cookies": ["A"], "myself": None, "validated": None}
+		self.cli._store_session = Mock()
+		self.cli._validated_session = Mock()
+		self.cli._jira_auth = Mock(return_value=True)
+
+	def tearDown(self):
+		sys.stdout = self.stdout
+
+	def dispatch(self, key, authenticated):
+		self.cli._parsed = self.cli._parser.parse_args(["get", key])
+		self.cli._validation = FakeValidation(authenticated)
+
+		self.cli._dispatch_speculative()
+
+	"""It should hold the output back until the session turned out to be valid"""
+	def test_valid_session(self):
+		self.dispatch("A-1", True)
+
+		assert self.output_while_running == [""]
+		assert self.output.getvalue() == "issue 1\n"
+
+		self.cli.jira.resume.assert_called_once_with(["A"], self.cli._validation.me_raw)
+		self.cli._validated_session.assert_called_once_with()
+
+	"""It should discard the output and run the command again after login"""
+	def test_invalid_session(self):
+		self.dispatch("A-1", False)
+
+		assert self.output_while_running == ["", "Stored session was no longer authenticated. Try to login ...\nissue 2\n"]
+		assert self.output.getvalue() == "Stored session was no longer authenticated. Try to login ...\nissue 2\n"
+		assert self.cli._session == None
+
+		self.cli._store_session.assert_called_once_with()
+		self.cli._jira_auth.assert_called_once_with()
+
+	"""It should exit like the command once the session turned out to be valid"""
+	def test_exit(self):
+		with self.assertRaises(SystemExit) as raised:
+			self.dispatch("EXIT", True)
+
+		assert raised.exception.code == 3
+		assert self.output.getvalue() == "issue 1\n"
+
+	"""It should pass output through once the session has been validated"""
+	def test_output(self):
+		validation = FakeValidation(True)
+		stdout = StringIO.StringIO()
+		output = jiracli.SpeculativeOutput(stdout, validation)
+
+		output.write("a")
+		assert stdout.getvalue() == ""
+
+		validation.join()
+		output.write("b")
+		assert stdout.getvalue() == "ab"
+
+class SessionValidationTest(unittest.TestCase):
+
+	@patch("jira.Jira")
+	def test_validation(self, Jira_Mock):
+		Jira_Mock.return_value.check_auth.return_value = True
+		Jira_Mock.return_value.get_me_raw.return_value = {"name": "me"}
+
+		validation = jiracli.SessionValidation("http://host/base", None, ["A"])
+		validation.start()
+		validation.join()
+
+		assert validation.succeeded()
+		assert validation.me_raw == {"name": "me"}
+		Jira_Mock.return_value.check_auth.assert_called_once_with(["A"])
+
+	@patch("jira.Jira")
+	def test_validation_failed(self, Jira_Mock):
+		Jira_Mock.return_value.check_auth.side_effect = Exception("connection refused")
+
+		validation = jiracli.SessionValidation("http://host/base", None, ["A"])
+		validation.start()
+		validation.join()
+
+		assert not validation.succeeded()
+		assert validation.done.is_set()
+
+class CountsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.stdout = sys.stdout
+		sys.stdout = StringIO.StringIO()
+
+		self.cli = jiracli.PyJiraCli()
+		self.cli._parser = self.cli._create_parser()
+		self.cli.jira = Mock()
+		self.cli.jira.count.return_value = [1, 2, 3, 4, 5, 6]
+		self.cli.printer = Mock()
+
+	def tearDown(self):
+		sys.stdout = self.stdout
+
+	"""It should count the cells on up to -p connections"""
+	def test_counts_parallel(self):
+		args = self.cli._parser.parse_args(["-p", "2", "counts", "project = A", "project = B", "/", "status = Open", "status = Closed", "status = Done"])
+		args.func(args)
+
+		self.cli.jira.count.assert_called_once_with([
+			"(project = A) AND (status = Open)",
+			"(project = A) AND (status = Closed)",
+			"(project = A) AND (status = Done)",
+			"(project = B) AND (status = Open)",
+			"(project = B) AND (status = Closed)",
+			"(project = B) AND (status = Done)"], 2)
+
+	"""It should not use more connections than cells"""
+	def test_counts_cells(self):
+		args = self.cli._parser.parse_args(["-p", "16", "counts", "project = A", "project = B"])
+		args.func(args)
+
+		self.cli.jira.count.assert_called_once_with(["project = A", "project = B"], 2)
+
+"""Stdin of a terminal the user types into"""
+class FakeTerminal(StringIO.StringIO):
+
+	def isatty(self):
+		return True
+
+class GetTest(unittest.TestCase):
+
+	def setUp(self):
+		self.streams = (sys.stdout, sys.stdin)
+		sys.stdout = StringIO.StringIO()
+
+		self.cli = jiracli.PyJiraCli()
+		self.cli._parser = self.cli._create_parser()
+		self.cli.jira = Mock()
+		self.cli.jira.get_many.return_value = ([], [])
+		self.cli.printer = Mock()
+
+	def tearDown(self):
+		(sys.stdout, sys.stdin) = self.streams
+
+	def get(self, argv, stdin):
+		sys.stdin = stdin
+
+		args = self.cli._parser.parse_args(["get"] + argv)
+		args.func(args)
+
+	"""It should not wait for keys typed into a terminal unless asked to"""
+	def test_get_no_keys(self):
+		with self.assertRaises(SystemExit):
+			self.get([], FakeTerminal("A-1"))
+
+		assert sys.stdout.getvalue().startswith("No issue keys given")
+		assert not self.cli.jira.get_many.called
+
+	"""It should read keys from stdin if piped or asked to"""
+	def test_get_keys_from_stdin(self):
+		self.get([], StringIO.StringIO("A-1\nA-2\n"))
+		self.get(["-"], FakeTerminal("A-3 A-4"))
+
+		assert map(lambda call: call[0][0], self.cli.jira.get_many.call_args_list) == [["A-1", "A-2"], ["A-3", "A-4"]]
+
+class PlanQueryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+
+		self.cli = jiracli.PyJiraCli()
+		self.cli.mirror_projects = ["ACME"]
+		self.cli.mirror_path = os.path.join(self.dir, "mirror")
+		self.cli.mirror_max_age = 900
+		self.cli._mirror = None
+		self.cli._session = None
+
+	def tearDown(self):
+		if self.cli._mirror != None:
+			self.cli._mirror.close()
+
+		shutil.rmtree(self.dir)
+
+	def sync(self, count):
+		max_mirrored_issues = mirror.MAX_MIRRORED_ISSUES
+		mirror.MAX_MIRRORED_ISSUES = 2
+
+		try:
+			jira = mirror_test.FakeJira({"project = ACME": map(lambda i: mirror_test.item("ACME-%d" % (i)), range(count))})
+			self.cli._open_mirror().sync(jira, "project:ACME", "project = ACME")
+		finally:
+			mirror.MAX_MIRRORED_ISSUES = max_mirrored_issues
+
+	"""It should answer queries of projects synced completely from the mirror"""
+	def test_plan_query(self):
+		self.sync(2)
+
+		assert self.cli._plan_query("project = ACME")[0] != None
+
+	"""It should send queries of projects truncated by the last sync to JIRA"""
+	def test_plan_query_truncated(self):
+		self.sync(3)
+
+		(query, explanation) = self.cli._plan_query("project = ACME")
+
+		assert query == None
+		assert explanation == "project ACME has been truncated by the last sync (more than 10000 issues)"
+
+	"""It should send queries on assignees known by display name or email address to JIRA"""
+	def test_plan_query_unknown_user(self):
+		self.sync(2)
+
+		assert self.cli._plan_query("project = ACME AND assignee = ME")[0] != None
+		assert self.cli._plan_query('project = ACME AND assignee in (me, "Jane Doe")') == (None, "no mirrored issue is assigned to user Jane Doe")
+		assert self.cli._plan_query("project = ACME AND assignee = jane@example.com")[0] == None
+
+	"""It should run the command as planned, even if the mirror expired meanwhile"""
+	def test_planned_once(self):
+		self.sync(2)
+
+		self.cli._parser = self.cli._create_parser()
+		self.cli._parsed = self.cli._parser.parse_args(["query", "project = ACME"])
+		self.cli.printer = Mock()
+		self.cli.printer.oneline.side_effect = lambda issue: issue._key
+
+		assert self.cli._is_local()
+
+		self.cli.mirror_max_age = 0
+
+		stdout = sys.stdout
+		sys.stdout = StringIO.StringIO()
+
+		try:
+			self.cli._dispatch(self.cli._parsed)
+			output = sys.stdout.getvalue()
+		finally:
+			sys.stdout = stdout
+
+		assert output == "ACME-1\nACME-0\n"
+
+class ShellTest(unittest.TestCase):
+
+	def setUp(self):
+		self.stdout = sys.stdout
+
+		def comment(args):
+			print "commented %s" % (args.key)
+
+		self.cli = jiracli.PyJiraCli()
+		self.cli.comment = comment
+		self.cli._parser = self.cli._create_parser()
+		self.cli._keep_warm = Mock()
+
+	def tearDown(self):
+		sys.stdout = self.stdout
+
+	"""It should report invalid global options and go on"""
+	def test_shell_invalid_options(self):
+		sys.stdout = StringIO.StringIO()
+
+		with patch("__builtin__.raw_input", Mock(side_effect=["-l 0 comment A-1 x", "-p 99 comment A-1 x", "comment 'A-1", "comment A-2 x", EOFError()])):
+			self.cli.shell(None)
+
+		output = sys.stdout.getvalue()
+		sys.stdout = self.stdout
+
+		assert "Invalid command: Limit 0 exceeds range 1 - 10000" in output
+		assert "Invalid command: Parallel 99 exceeds range 1 - 16" in output
+		assert "Invalid command: No closing quotation" in output
+		assert "commented A-2" in output
+
+class BatchTest(unittest.TestCase):
+
+	def setUp(self):
+		self.streams = (sys.stdout, sys.stderr, sys.stdin)
+
+		def comment(args):
+			# the first command completes last
+			if args.key == "A-1":
+				time.sleep(0.05)
+
+			print "commented %s: %s" % (args.key, " ".join(args.comment))
+
+		def unassign(args):
+			raise daemon.Fallback()
+
+		self.cli = jiracli.PyJiraCli()
+		self.cli.comment = comment
+		self.cli.unassign = unassign
+		self.cli._parser = self.cli._create_parser()
+		self.cli._mirror = None
+		self.cli.jira = Mock()
+		self.cli._new_jira = Mock
+
+	def tearDown(self):
+		(sys.stdout, sys.stderr, sys.stdin) = self.streams
+
+	# returns (exit code, output) of the batch of text read from stdin
+	def batch(self, text, parallel=2):
+		args = self.cli._parser.parse_args(["-p", str(parallel), "batch"])
+
+		# reads all or a line only, like the stdin of a daemon's client
+		sys.stdin = daemon._ReplayedStdin("", StringIO.StringIO(text))
+		sys.stdout = StringIO.StringIO()
+		sys.stderr = StringIO.StringIO()
+
+		try:
+			self.cli.batch(args)
+			code = 0
+		except SystemExit as e:
+			code = e.code
+
+		output = sys.stdout.getvalue()
+		(sys.stdout, sys.stderr, sys.stdin) = self.streams
+
+		return (code, output)
+
+	"""It should parse shell-like and JSON lines"""
+	def test_parse_batch_line(self):
+		args = self.cli._parse_batch_line('comment A-1 "Deployed to QA"')
+
+		assert args.func.__name__ == "comment"
+		assert args.key == "A-1"
+		assert args.comment == ["Deployed to QA"]
+
+		args = self.cli._parse_batch_line('["comment", "A-2", "Deployed"]')
+
+		assert args.key == "A-2"
+		assert args.comment == ["Deployed"]
+
+	"""It should tell invalid lines and commands not available in a batch"""
+	def test_parse_batch_line_invalid(self):
+		sys.stderr = StringIO.StringIO()
+
+		assert self.cli._parse_batch_line("unknown A-1") == "Invalid command: unknown A-1"
+		assert self.cli._parse_batch_line('["comment"') == "Invalid command: [\"comment\""
+		assert self.cli._parse_batch_line("batch") == "Not available in a batch: batch"
+
+	"""It should print the output in the order of the lines and report each line"""
+	def test_batch(self):
+		(code, output) = self.batch("# comments are skipped\ncomment A-1 first\n\ncomment A-2 second\nunknown\n")
+
+		assert code == 1
+		assert output == "\n".join([
+			"commented A-1: first",
+			"commented A-2: second",
+			"Invalid command: unknown",
+			"Batch: 3 commands, 1 failed",
+			"   2 ok         comment A-1 first",
+			"   4 ok         comment A-2 second",
+			"   5 failed (2) unknown",
+			""])
+
+	"""It should chain the commands on the same issues, joined by commands on several"""
+	def test_batch_chains(self):
+		sys.stderr = StringIO.StringIO()
+
+		lines = ["comment A-1 x", "comment A-2 x", "get a-1 A-3", "query project = A", "unknown", "get A-3 A-2", "comment A-4 x"]
+		commands = map(lambda (i, line): (i + 1, line, self.cli._parse_batch_line(line)), enumerate(lines))
+
+		assert self.cli._batch_chains(commands) == [[0, 1, 2, 5], [3], [4], [6]]
+
+	"""It should run the lines on one issue one after another, in the order of the lines"""
+	def test_batch_same_issue(self):
+		runs = []
+
+		def unassign(args):
+			# completes last if run in parallel
+			time.sleep(0.05)
+			runs.append("unassign %s" % (args.key))
+
+		def assign_to_me(args):
+			runs.append("assignme %s" % (args.key))
+
+		self.cli.unassign = unassign
+		self.cli.assign_to_me = assign_to_me
+		self.cli._parser = self.cli._create_parser()
+
+		(code, output) = self.batch("unassign ACME-1\nassignme acme-1\nassignme ACME-2\n", parallel=4)
+
+		assert code == 0
+		assert runs.index("unassign ACME-1") < runs.index("assignme acme-1")
+		assert "Batch: 3 commands, 0 failed" in output
+
+	"""It should report the lines of commands the daemon hands back and go on"""
+	def test_batch_fallback(self):
+		(code, output) = self.batch("unassign A-1\ncomment A-2 second\nunassign A-3\n")
+
+		assert code == 1
+		assert "commented A-2: second" in output
+		assert "Batch: 3 commands, 2 failed" in output
+		assert "   1 failed (1) unassign A-1" in output
+		assert "   3 failed (1) unassign A-3" in output
@@ -0,0 +1,251 @@
+import re
+
+"""Parser of the JQL subset answered from the mirror: conjunctions of clauses on project,
+status, assignee and key like
+
+project = ACME AND status in (Open, "In Progress") AND assignee = currentUser() ORDER BY key DESC
+
+Anything else raises UnsupportedQuery, to be run by JIRA instead."""
+
+FIELDS = ["project", "status", "assignee", "key"]
+
+# fields to order by in addition to FIELDS
+ORDER_FIELDS = FIELDS + ["updated"]
+
+# value of currentUser()
+CURRENT_USER = object()
+
+# value of EMPTY and null
+EMPTY = None
+
+_TOKEN = re.compile(r"""
+	\s*(?:
+		(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*') |
+		(?P<operator>!=|=|\(|\)|,) |
+		(?P<word>[^\s()=,!"'~<>]+) |
+		(?P<other>\S)
+	)""", re.VERBOSE | re.DOTALL)
+
+class UnsupportedQuery(BaseException):
+	pass
+
+"""A clause on field matching issues with one of values (op "in") or none of them
+(op "not in"). Values are strings, CURRENT_USER or EMPTY."""
+class Clause(object):
+
+	def __init__(self, field, op, values):
+		self.field = field
+		self.op = op
+		self.values = values
+
+"""Parsed JQL: clauses that all have to match and (field, ascending) to order by"""
+class Query(object):
+
+	def __init__(self, clauses, order):
+		self.clauses = clauses
+		self.order = order
+
+	"""Projects the query is limited to or None"""
+	def projects(self):
+		for clause in self.clauses:
+			if clause.field == "project" and clause.op == "in" and EMPTY not in clause.values:
+				return clause.values
+
+		return None
+
+	def uses_current_user(self):
+		return any(map(lambda clause: CURRENT_USER in clause.values, self.clauses))
+
+	"""Assignee values other than currentUser() and EMPTY: JIRA takes user names,
+	display names and email addresses"""
+	def users(self):
+		users = []
+
+		for clause in filter(lambda clause: clause.field == "assignee", self.clauses):
+			users.extend(filter(lambda value: value is not CURRENT_USER and value != EMPTY, clause.values))
+
+		return users
+
+def _tokenize(jql):
+	tokens = []
+	position = 0
+
+	while position < len(jql):
+		match = _TOKEN.match(jql, position)
+
+		if match == None:
+			# trailing whitespace
+			break
+
+		position = match.end()
+
+		if match.group("string") != None:
+			text = match.group("string")[1:-1]
+			tokens.append(("string", re.sub(r"\\(.)", r"\1", text)))
+		elif match.group("operator") != None:
+			tokens.append(("operator", match.group("operator")))
+		elif match.group("word") != None:
+			tokens.append(("word", match.group("word")))
+		else:
+			raise UnsupportedQuery("operator \"%s\"" % (match.group("other")))
+
+	return tokens
+
+class _Parser(object):
+
+	def __init__(self, jql):
+		self._tokens = _tokenize(jql)
+		self._position = 0
+
+	def _peek(self):
+		if self._position < len(self._tokens):
+			return self._tokens[self._position]
+
+		return (None, None)
+
+	def _next(self):
+		token = self._peek()
+
+		if token[0] == None:
+			raise UnsupportedQuery("incomplete query")
+
+		self._position += 1
+
+		return token
+
+	# whether the next token is the keyword (case insensitive) and skip it if so
+	def _keyword(self, keyword):
+		(kind, text) = self._peek()
+
+		if kind == "word" and text.lower() == keyword:
+			self._position += 1
+			return True
+
+		return False
+
+	def _expect(self, operator):
+		if self._next() != ("operator", operator):
+			raise UnsupportedQuery("expected \"%s\"" % (operator))
+
+	def parse(self):
+		clauses = []
+		order = []
+
+		if self._keyword("order"):
+			return Query(clauses, self._order())
+
+		if self._peek()[0] != None:
+			clauses.append(self._clause())
+
+			while self._keyword("and"):
+				clauses.append(self._clause())
+
+		if self._keyword("order"):
+			order = self._order()
+		elif self._peek()[0] != None:
+			raise UnsupportedQuery("\"%s\"" % (self._peek()[1]))
+
+		return Query(clauses, order)
+
+	def _field(self, fields):
+		(kind, text) = self._next()
+
+		if kind != "word" or text.lower() not in fields:
+			raise UnsupportedQuery("field \"%s\"" % (text))
+
+		return text.lower()
+
+	def _clause(self):
+		field = self._field(FIELDS)
+
+		if self._keyword("is"):
+			op = "not in" if self._keyword("not") else "in"
+
+			if not (self._keyword("empty") or self._keyword("null")):
+				raise UnsupportedQuery("expected EMPTY")
+
+			return Clause(field, op, [EMPTY])
+
+		if self._keyword("in"):
+			return Clause(field, "in", self._values())
+
+		if self._keyword("not"):
+			if not self._keyword("in"):
+				raise UnsupportedQuery("expected IN")
+
+			return Clause(field, "not in", self._values())
+
+		(kind, text) = self._next()
+
+		if kind == "operator" and text == "=":
+			return Clause(field, "in", [self._value()])
+
+		if kind == "operator" and text == "!=":
+			return Clause(field, "not in", [self._value()])
+
+		raise UnsupportedQuery("operator \"%s\"" % (text))
+
+	def _values(self):
+		self._expect("(")
+
+		values = [self._value()]
+
+		while self._peek() == ("operator", ","):
+			self._next()
+			values.append(self._value())
+
+		self._expect(")")
+
+		return values
+
+	def _value(self):
+		(kind, text) = self._next()
+
+		if kind == "string":
+			return text
+
+		if kind != "word":
+			raise UnsupportedQuery("value \"%s\"" % (text))
+
+		if self._peek() == ("operator", "("):
+			if text.lower() != "currentuser":
+				raise UnsupportedQuery("function %s()" % (text))
+
+			self._next()
+			self._expect(")")
+
+			return CURRENT_USER
+
+		if text.lower() in ("empty", "null"):
+			return EMPTY
+
+		return text
+
+	def _order(self):
+		if not self._keyword("by"):
+			raise UnsupportedQuery("expected BY")
+
+		order = [self._sort_key()]
+
+		while self._peek() == ("operator", ","):
+			self._next()
+			order.append(self._sort_key())
+
+		if self._peek()[0] != None:
+			raise UnsupportedQuery("\"%s\"" % (self._peek()[1]))
+
+		return order
+
+	def _sort_key(self):
+		field = self._field(ORDER_FIELDS)
+
+		if self._keyword("desc"):
+			return (field, False)
+
+		self._keyword("asc")
+
+		return (field, True)
+
+"""Parse jql into a Query, raises UnsupportedQuery outside the subset"""
+def parse(jql):
+	return _Parser(jql).parse()
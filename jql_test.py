@@ -0,0 +1,67 @@
+import unittest
+import jql
+
+class JqlTest(unittest.TestCase):
+
+	def clauses(self, query):
+		return map(lambda clause: (clause.field, clause.op, clause.values), jql.parse(query).clauses)
+
+	"""It should parse conjunctions of clauses"""
+	def test_parse_conjunction(self):
+		self.assertEqual(
+			self.clauses('project = ACME and status in (Open, "In Progress") AND assignee = currentUser()'), [
+				("project", "in", ["ACME"]),
+				("status", "in", ["Open", "In Progress"]),
+				("assignee", "in", [jql.CURRENT_USER])
+			])
+
+	"""It should parse negations and empty values"""
+	def test_parse_negations(self):
+		self.assertEqual(
+			self.clauses("status != Closed and status not in ('Done', Resolved) and assignee is not EMPTY and key is null"), [
+				("status", "not in", ["Closed"]),
+				("status", "not in", ["Done", "Resolved"]),
+				("assignee", "not in", [jql.EMPTY]),
+				("key", "in", [jql.EMPTY])
+			])
+
+	"""It should parse escaped quotes in strings"""
+	def test_parse_string(self):
+		self.assertEqual(self.clauses(r'status = "Say \"hi\""'), [("status", "in", ['Say "hi"'])])
+
+	"""It should parse the order"""
+	def test_parse_order(self):
+		self.assertEqual(jql.parse("project = ACME ORDER BY updated DESC, key").order, [("updated", False), ("key", True)])
+		self.assertEqual(jql.parse("order by key asc").order, [("key", True)])
+		self.assertEqual(jql.parse("project = ACME").order, [])
+
+	"""It should return the projects the query is limited to"""
+	def test_projects(self):
+		self.assertEqual(jql.parse("status = Open and project in (ACME, FOO)").projects(), ["ACME", "FOO"])
+		self.assertEqual(jql.parse("project != ACME").projects(), None)
+		self.assertEqual(jql.parse("status = Open").projects(), None)
+
+	"""It should tell whether currentUser() is used"""
+	def test_uses_current_user(self):
+		self.assertTrue(jql.parse("assignee = currentUser()").uses_current_user())
+		self.assertFalse(jql.parse("assignee = me").uses_current_user())
+
+	"""It should list the assignees other than currentUser() and EMPTY"""
+	def test_users(self):
+		self.assertEqual(jql.parse('assignee in (me, "Jane Doe", EMPTY, currentUser()) and status = Open').users(), ["me", "Jane Doe"])
+		self.assertEqual(jql.parse("project = ACME").users(), [])
+
+	"""It should reject anything outside of the subset"""
+	def test_unsupported(self):
+		for query in [
+			"project = ACME or project = FOO",
+			"(project = ACME)",
+			"summary ~ timeout",
+			"created > -1d",
+			"assignee was me",
+			"assignee = membersOf(devs)",
+			"project = ACME and",
+			"status in (Open",
+			"project = ACME order by created",
+			"project = ACME ORDER key"]:
+			self.assertRaises(jql.UnsupportedQuery, jql.parse, query)
@@ -0,0 +1,132 @@
+import json
+import re
+
+# characters that change the scanner state, all other text is skipped over
+_SPECIAL = re.compile(r'["\\{}\[\]]')
+
+"""Incremental parser for a JSON object that contains a large array member, like the
+"issues" of a search response. Text is fed in chunks as it arrives; every element of
+the array is decoded as soon as it is complete, so at most one element is buffered.
+All other members are kept and decoded by close(), with the array left empty.
+
+Elements of the array are expected to be objects or arrays."""
+class ArrayStreamParser(object):
+
+	def __init__(self, key, encoding="utf8"):
+		self._key = key
+		self._encoding = encoding
+
+		self._depth = 0
+		self._in_string = False
+
+		# a backslash ended the last chunk, skip the first char of the next
+		self._escape = False
+
+		# text of the object except the array's elements
+		self._skeleton = []
+
+		# name of the last string closed at object level
+		self._last_string = None
+		self._string_pieces = None
+
+		self._in_array = False
+		self._element_pieces = None
+
+		self._items = []
+
+	def write(self, chunk):
+		self.feed(chunk)
+
+	def feed(self, chunk):
+		# start of the text not yet copied to the skeleton
+		pos = 0
+
+		# strings at object level are captured to recognize the key
+		string_start = 0 if self._string_pieces != None else None
+		element_start = 0 if self._element_pieces != None else None
+
+		skip = 1 if self._escape else 0
+		self._escape = False
+
+		for match in _SPECIAL.finditer(chunk):
+			i = match.start()
+
+			if i < skip:
+				continue
+
+			c = chunk[i]
+
+			if self._in_string:
+				if c == "\\":
+					skip = i + 2
+
+					if skip > len(chunk):
+						self._escape = True
+				elif c == "\"":
+					self._in_string = False
+
+					if string_start != None:
+						self._string_pieces.append(chunk[string_start:i])
+						self._last_string = "".join(self._string_pieces)
+						self._string_pieces = None
+						string_start = None
+
+				continue
+
+			if c == "\"":
+				self._in_string = True
+
+				if self._depth == 1:
+					self._string_pieces = []
+					string_start = i + 1
+
+			elif c == "{" or c == "[":
+				self._depth += 1
+
+				if self._depth == 2 and c == "[" and self._last_string == self._key:
+					self._in_array = True
+
+					self._skeleton.append(chunk[pos:i + 1])
+				elif self._in_array and self._depth == 3:
+					self._element_pieces = []
+					element_start = i
+
+			else:
+				if self._in_array and self._depth == 3:
+					self._element_pieces.append(chunk[element_start:i + 1])
+					self._items.append(json.loads("".join(self._element_pieces), self._encoding))
+
+					self._element_pieces = None
+					element_start = None
+				elif self._in_array and self._depth == 2:
+					self._in_array = False
+
+					# continue the skeleton with the closing bracket
+					pos = i
+
+				self._depth -= 1
+
+		# keep the parts continued in the next chunk
+		if string_start != None:
+			self._string_pieces.append(chunk[string_start:])
+
+		if element_start != None:
+			self._element_pieces.append(chunk[element_start:])
+
+		if not self._in_array:
+			self._skeleton.append(chunk[pos:])
+
+	"""Return the array elements decoded since the last call"""
+	def pop_items(self):
+		items = self._items
+		self._items = []
+
+		return items
+
+	"""Text fed so far without the array's elements"""
+	def text(self):
+		return "".join(self._skeleton)
+
+	"""Decode the object without the array's elements"""
+	def close(self):
+		return json.loads(self.text(), self._encoding)
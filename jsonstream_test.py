@@ -0,0 +1,71 @@
+
+import unittest
+import json
+import jsonstream
+
+class ArrayStreamParserTest(unittest.TestCase):
+
+	def setUp(self):
+		self.doc = {
+			"startAt": 0,
+			"maxResults": 50,
+			"total": 3,
+			"issues": [
+				{"key": "A-1", "fields": {"summary": u"quote \" backslash \\ brackets [ { } ] \u00e4"}},
+				{"key": "A-2", "fields": {"subtasks": [{"key": "A-3", "fields": {"summary": "}"}}]}},
+				{"key": "A-4", "fields": {}}
+			],
+			"warningMessages": ["escaped \\\" quote"]
+		}
+
+		self.text = json.dumps(self.doc, ensure_ascii=False).encode("utf8")
+
+	def _feed(self, parser, chunk_size):
+		items = []
+
+		for i in range(0, len(self.text), chunk_size):
+			parser.feed(self.text[i:i + chunk_size])
+			items.extend(parser.pop_items())
+
+		return items
+
+	"""It should decode the array elements and the remaining object in one chunk"""
+	def test_single_chunk(self):
+		parser = jsonstream.ArrayStreamParser("issues")
+
+		items = self._feed(parser, len(self.text))
+
+		self.assertEqual(items, self.doc["issues"])
+		self.assertEqual(parser.close(), dict(self.doc, issues=[]))
+
+	"""It should decode the same from chunks of any size"""
+	def test_chunked(self):
+		for chunk_size in range(1, 20):
+			parser = jsonstream.ArrayStreamParser("issues")
+
+			items = self._feed(parser, chunk_size)
+
+			self.assertEqual(items, self.doc["issues"], "chunk size %d" % chunk_size)
+			self.assertEqual(parser.close(), dict(self.doc, issues=[]), "chunk size %d" % chunk_size)
+
+	"""It should emit an element as soon as it is complete"""
+	def test_emit_when_complete(self):
+		parser = jsonstream.ArrayStreamParser("issues")
+
+		parser.feed('{"total": 2, "issues": [{"key": "A-1"}, {"key": ')
+
+		self.assertEqual(parser.pop_items(), [{"key": "A-1"}])
+
+		parser.feed('"A-2"}]}')
+
+		self.assertEqual(parser.pop_items(), [{"key": "A-2"}])
+		self.assertEqual(parser.pop_items(), [])
+
+	"""It should keep objects without the array as they are"""
+	def test_no_array(self):
+		parser = jsonstream.ArrayStreamParser("issues")
+
+		parser.feed('{"errorMessages": ["Field \'issues\' does not exist"]}')
+
+		self.assertEqual(parser.pop_items(), [])
+		self.assertEqual(parser.text(), '{"errorMessages": ["Field \'issues\' does not exist"]}')
@@ -0,0 +1,16 @@
+import sys
+
+"""Stands in for a module which is imported on first attribute access, keeping
+the import off the startup path of commands that do not use the module"""
+class LazyModule(object):
+
+	def __init__(self, name):
+		self._name = name
+		self._module = None
+
+	def __getattr__(self, attr):
+		if self._module == None:
+			__import__(self._name)
+			self._module = sys.modules[self._name]
+
+		return getattr(self._module, attr)
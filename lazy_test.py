@@ -0,0 +1,31 @@
+
+import unittest
+import sys
+import lazy
+
+class LazyModuleTest(unittest.TestCase):
+
+	def setUp(self):
+		self.imported = "colorsys" in sys.modules
+
+		if self.imported:
+			self.module = sys.modules.pop("colorsys")
+
+	def tearDown(self):
+		if self.imported:
+			sys.modules["colorsys"] = self.module
+
+	"""It should import the module on first attribute access only"""
+	def test_import_on_access(self):
+		colorsys = lazy.LazyModule("colorsys")
+
+		assert "colorsys" not in sys.modules
+
+		assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+		assert "colorsys" in sys.modules
+
+	"""It should raise ImportError on access if the module does not exist"""
+	def test_missing_module(self):
+		missing = lazy.LazyModule("no_such_module_exists")
+
+		self.assertRaises(ImportError, getattr, missing, "anything")
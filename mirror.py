@@ -0,0 +1,467 @@
+import sqlite3
+import json
+import re
+import math
+import time
+import jql as jql_parser
+
+# fields of mirrored issues: everything rendered by the printer plus the project
+# and the comments for searching them
+MIRROR_FIELDS = ["summary", "description", "assignee", "status", "issuetype", "updated", "parent", "subtasks", "project", "comment"]
+
+# fields requested when only the keys of the matching issues are needed
+KEY_FIELDS = ["updated"]
+
+# upper bound of issues mirrored per filter
+MAX_MIRRORED_ISSUES = 10000
+
+# seconds an incremental sync reaches back before the last one: JQL dates have
+# minute resolution and issues are updated while a sync runs
+SYNC_OVERLAP = 120
+
+# issue keys fetched per "key in (...)" search
+FETCH_BATCH_SIZE = 50
+
+# words of the text index (without FTS5)
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_ORDER_BY = re.compile(r"(^|\s+)order\s+by\s+.*$", re.IGNORECASE | re.DOTALL)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+	key TEXT PRIMARY KEY,
+	project TEXT,
+	status TEXT,
+	assignee TEXT,
+	updated TEXT,
+	raw TEXT NOT NULL
+);
+
+-- for queries (see select)
+CREATE INDEX IF NOT EXISTS issues_project ON issues (project COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS issues_status ON issues (status COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS issues_assignee ON issues (assignee COLLATE NOCASE);
+
+-- complete unless more than MAX_MIRRORED_ISSUES issues matched the last sync
+CREATE TABLE IF NOT EXISTS filters (
+	name TEXT PRIMARY KEY,
+	jql TEXT NOT NULL,
+	last_sync REAL NOT NULL,
+	complete INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS filter_issues (
+	filter TEXT NOT NULL,
+	position INTEGER NOT NULL,
+	key TEXT NOT NULL,
+	PRIMARY KEY (filter, position)
+);
+"""
+
+# trigrams match any part of a word, like grep
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS issues_text USING fts5(
+	key UNINDEXED,
+	summary,
+	description,
+	comments,
+	tokenize = 'trigram'
+);
+"""
+
+# word -> issues for SQLite builds without FTS5
+_TERMS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issue_terms (
+	term TEXT NOT NULL,
+	key TEXT NOT NULL,
+	count INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS issue_terms_term ON issue_terms (term);
+CREATE INDEX IF NOT EXISTS issue_terms_key ON issue_terms (key);
+"""
+
+# ranking weights of words in summary, description and comments
+_TEXT_WEIGHTS = (10, 1, 1)
+
+# a trigram index does not find shorter words
+_MIN_FTS_WORD = 3
+
+# updated as julian day, from its format like "2015-01-23T19:03:43.000+0100"
+_UPDATED_DAY = """(julianday(substr(updated, 1, 19)) -
+	(CASE substr(updated, 24, 1) WHEN '-' THEN -1 ELSE 1 END) *
+	(substr(updated, 25, 2) * 60 + substr(updated, 27, 2)) / 1440.0)"""
+
+# expressions to order by per field of jql.ORDER_FIELDS, ACME-9 before ACME-10
+_ORDER_EXPRESSIONS = {
+	"key": ["substr(key, 1, instr(key, '-') - 1)", "CAST(substr(key, instr(key, '-') + 1) AS INTEGER)"],
+	"project": ["project COLLATE NOCASE"],
+	"status": ["status COLLATE NOCASE"],
+	"assignee": ["assignee COLLATE NOCASE"],
+	"updated": [_UPDATED_DAY]
+}
+
+# without ORDER BY
+_DEFAULT_ORDER = [("key", False)]
+
+"""JQL restricting jql to issues updated since timestamp, keeping its ORDER BY. The date
+is relative to now ("-5m"): JIRA reads absolute dates in the time zone of the user's
+profile, relative ones against its own clock."""
+def updated_since(jql, timestamp, now=None):
+	if now == None:
+		now = time.time()
+
+	match = _ORDER_BY.search(jql)
+
+	if match != None:
+		condition = jql[:match.start()].strip()
+		order = " " + match.group(0).strip()
+	else:
+		condition = jql.strip()
+		order = ""
+
+	# whole minutes, rounded up to reach back far enough
+	since = 'updated >= "-%dm"' % (max(1, math.ceil((now - timestamp) / 60.0)))
+
+	if condition == "":
+		return since + order
+
+	return "(%s) AND %s%s" % (condition, since, order)
+
+"""Local SQLite copy of the issues matched by named JQL filters. Syncs after the first
+one only fetch the issues updated since the last sync; the members of a filter and their
+order are refreshed with a search for the keys only."""
+class Mirror(object):
+
+	def __init__(self, path):
+		self._db = sqlite3.connect(path)
+		self._db.executescript(_SCHEMA)
+
+		# mirrors of older versions do not tell, their filters count as truncated
+		if "complete" not in map(lambda row: row[1], self._db.execute("PRAGMA table_info(filters)")):
+			self._db.execute("ALTER TABLE filters ADD COLUMN complete INTEGER NOT NULL DEFAULT 0")
+
+		self._init_text_index()
+
+	def _init_text_index(self):
+		tables = set(map(lambda row: row[0], self._db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")))
+
+		if "issues_text" in tables:
+			self._fts = True
+		elif "issue_terms" in tables:
+			self._fts = False
+		else:
+			try:
+				self._db.executescript(_FTS_SCHEMA)
+				self._fts = True
+			except sqlite3.OperationalError:
+				# SQLite built without FTS5 (or trigrams, before 3.34)
+				self._db.executescript(_TERMS_SCHEMA)
+				self._fts = False
+
+			# issues mirrored before the index existed
+			with self._db:
+				rows = self._db.execute("SELECT raw FROM issues")
+
+				self._index_issues(map(lambda row: json.loads(row[0]), rows))
+
+	def close(self):
+		self._db.close()
+
+	"""Return (jql, timestamp, whether all issues matching have been mirrored) of the
+	last sync of filter name or None"""
+	def last_sync(self, name):
+		row = self._db.execute("SELECT jql, last_sync, complete FROM filters WHERE name = ?", (name,)).fetchone()
+
+		if row == None:
+			return None
+
+		return (row[0], row[1], row[2] == 1)
+
+	"""Mirror the issues of filter name matching jql using jira (jira.Jira). Returns
+	(number of issues fetched, number of issues mirrored, whether the sync was incremental,
+	whether all issues matching have been mirrored: at most MAX_MIRRORED_ISSUES are)."""
+	def sync(self, jira, name, jql, parallel=1):
+		started = time.time()
+
+		last_sync = self.last_sync(name)
+
+		# a changed JQL needs all of its issues
+		incremental = last_sync != None and last_sync[0] == jql
+
+		if incremental:
+			key_items = jira.search_iter(jql, MAX_MIRRORED_ISSUES, KEY_FIELDS, parallel=parallel, raw=True)
+			keys = map(lambda item: item["key"], key_items)
+
+			updated_items = jira.search_iter(
+				updated_since(jql, last_sync[1] - SYNC_OVERLAP),
+				MAX_MIRRORED_ISSUES,
+				MIRROR_FIELDS,
+				parallel=parallel,
+				raw=True)
+			fetched = list(updated_items)
+
+			complete = key_items.remaining() == 0 and updated_items.remaining() == 0
+		else:
+			items = jira.search_iter(jql, MAX_MIRRORED_ISSUES, MIRROR_FIELDS, parallel=parallel, raw=True)
+			fetched = list(items)
+			keys = map(lambda item: item["key"], fetched)
+
+			complete = items.remaining() == 0
+
+		with self._db:
+			self._store_issues(fetched)
+
+			# members that have not been updated but are new to the filter
+			missing_keys = self._missing_keys(keys)
+
+			for i in range(0, len(missing_keys), FETCH_BATCH_SIZE):
+				batch = missing_keys[i:i + FETCH_BATCH_SIZE]
+
+				# issues deleted or moved since the key search are skipped,
+				# not rejected by JIRA
+				missing = list(jira.search_iter(
+					"key in (%s)" % (", ".join(batch)),
+					len(batch),
+					MIRROR_FIELDS,
+					raw=True,
+					validate_query=False))
+
+				self._store_issues(missing)
+				fetched.extend(missing)
+
+			self._db.execute("DELETE FROM filter_issues WHERE filter = ?", (name,))
+			self._db.executemany(
+				"INSERT INTO filter_issues (filter, position, key) VALUES (?, ?, ?)",
+				[(name, position, key) for (position, key) in enumerate(keys)])
+
+			self._db.execute(
+				"INSERT OR REPLACE INTO filters (name, jql, last_sync, complete) VALUES (?, ?, ?, ?)",
+				(name, jql, started, 1 if complete else 0))
+
+			# issues of no filter anymore
+			self._db.execute("DELETE FROM issues WHERE key NOT IN (SELECT key FROM filter_issues)")
+			self._unindex_orphans()
+
+		return (len(fetched), len(keys), incremental, complete)
+
+	def _store_issues(self, items):
+		self._db.executemany(
+			"INSERT OR REPLACE INTO issues (key, project, status, assignee, updated, raw) VALUES (?, ?, ?, ?, ?, ?)",
+			map(_issue_row, items))
+
+		self._index_issues(items)
+
+	# replaces the text of issues indexed before
+	def _index_issues(self, items):
+		keys = map(lambda item: (item["key"],), items)
+		texts = map(_issue_text, items)
+
+		if self._fts:
+			self._db.executemany("DELETE FROM issues_text WHERE key = ?", keys)
+			self._db.executemany(
+				"INSERT INTO issues_text (key, summary, description, comments) VALUES (?, ?, ?, ?)",
+				texts)
+		else:
+			self._db.executemany("DELETE FROM issue_terms WHERE key = ?", keys)
+
+			for text in texts:
+				counts = {}
+
+				for (part, weight) in zip(text[1:], _TEXT_WEIGHTS):
+					for word in _WORD.findall(part.lower()):
+						counts[word] = counts.get(word, 0) + weight
+
+				self._db.executemany(
+					"INSERT INTO issue_terms (term, key, count) VALUES (?, ?, ?)",
+					[(word, text[0], count) for (word, count) in counts.iteritems()])
+
+	def _unindex_orphans(self):
+		table = "issues_text" if self._fts else "issue_terms"
+
+		self._db.execute("DELETE FROM %s WHERE key NOT IN (SELECT key FROM issues)" % (table))
+
+	def _missing_keys(self, keys):
+		known = set(map(lambda row: row[0], self._db.execute("SELECT key FROM issues")))
+
+		return filter(lambda key: key not in known, keys)
+
+	"""Raw issues of filter name in JQL order as of the last sync, up to limit.
+	Returns (issues, number of issues matching)."""
+	def filter_issues(self, name, limit):
+		total = self._db.execute("SELECT COUNT(*) FROM filter_issues WHERE filter = ?", (name,)).fetchone()[0]
+
+		rows = self._db.execute(
+			"""SELECT i.raw FROM filter_issues f JOIN issues i ON i.key = f.key
+			WHERE f.filter = ? ORDER BY f.position LIMIT ?""",
+			(name, limit))
+
+		return (map(lambda row: json.loads(row[0]), rows), total)
+
+	"""Raw mirrored issues containing all of words in their summary, description or comments,
+	best matches first, up to limit. Returns (issues, number of issues matching)."""
+	def search(self, words, limit):
+		words = map(lambda word: word.decode("utf8") if isinstance(word, str) else word, words)
+		words = filter(lambda word: word != "", map(lambda word: word.lower(), words))
+
+		if len(words) == 0:
+			return ([], 0)
+
+		if self._fts:
+			keys = self._search_fts(words)
+		else:
+			keys = self._search_terms(words)
+
+		items = self.get(keys[:limit])
+
+		return (map(lambda key: items[key], filter(lambda key: key in items, keys[:limit])), len(keys))
+
+	def _search_fts(self, words):
+		conditions = []
+		params = []
+
+		match_words = filter(lambda word: len(word) >= _MIN_FTS_WORD, words)
+
+		if len(match_words) > 0:
+			conditions.append("issues_text MATCH ?")
+			params.append(" AND ".join(map(lambda word: '"%s"' % (word.replace('"', '""')), match_words)))
+
+		# short words are found by scanning the text
+		for word in filter(lambda word: len(word) < _MIN_FTS_WORD, words):
+			like = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+			conditions.append(
+				"(summary LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\' OR comments LIKE ? ESCAPE '\\')")
+			params.extend([like, like, like])
+
+		# the key is not ranked
+		weights = ", ".join(map(str, (0,) + _TEXT_WEIGHTS))
+
+		order = " ORDER BY bm25(issues_text, %s)" % (weights) if len(match_words) > 0 else ""
+
+		rows = self._db.execute(
+			"SELECT key FROM issues_text WHERE %s%s" % (" AND ".join(conditions), order),
+			params)
+
+		return map(lambda row: row[0], rows)
+
+	def _search_terms(self, words):
+		scores = None
+
+		for word in words:
+			# words starting with word
+			rows = self._db.execute(
+				"SELECT key, SUM(count) FROM issue_terms WHERE term >= ? AND term < ? GROUP BY key",
+				(word, word + u"\uffff"))
+
+			word_scores = dict(map(lambda row: (row[0], row[1]), rows))
+
+			if scores == None:
+				scores = word_scores
+			else:
+				scores = dict([(key, score + word_scores[key]) for (key, score) in scores.iteritems() if key in word_scores])
+
+		return map(lambda entry: entry[0], sorted(scores.iteritems(), key=lambda entry: (-entry[1], entry[0])))
+
+	"""Raw mirrored issues matching query (jql.Query) in its order, up to limit. user is the
+	name of currentUser(). Returns (issues, number of issues matching)."""
+	def select(self, query, user, limit):
+		conditions = []
+		params = []
+
+		for clause in query.clauses:
+			values = map(lambda value: user if value is jql_parser.CURRENT_USER else value, clause.values)
+
+			(condition, condition_params) = _clause_condition(clause.field, clause.op, values)
+
+			conditions.append(condition)
+			params.extend(condition_params)
+
+		where = " WHERE " + " AND ".join(conditions) if len(conditions) > 0 else ""
+
+		order = []
+
+		for (field, ascending) in query.order if len(query.order) > 0 else _DEFAULT_ORDER:
+			order.extend(map(lambda expression: expression + (" ASC" if ascending else " DESC"), _ORDER_EXPRESSIONS[field]))
+
+		total = self._db.execute("SELECT COUNT(*) FROM issues" + where, params).fetchone()[0]
+
+		rows = self._db.execute(
+			"SELECT raw FROM issues%s ORDER BY %s LIMIT ?" % (where, ", ".join(order)),
+			params + [limit])
+
+		return (map(lambda row: json.loads(row[0]), rows), total)
+
+	"""Those of names no mirrored issue is assigned to, ignoring case: the mirror knows
+	the user names of assignees only"""
+	def unknown_users(self, names):
+		return filter(
+			lambda name: self._db.execute("SELECT 1 FROM issues WHERE assignee = ? COLLATE NOCASE LIMIT 1", (name,)).fetchone() == None,
+			names)
+
+	"""Raw issues by key, keys not mirrored are absent"""
+	def get(self, keys):
+		issues = {}
+
+		for key in keys:
+			row = self._db.execute("SELECT raw FROM issues WHERE key = ?", (key,)).fetchone()
+
+			if row != None:
+				issues[key] = json.loads(row[0])
+
+		return issues
+
+# like JIRA, "not in" (!=) does not match issues with an empty field
+def _clause_condition(column, op, values):
+	names = filter(lambda value: value != jql_parser.EMPTY, values)
+	placeholders = ", ".join(["?"] * len(names))
+
+	if op == "in":
+		conditions = []
+
+		if len(names) > 0:
+			conditions.append("%s COLLATE NOCASE IN (%s)" % (column, placeholders))
+
+		if jql_parser.EMPTY in values:
+			conditions.append("%s IS NULL" % (column))
+
+		return ("(%s)" % (" OR ".join(conditions)), names)
+
+	conditions = ["%s IS NOT NULL" % (column)]
+
+	if len(names) > 0:
+		conditions.append("%s COLLATE NOCASE NOT IN (%s)" % (column, placeholders))
+
+	return ("(%s)" % (" AND ".join(conditions)), names)
+
+# (key, summary, description, comments) as indexed
+def _issue_text(item):
+	fields = item["fields"] if "fields" in item else {}
+
+	comments = []
+
+	if fields.get("comment") != None:
+		comments = map(lambda comment: comment.get("body") or "", fields["comment"].get("comments", []))
+
+	return (
+		item["key"],
+		fields.get("summary") or "",
+		fields.get("description") or "",
+		"\n".join(comments))
+
+def _issue_row(item):
+	fields = item["fields"] if "fields" in item else {}
+
+	def name_of(field, name="name"):
+		if field in fields and fields[field] != None:
+			return fields[field].get(name)
+
+		return None
+
+	return (
+		item["key"],
+		name_of("project", "key"),
+		name_of("status"),
+		name_of("assignee"),
+		fields.get("updated"),
+		json.dumps(item))
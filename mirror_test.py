@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+import unittest
+import time
+import os.path
+import tempfile
+import shutil
+import sqlite3
+import mirror
+import jql
+import jira
+
+def item(key, updated="2015-01-23T19:03:43.000+0100", project="ACME", status="Open", assignee="me", summary=None, description=None, comments=[]):
+	return {
+		"key": key,
+		"fields": {
+			"summary": summary if summary != None else "Summary of %s" % (key),
+			"description": description,
+			"comment": {"comments": map(lambda body: {"body": body}, comments)},
+			"updated": updated,
+			"project": {"key": project},
+			"status": {"name": status},
+			"assignee": {"name": assignee, "displayName": "User %s" % (assignee)} if assignee != None else None
+		}
+	}
+
+"""Issues of a search limited to max_results, like jira.SearchResult"""
+class FakeSearchResult(list):
+
+	def __init__(self, items, max_results):
+		list.__init__(self, items[:max_results])
+		self.total = len(items)
+
+	def remaining(self):
+		return self.total - len(self)
+
+"""Jira answering search_iter from a dict of jql to issues, recording the searches.
+Like JIRA it rejects validated queries naming deleted_keys."""
+class FakeJira(object):
+
+	def __init__(self, results, deleted_keys=[]):
+		self.results = results
+		self.deleted_keys = deleted_keys
+		self.searches = []
+
+	def search_iter(self, jql, max_results=10, fields=None, page_size=None, parallel=1, raw=False, validate_query=True):
+		self.searches.append((jql, fields))
+
+		if validate_query and any(map(lambda key: key in jql, self.deleted_keys)):
+			raise jira.JiraStatusException(400, "/api/2/search", "An issue with key '%s' does not exist" % (self.deleted_keys[0]))
+
+		return FakeSearchResult(self.results.get(jql, []), max_results)
+
+class UpdatedSinceTest(unittest.TestCase):
+
+	def setUp(self):
+		self.now = time.time()
+		self.timestamp = self.now - 5 * 60 - 10
+
+	"""It should restrict the JQL to issues updated since the timestamp, relative to now"""
+	def test_updated_since(self):
+		self.assertEqual(
+			mirror.updated_since("project = ACME", self.timestamp, self.now),
+			'(project = ACME) AND updated >= "-6m"')
+
+	"""It should keep the ORDER BY at the end"""
+	def test_updated_since_order_by(self):
+		self.assertEqual(
+			mirror.updated_since("project = ACME ORDER BY rank ASC", self.timestamp, self.now),
+			'(project = ACME) AND updated >= "-6m" ORDER BY rank ASC')
+
+	"""It should handle JQL without condition"""
+	def test_updated_since_order_by_only(self):
+		self.assertEqual(
+			mirror.updated_since("order by key", self.timestamp, self.now),
+			'updated >= "-6m" order by key')
+
+	"""It should reach back a minute at least"""
+	def test_updated_since_now(self):
+		self.assertEqual(
+			mirror.updated_since("project = ACME", self.now, self.now),
+			'(project = ACME) AND updated >= "-1m"')
+
+class MirrorTest(unittest.TestCase):
+
+	def setUp(self):
+		self.mirror = mirror.Mirror(":memory:")
+
+	def tearDown(self):
+		self.mirror.close()
+
+	"""It should fetch all issues on the first sync"""
+	def test_sync_full(self):
+		jira = FakeJira({"project = ACME": [item("ACME-2"), item("ACME-1")]})
+
+		self.assertEqual(self.mirror.sync(jira, "acme", "project = ACME"), (2, 2, False, True))
+		self.assertEqual(jira.searches, [("project = ACME", mirror.MIRROR_FIELDS)])
+
+		(items, total) = self.mirror.filter_issues("acme", 10)
+
+		self.assertEqual(map(lambda i: i["key"], items), ["ACME-2", "ACME-1"])
+		self.assertEqual(total, 2)
+		self.assertEqual(self.mirror.last_sync("acme")[0], "project = ACME")
+
+	"""It should fetch the issues updated since the last sync only"""
+	def test_sync_incremental(self):
+		jira = FakeJira({"project = ACME": [item("ACME-2"), item("ACME-1")]})
+		self.mirror.sync(jira, "acme", "project = ACME")
+
+		since = mirror.updated_since("project = ACME", self.mirror.last_sync("acme")[1] - mirror.SYNC_OVERLAP)
+
+		jira = FakeJira({
+			"project = ACME": [item("ACME-1"), item("ACME-2")],
+			since: [item("ACME-1", status="Closed")]
+		})
+
+		self.assertEqual(self.mirror.sync(jira, "acme", "project = ACME"), (1, 2, True, True))
+		self.assertEqual(jira.searches, [
+			("project = ACME", mirror.KEY_FIELDS),
+			(since, mirror.MIRROR_FIELDS)
+		])
+
+		(items, _total) = self.mirror.filter_issues("acme", 10)
+
+		self.assertEqual(map(lambda i: i["key"], items), ["ACME-1", "ACME-2"])
+		self.assertEqual(items[0]["fields"]["status"]["name"], "Closed")
+
+	"""It should fetch issues new to the filter that have not been updated"""
+	def test_sync_incremental_new_member(self):
+		self.mirror.sync(FakeJira({"project = ACME": [item("ACME-1")]}), "acme", "project = ACME")
+
+		jira = FakeJira({
+			"project = ACME": [item("ACME-1"), item("ACME-3")],
+			"key in (ACME-3)": [item("ACME-3")]
+		})
+
+		self.assertEqual(self.mirror.sync(jira, "acme", "project = ACME"), (1, 2, True, True))
+		self.assertEqual(jira.searches[-1], ("key in (ACME-3)", mirror.MIRROR_FIELDS))
+		self.assertEqual(self.mirror.filter_issues("acme", 10)[1], 2)
+
+	"""It should skip issues new to the filter deleted meanwhile"""
+	def test_sync_incremental_new_member_deleted(self):
+		self.mirror.sync(FakeJira({"project = ACME": [item("ACME-1")]}), "acme", "project = ACME")
+
+		jira = FakeJira({
+			"project = ACME": [item("ACME-1"), item("ACME-3"), item("ACME-4")],
+			"key in (ACME-3, ACME-4)": [item("ACME-3")]
+		}, deleted_keys=["ACME-4"])
+
+		self.assertEqual(self.mirror.sync(jira, "acme", "project = ACME"), (1, 3, True, True))
+		self.assertEqual(map(lambda i: i["key"], self.mirror.filter_issues("acme", 10)[0]), ["ACME-1", "ACME-3"])
+
+	"""It should sync all issues again if the JQL changed"""
+	def test_sync_changed_jql(self):
+		self.mirror.sync(FakeJira({"project = ACME": [item("ACME-1")]}), "acme", "project = ACME")
+
+		jira = FakeJira({"project = ACME AND status = Open": [item("ACME-1")]})
+
+		self.assertEqual(self.mirror.sync(jira, "acme", "project = ACME AND status = Open"), (1, 1, False, True))
+
+	"""It should drop issues not matched by any filter anymore"""
+	def test_sync_removes_orphans(self):
+		self.mirror.sync(FakeJira({"project = ACME": [item("ACME-1"), item("ACME-2")]}), "acme", "project = ACME")
+		self.mirror.sync(FakeJira({"project = ACME": [item("ACME-2")]}), "acme", "project = ACME")
+
+		self.assertEqual(self.mirror.get(["ACME-1", "ACME-2"]).keys(), ["ACME-2"])
+
+	"""It should keep issues matched by another filter"""
+	def test_sync_keeps_shared_issues(self):
+		self.mirror.sync(FakeJira({"project = ACME": [item("ACME-1")]}), "acme", "project = ACME")
+		self.mirror.sync(FakeJira({"assignee = me": [item("ACME-1")]}), "mine", "assignee = me")
+		self.mirror.sync(FakeJira({"project = ACME": []}), "acme", "project = ACME")
+
+		self.assertEqual(self.mirror.get(["ACME-1"]).keys(), ["ACME-1"])
+
+	"""It should limit the issues of a filter"""
+	def test_filter_issues_limit(self):
+		self.mirror.sync(FakeJira({"project = ACME": [item("ACME-3"), item("ACME-2"), item("ACME-1")]}), "acme", "project = ACME")
+
+		(items, total) = self.mirror.filter_issues("acme", 2)
+
+		self.assertEqual(map(lambda i: i["key"], items), ["ACME-3", "ACME-2"])
+		self.assertEqual(total, 3)
+
+	"""It should tell if more issues matched than are mirrored"""
+	def test_sync_truncated(self):
+		max_mirrored_issues = mirror.MAX_MIRRORED_ISSUES
+		mirror.MAX_MIRRORED_ISSUES = 2
+
+		try:
+			jira = FakeJira({"project = ACME": [item("ACME-3"), item("ACME-2"), item("ACME-1")]})
+
+			self.assertEqual(self.mirror.sync(jira, "acme", "project = ACME"), (2, 2, False, False))
+			self.assertEqual(self.mirror.last_sync("acme")[2], False)
+
+			jira = FakeJira({"project = ACME": [item("ACME-2"), item("ACME-1")]})
+
+			self.assertEqual(self.mirror.sync(jira, "acme", "project = ACME")[3], True)
+			self.assertEqual(self.mirror.last_sync("acme")[2], True)
+		finally:
+			mirror.MAX_MIRRORED_ISSUES = max_mirrored_issues
+
+	"""It should take the filters synced by older versions for truncated"""
+	def test_last_sync_of_older_versions(self):
+		path = os.path.join(tempfile.mkdtemp(), "mirror")
+
+		db = sqlite3.connect(path)
+		db.execute("CREATE TABLE filters (name TEXT PRIMARY KEY, jql TEXT NOT NULL, last_sync REAL NOT NULL)")
+		db.execute("INSERT INTO filters VALUES ('acme', 'project = ACME', 1422036223)")
+		db.commit()
+		db.close()
+
+		older = mirror.Mirror(path)
+
+		try:
+			self.assertEqual(older.last_sync("acme"), ("project = ACME", 1422036223, False))
+		finally:
+			older.close()
+			shutil.rmtree(os.path.dirname(path))
+
+	"""It should return None for filters never synced"""
+	def test_last_sync_unknown(self):
+		self.assertEqual(self.mirror.last_sync("acme"), None)
+
+class MirrorSearchTest(unittest.TestCase):
+
+	def setUp(self):
+		self.mirror = mirror.Mirror(":memory:")
+
+		self.mirror.sync(FakeJira({"project = ACME": [
+			item("ACME-1", summary="Login fails", description="Timeout after a while"),
+			item("ACME-2", summary="Timeout connecting to the database"),
+			item("ACME-3", summary="Slow startup", comments=["Caused by the login timeout of the CI"]),
+			item("ACME-4", summary="Typo on the start page", description=u"Änderungen übernehmen")
+		]}), "acme", "project = ACME")
+
+	def tearDown(self):
+		self.mirror.close()
+
+	def keys(self, words, limit=10):
+		return map(lambda i: i["key"], self.mirror.search(words, limit)[0])
+
+	"""It should rank matches of the summary first"""
+	def test_search_ranked(self):
+		self.assertEqual(self.keys(["timeout"])[0], "ACME-2")
+		self.assertEqual(sorted(self.keys(["timeout"])), ["ACME-1", "ACME-2", "ACME-3"])
+
+	"""It should find issues containing all words, in comments, too"""
+	def test_search_all_words(self):
+		self.assertEqual(sorted(self.keys(["login", "TIMEOUT"])), ["ACME-1", "ACME-3"])
+
+	"""It should find parts of words"""
+	def test_search_part_of_word(self):
+		self.assertEqual(self.keys(["startu"]), ["ACME-3"])
+		self.assertEqual(self.keys(["ypo"]), ["ACME-4"])
+
+	"""It should find short and non-ASCII words"""
+	def test_search_short_words(self):
+		self.assertEqual(self.keys(["ci"]), ["ACME-3"])
+		self.assertEqual(self.keys(["übernehmen"]), ["ACME-4"])
+
+	"""It should limit the issues found"""
+	def test_search_limit(self):
+		(items, total) = self.mirror.search(["timeout"], 1)
+
+		self.assertEqual(len(items), 1)
+		self.assertEqual(total, 3)
+
+	"""It should index the text of issues synced again and drop the issues removed"""
+	def test_search_after_sync(self):
+		self.mirror.sync(FakeJira({"project = ACME AND status = Open": [
+			item("ACME-1", summary="Login fails"),
+			item("ACME-2", summary="Database deadlock")
+		]}), "acme", "project = ACME AND status = Open")
+
+		self.assertEqual(self.keys(["timeout"]), [])
+		self.assertEqual(self.keys(["deadlock"]), ["ACME-2"])
+
+	"""It should find nothing without words"""
+	def test_search_no_words(self):
+		self.assertEqual(self.mirror.search([], 10), ([], 0))
+
+class MirrorSelectTest(unittest.TestCase):
+
+	def setUp(self):
+		self.mirror = mirror.Mirror(":memory:")
+
+		self.mirror.sync(FakeJira({"project = ACME": [
+			item("ACME-9", status="Open", assignee="me", updated="2015-01-23T19:03:43.000+0100"),
+			item("ACME-10", status="In Progress", assignee="j.doe", updated="2015-01-23T18:10:00.000+0000"),
+			item("ACME-11", status="Closed", assignee=None, updated="2015-01-23T19:30:00.000+0100"),
+			item("FOO-1", project="FOO", status="Open", assignee="me", updated="2015-01-22T10:00:00.000-0500")
+		]}), "all", "project = ACME")
+
+	def tearDown(self):
+		self.mirror.close()
+
+	def keys(self, query, user="me", limit=10):
+		return map(lambda i: i["key"], self.mirror.select(jql.parse(query), user, limit)[0])
+
+	"""It should select issues matching all clauses, ignoring the case of values"""
+	def test_select(self):
+		self.assertEqual(self.keys("project = acme and status in (open, \"In Progress\") order by key"), ["ACME-9", "ACME-10"])
+
+	"""It should select the issues of the current user"""
+	def test_select_current_user(self):
+		self.assertEqual(self.keys("assignee = currentUser() order by key"), ["ACME-9", "FOO-1"])
+		self.assertEqual(self.keys("assignee = currentUser()", user="j.doe"), ["ACME-10"])
+
+	"""It should not match empty fields by negations, like JIRA"""
+	def test_select_negation(self):
+		self.assertEqual(self.keys("assignee != me order by key"), ["ACME-10"])
+		self.assertEqual(self.keys("assignee in (j.doe, EMPTY) order by key"), ["ACME-10", "ACME-11"])
+		self.assertEqual(self.keys("project = ACME and assignee is not empty order by key"), ["ACME-9", "ACME-10"])
+
+	"""It should order by key number, newest first by default"""
+	def test_select_order_key(self):
+		self.assertEqual(self.keys("project = ACME"), ["ACME-11", "ACME-10", "ACME-9"])
+
+	"""It should order by the time of updates in any time zone"""
+	def test_select_order_updated(self):
+		self.assertEqual(self.keys("order by updated desc"), ["ACME-11", "ACME-10", "ACME-9", "FOO-1"])
+
+	"""It should tell the users no mirrored issue is assigned to"""
+	def test_unknown_users(self):
+		self.assertEqual(self.mirror.unknown_users(["J.Doe", "John Doe", "me", "john@example.com"]), ["John Doe", "john@example.com"])
+
+	"""It should limit the issues selected"""
+	def test_select_limit(self):
+		(items, total) = self.mirror.select(jql.parse("project = ACME"), "me", 1)
+
+		self.assertEqual(map(lambda i: i["key"], items), ["ACME-11"])
+		self.assertEqual(total, 3)
+
+"""Text index of SQLite builds without FTS5"""
+class MirrorSearchTermsTest(MirrorSearchTest):
+
+	def setUp(self):
+		self.fts_schema = mirror._FTS_SCHEMA
+		mirror._FTS_SCHEMA = "CREATE VIRTUAL TABLE issues_text USING missing_module(key)"
+
+		MirrorSearchTest.setUp(self)
+
+	def tearDown(self):
+		MirrorSearchTest.tearDown(self)
+
+		mirror._FTS_SCHEMA = self.fts_schema
+
+	"""It should find words by their beginning"""
+	def test_search_part_of_word(self):
+		self.assertEqual(self.keys(["startu"]), ["ACME-3"])
+		self.assertEqual(self.keys(["ypo"]), [])
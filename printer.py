@@ -104,7 +104,8 @@ Styled.fg = {
 	"brightgreen": None,
 	"darkgrey": None,
 	"grey": None,
-	"white": None
+	"white": None,
+	"brown": None
 }
 
 Styled.bg = {
@@ -171,6 +172,17 @@ class Printer(object):
 
 	me_assigned_color = [Styled.fg["blue"], Styled.bg["yellow"]]
 
+	# issue fields each render mode reads, request only these
+	# (subtasks and parent come with summary, status and type)
+	fields = {
+		"oneline": ["summary", "status", "assignee", "parent", "subtasks"],
+		"tree": ["summary", "status", "assignee", "parent", "subtasks"],
+		"card": ["summary", "description", "assignee", "status", "issuetype", "updated", "parent", "subtasks"]
+	}
+
+
+	# bounds of the ages since the last update shown by stats, in days
+	age_days = [1, 7, 30, 90, 365]
 
 	def __init__(self, width=80, me=None):
 		self._me = me
@@ -254,7 +266,7 @@ class Printer(object):
 		return str(self._headline("-" * self._width))
 
 	def _format_date(self, timestamp):
-		return datetime.datetime.utcfromtimestamp(timestamp).strftime("%d.%m.%y %H:%M")
+		return datetime.datetime.fromtimestamp(timestamp).strftime("%d.%m.%y %H:%M")
 
 	"""Format text respecting new lines thart are already present"""
 	def _wrap_text(self, text):
@@ -288,7 +300,8 @@ class Printer(object):
 		s += self._ruler() + "\n"
 
 		# UPDATED
-		s += str(self._headline("Updated: ") + self._format_date(issue._updated)) + "\n"
+		if issue._updated != None:
+			s += str(self._headline("Updated: ") + self._format_date(issue._updated)) + "\n"
 
 		# RULER, PARET ISSUE
 		if issue._parent != None:
@@ -303,7 +316,8 @@ class Printer(object):
 		s +=  self._ruler() + "\n"
 
 		# DESCCRIPTION
-		s +=  self._wrap_text(issue._description) + "\n"
+		if issue._description != None:
+			s +=  self._wrap_text(issue._description) + "\n"
 
 		# RULER, SUBTASK LIST
 		if len(issue._subtasks) > 0:
@@ -333,3 +347,56 @@ class Printer(object):
 			s += "\n"
 
 		return s
+
+	"""Render the numbers of issues of a jira.IssueBatch by status, assignee and type
+	and by days since their last update before now"""
+	def stats(self, batch, now):
+		s = str(self._headline("%d Issues" % (len(batch)))) + "\n"
+
+		for (title, column) in [("Status", "status"), ("Assignee", "assignee"), ("Type", "type")]:
+			s += self._ruler() + "\n"
+			s += str(self._headline(title)) + "\n"
+
+			# most issues first
+			counts = sorted(batch.count_by(column).items(), key=lambda entry: (-entry[1], entry[0]))
+
+			for (value, count) in counts:
+				s += self._count_line(value if value != None else "none", count, len(batch))
+
+		s += self._ruler() + "\n"
+		s += str(self._headline("Updated")) + "\n"
+
+		# oldest first: before 365 days, 90 - 365 days, ... 1 day ago until now (and later)
+		edges = [0.0] + map(lambda days: now - days * 86400, reversed(self.age_days)) + [float("inf")]
+		labels = ["%d+ days ago" % (self.age_days[-1])]
+		labels += map(lambda (newer, older): "%d - %d days ago" % (newer, older), reversed(zip(self.age_days[:-1], self.age_days[1:])))
+		labels += ["within %d day%s" % (self.age_days[0], "" if self.age_days[0] == 1 else "s")]
+
+		for (label, count) in reversed(zip(labels, batch.histogram(edges))):
+			s += self._count_line(label, count, len(batch))
+
+		return s
+
+	def _count_line(self, label, count, total):
+		share = "%d%%" % (round(100.0 * count / total)) if total > 0 else "-"
+
+		return _align([(label, 30), (str(count), 10), (share, 6)], width=self._width) + "\n"
+
+	"""Render the numbers of issues matching the JQL predicates rows and columns as
+	table, totals listing the cells row by row. Without columns rows are counted alone."""
+	def counts(self, rows, columns, totals):
+		if len(columns) == 0:
+			columns = ["Issues"]
+
+		row_width = max(map(len, rows))
+		total_width = max(map(lambda total: len(str(total)), totals))
+		widths = map(lambda column: max(len(column), total_width), columns)
+
+		header = " " * row_width + "".join(map(lambda (column, width): "  " + str(self._headline(column.rjust(width))), zip(columns, widths)))
+		lines = [header]
+
+		for (i, row) in enumerate(rows):
+			cells = totals[i * len(columns):(i + 1) * len(columns)]
+			lines.append(row.ljust(row_width) + "".join(map(lambda (total, width): "  " + str(total).rjust(width), zip(cells, widths))))
+
+		return "\n".join(lines)
@@ -1,6 +1,7 @@
 
 import unittest
 import printer
+import jira
 
 class PrinterTest(unittest.TestCase):
 
@@ -47,6 +48,96 @@ class PrinterTest(unittest.TestCase):
 		self.assertEqual(s, "EXEED TO EIGHTTEEN" + " PQR " + (" " * 7) + "ABC", "correct output")
 
 
+class CountsTest(unittest.TestCase):
+
+	def setUp(self):
+		self._orig_styled_use_color = printer.Styled.use_color
+		printer.Styled.use_color = False
+
+	def tearDown(self):
+		printer.Styled.use_color = self._orig_styled_use_color
+
+	"""It should render the counts as table of rows and columns"""
+	def test_counts(self):
+		s = printer.Printer().counts(["project = ACME", "project = FOO"], ["Open", "status = Closed"], [3, 1250, 0, 7])
+
+		self.assertEqual(s, "\n".join([
+			"                Open  status = Closed",
+			"project = ACME     3             1250",
+			"project = FOO      0                7"]))
+
+	"""It should render a column of counts without columns"""
+	def test_counts_rows_only(self):
+		s = printer.Printer().counts(["project = ACME", "project = FOO"], [], [3, 12])
+
+		self.assertEqual(s, "\n".join([
+			"                Issues",
+			"project = ACME       3",
+			"project = FOO       12"]))
+
+
+class StatsTest(unittest.TestCase):
+
+	def setUp(self):
+		self._orig_styled_use_color = printer.Styled.use_color
+		printer.Styled.use_color = False
+
+	def tearDown(self):
+		printer.Styled.use_color = self._orig_styled_use_color
+
+	def _issue(self, key, status, assignee, updated):
+		fields = {
+			"status": {"name": status},
+			"assignee": {"name": assignee} if assignee != None else None,
+			"issuetype": {"name": "Bug"}
+		}
+
+		if updated != None:
+			fields["updated"] = updated
+
+		return {"key": key, "fields": fields}
+
+	"""It should count the values of each column, unassigned as none, and the issues by age"""
+	def test_stats(self):
+		batch = jira.IssueBatch()
+		batch.extend([
+			self._issue("A-1", "Open", "alice", "2015-01-31T11:00:00.000+0000"),
+			# exactly 1 and 7 days ago: the ages include their upper bound
+			self._issue("A-2", "Open", None, "2015-01-30T12:00:00.000+0000"),
+			self._issue("A-3", "Closed", "alice", "2015-01-24T12:00:00.000+0000"),
+			self._issue("A-4", "Open", "bob", "2014-12-01T12:00:00.000+0000"),
+			self._issue("A-5", "Closed", None, "2014-01-01T12:00:00.000+0000"),
+			# never updated: in no age
+			self._issue("A-6", "Open", "bob", None)
+		])
+
+		s = printer.Printer(width=50).stats(batch, jira.parse_timestamp("2015-01-31T12:00:00.000+0000"))
+
+		self.assertEqual(s, "\n".join([
+			"6 Issues",
+			"-" * 50,
+			"Status",
+			"Open                                  4        67%",
+			"Closed                                2        33%",
+			"-" * 50,
+			"Assignee",
+			"none                                  2        33%",
+			"alice                                 2        33%",
+			"bob                                   2        33%",
+			"-" * 50,
+			"Type",
+			"Bug                                   6       100%",
+			"-" * 50,
+			"Updated",
+			"within 1 day                          2        33%",
+			"1 - 7 days ago                        1        17%",
+			"7 - 30 days ago                       0         0%",
+			"30 - 90 days ago                      1        17%",
+			"90 - 365 days ago                     0         0%",
+			"365+ days ago                         1        17%",
+			""]))
+
+
 class CompositeStyledTest(unittest.TestCase):
 
 	"""It should return the sum length of both strings"""